@@ -1,33 +1,191 @@
 import altair as alt
+import numpy as np
 import pandas as pd
 import streamlit as st
 import math
 
-# import numpy as np
-
-
-# from itertools import combinations
-
-
-def load_data(file_path):
-    data = pd.read_excel(file_path, sheet_name=None)
-    required_sheets = ['DS 1 state', 'DS 2 state', 'MN 1 state', 'MN 2 state', 'HC 1 state', 'HC 2 state', 'HC 1 trust',
-                       'HC 2 trust', 'HC 1 shipments', 'DS 1 shipments', 'DS 2 shipments', 'Reward']
-
-    # Initialize the selected_data dictionary
-    selected_data = {}
-
-    for sheet_name in required_sheets:
-        if sheet_name in data:
-            selected_data[sheet_name] = data[sheet_name]
-
-    return selected_data
-
-
-# New function for loading time-taken data
-def load_time_taken_data(file_path):
-    time_data = pd.read_excel(file_path)
-    return time_data
+from api import API_PORT, start_api
+from data_store import load_run, load_runs, loader_cache, run_signature
+from bands import BAND_SHEETS, get_bands
+from bootstrap import DEFAULT_RESAMPLES, bootstrap_intervals
+from bullwhip import BULLWHIP_SHEETS, BULLWHIP_WINDOW, ECHELON_TOTAL, ECHELONS, bullwhip_ratios, rolling_bullwhip
+from cube import CUBE_AXES, get_metric_cube
+from downsample import DEFAULT_CHART_POINTS, reduced_series
+from derived import with_derived
+from matrices import get_matrix, window_rows
+from phases import DISRUPTION_OFFSET, DISRUPTION_WINDOWS, PHASE_SHEETS, phase_metrics
+from metrics import (HORIZON, PLOT_HORIZON, WARMUP, backlog_inventory_tables, lead_time_stability_table,
+                     lead_time_table, order_fluctuation_table, reward_table, run_metrics)
+from profiling import PROFILE_LOG, fragment_rerun, profiled, rerun, show_profile, write_log
+from rolling import DEFAULT_ROLLING_WINDOW, ROLLING_ITEMS, ROLLING_STATISTICS, ROLLING_WINDOWS, get_rolling
+from run_catalog import get_catalog
+from runtime import LATENCY_LABELS, latency_table, runtime_table
+from tail import live_runs
+
+LIVE_REFRESH_SECONDS = 5
+
+
+def find_run(agent, scenario, disruption):
+    # Catalog entry for the selected combination, or None when app_data has no such (readable) file
+    run = get_catalog().lookup(agent, st.session_state['order_type'], disruption, scenario)
+    if run is not None and run.path in st.session_state.get('unreadable_runs', ()):
+        return None
+    return run
+
+
+def analysis_window():
+    # (warm-up, horizon) of the sidebar: every chart and metric covers the periods warm-up < Time <= horizon, up to
+    # the last period of each run when the horizon is None
+    return st.session_state.get('warmup', WARMUP), st.session_state.get('horizon', HORIZON)
+
+
+def plot_window():
+    # Analysis window of the trust box plots and the health center orders, which stop at PLOT_HORIZON
+    warmup, horizon = analysis_window()
+    return warmup, PLOT_HORIZON if horizon is None else min(horizon, PLOT_HORIZON)
+
+
+def chart_series(run, sheet_name, matrix, windows=()):
+    # Long Time/item/Value frame of the matrix columns, downsampled so that the chart stays within the
+    # sidebar's point budget; points inside the disruption windows are kept at full resolution
+    budget = st.session_state.get('chart_points', DEFAULT_CHART_POINTS)
+    max_points = max(budget // max(len(matrix.items), 1), 3)
+    frames = []
+    for item in matrix.items:
+        key = run_signature(run) + (sheet_name, item, matrix.time[0] if len(matrix) else None,
+                                    matrix.time[-1] if len(matrix) else None)
+        time, values = reduced_series(key, matrix.time, matrix.column(item), max_points, windows)
+        frames.append(pd.DataFrame({'Time': time, 'item': item, 'Value': values}))
+    if not frames:
+        return pd.DataFrame(columns=['Time', 'item', 'Value'])
+    return pd.concat(frames, ignore_index=True)
+
+
+def rolling_overlays(run, sheet_name, matrix, series, color=None):
+    # Rolling mean lines and mean +/- STD or MAD bands of the ROLLING_ITEMS among series ({item: item or derived
+    # series name}) on the Time_plot axis of an entity chart, for the statistics picked in the sidebar. matrix is
+    # the run's full sheet matrix; the rolling statistics are cached per run, entity, series and window.
+    statistics = st.session_state.get('rolling_statistics', [])
+    items = [item for item in series if item in ROLLING_ITEMS]
+    if not statistics or not items:
+        return []
+    window = st.session_state.get('rolling_window', DEFAULT_ROLLING_WINDOW)
+    warmup, horizon = analysis_window()
+    start, stop = window_rows(matrix.time, warmup, horizon)
+    # Every step-th period, so that the overlays stay within the point budget
+    budget = st.session_state.get('chart_points', DEFAULT_CHART_POINTS)
+    rows = np.arange(start, stop)[::max(1, math.ceil((stop - start) * len(items) / budget))]
+
+    frames = []
+    for item in items:
+        stats = get_rolling(run, sheet_name, series[item], window, matrix)
+        if stats is not None:
+            frames.append(pd.DataFrame({'Time_plot': matrix.time[rows] - warmup, 'item': item,
+                                        **{f'Rolling {statistic}': stats[statistic][rows]
+                                           for statistic in ROLLING_STATISTICS}}))
+    if not frames:
+        return []
+    rolling_df = pd.concat(frames, ignore_index=True).dropna(subset=['Rolling mean'])
+    base = alt.Chart(rolling_df).encode(
+        x=alt.X('Time_plot:Q', title='Time Period'),
+        color=alt.value(color) if color is not None else 'item:N'
+    )
+    layers = []
+    for statistic in [statistic for statistic in ['std', 'mad'] if statistic in statistics]:
+        band = base.transform_calculate(
+            low=f"datum['Rolling mean'] - datum['Rolling {statistic}']",
+            high=f"datum['Rolling mean'] + datum['Rolling {statistic}']"
+        )
+        layers.append(band.mark_area(opacity=0.15).encode(y='low:Q', y2='high:Q'))
+    if 'mean' in statistics:
+        layers.append(base.mark_line(strokeDash=[4, 2]).encode(
+            y='Rolling mean:Q', tooltip=['Time_plot', 'item', 'Rolling mean', 'Rolling std', 'Rolling mad']))
+    return layers
+
+
+def entity_items(sheet_name):
+    # Items drawn together in the main chart of an entity
+    if sheet_name == 'DS 1 state':
+        return ['Backlog', 'Demand', 'Up-to-level', 'Delivery', 'Inventory', 'Order']
+    elif sheet_name in ['MN 1 state', 'MN 2 state']:
+        return ['Demand', 'Up-to-level', 'Backlog', 'Inventory', 'Production amount', 'In production']
+    else:
+        return ['Backlog', 'Demand', 'Up-to-level', 'Delivery', 'Inventory', 'Order']
+
+
+def entity_derived(agent, sheet_name):
+    # Derived series (see derived.py) added to the charts of an entity, {item: derived series name}
+    series = {}
+    if sheet_name != 'DS 1 state':
+        series['Order_to_Demand Ratio'] = 'Order_to_Demand Ratio'
+    if sheet_name == 'DS 2 state' and agent in ['DRL', 'DRL_RNN']:
+        series.update({'Inventory': 'Clipped Inventory', 'Backlog': 'Clipped Backlog'})
+    return series
+
+
+def current_selection():
+    return {
+        'agents': st.session_state['selected_agents'],
+        'scenarios': st.session_state['selected_scenarios'],
+        'disruptions': st.session_state['selected_disruption'],
+        'sheets': st.session_state['selected_sheets'],
+    }
+
+
+def selected_runs():
+    runs = []
+    for agent in st.session_state['selected_agents']:
+        for scenario in st.session_state['selected_scenarios']:
+            for disruption in st.session_state['selected_disruption']:
+                run = find_run(agent, scenario, disruption)
+                if run is not None:
+                    runs.append(run)
+    return runs
+
+
+def selection_changes():
+    # Diff the selected runs against the previous rerun of this session and return the (added, removed) runs.
+    # Runs are identified by their file signature, so a workbook that changed on disk counts as removed and
+    # added again.
+    current = {}
+    for agent in st.session_state['selected_agents']:
+        for scenario in st.session_state['selected_scenarios']:
+            for disruption in st.session_state['selected_disruption']:
+                run = get_catalog().lookup(agent, st.session_state['order_type'], disruption, scenario)
+                if run is not None:
+                    current[run_signature(run)] = run
+    previous = st.session_state.get('selection_runs', {})
+    st.session_state['selection_runs'] = current
+
+    added = [run for signature, run in current.items() if signature not in previous]
+    removed = [run for signature, run in previous.items() if signature not in current]
+    return added, removed
+
+
+def rendered_view(run, key, build):
+    # The view (e.g. a list of charts) built for this run and chart settings on an earlier rerun, by any
+    # session, or a new one. Views live in the shared loader cache, not in the session. The selected
+    # disruptions are part of the settings because the charts overlay all of their windows.
+    settings = ((st.session_state.get('chart_points', DEFAULT_CHART_POINTS),) + analysis_window() +
+                (tuple(st.session_state.get('rolling_statistics', [])),
+                 st.session_state.get('rolling_window', DEFAULT_ROLLING_WINDOW),
+                 tuple(st.session_state.get('selected_disruption', []))))
+    return loader_cache.get(('view',) + run_signature(run) + tuple(key) + settings, build)
+
+
+def selected_metrics():
+    # Summary metrics of every selected run; the tables below are views over this one frame
+    return run_metrics(selected_runs(), *analysis_window())
+
+
+def selected_intervals():
+    # Bootstrap intervals of every selected run when they are switched on in the sidebar, else None
+    if not st.session_state.get('bootstrap'):
+        return None
+    block = 'auto' if st.session_state['bootstrap_method'].startswith('Moving') else 1
+    warmup, horizon = analysis_window()
+    return bootstrap_intervals(selected_runs(), resamples=st.session_state['bootstrap_resamples'],
+                               seed=st.session_state['bootstrap_seed'], block=block, warmup=warmup, horizon=horizon)
 
 
 class UserInputs:
@@ -41,9 +199,6 @@ class UserInputs:
             st.session_state['welcome'] = True
         if 'selected_agents' not in st.session_state:
             st.session_state['selected_agents'] = ['basestock']
-        # Initialize it as an empty dictionary or appropriate default
-        if 'selected_data' not in st.session_state:
-            st.session_state['selected_data'] = {}
         if 'selected_disruption' not in st.session_state:  # Initialize selected_disruption
             st.session_state['selected_disruption'] = []
         if 'order_type' not in st.session_state:
@@ -62,33 +217,83 @@ class UserInputs:
 
     @staticmethod
     def agent_selector():
+        catalog = get_catalog()
         st.sidebar.write("### Data selections")
+        if st.sidebar.button("Rescan app_data"):
+            catalog = get_catalog(refresh=True)
+        if not len(catalog):
+            st.sidebar.warning("No result workbooks found in app_data.")
+        if catalog.unmatched:
+            st.sidebar.caption(f"Skipped {len(catalog.unmatched)} workbook(s) not named "
+                               f"DS1_MN1_{{agent}}_{{order type}}_{{disruption}}_s{{factor}}[_seed{{n}}].xlsx: "
+                               f"{', '.join(catalog.unmatched)}")
+
+        agents = catalog.options('agent')
         st.session_state['selected_agents'] = st.sidebar.multiselect(
             label="Select Intelligent agent (distributor#1) type:",
-            options=['DRL', 'DRL_RNN', 'basestock'],
-            default=['basestock']
+            options=agents,
+            default=[agent for agent in ['basestock'] if agent in agents] or agents[:1]
         )
 
         st.session_state['order_type'] = st.sidebar.radio(
             label="Select health centers ordering split-type:",
-            options=['HC1Trust-MN1Disrupted', 'HC1Trust-MN2Disrupted', 'Equal-MN1Disrupted',
-                     'Test-HC1Trust-MN1Disrupted'],
+            options=catalog.options('order_type'),
             # default=['UpToLevel_HC1Trust']
         )
 
+        disruptions = catalog.options('disruption')
         st.session_state['selected_disruption'] = st.sidebar.multiselect(
             label="Select disruption duration (s):",
-            options=['No disruption', 'short (67-72)', 'moderate (67-81)', 'long (67-86)', 'longest (67-98)',
-                     'multiple (67-72, 110-116)'],
-            default=['No disruption']
+            options=disruptions,
+            default=disruptions[:1]
         )
 
+        factors = catalog.options('factor')
         st.session_state['selected_scenarios'] = st.sidebar.multiselect(
             label="Select sensitivity factor(s):",
-            options=['0.1', '0.4', '0.5'],
-            default=['0.1']
+            options=factors,
+            default=factors[:1]
+        )
+
+        st.session_state['chart_points'] = st.sidebar.number_input(
+            label="Max points per chart:",
+            min_value=50,
+            max_value=20000,
+            value=DEFAULT_CHART_POINTS,
+            step=50
         )
 
+        # Analysis window of every chart and table; the disruption windows stay at the same simulation periods
+        st.session_state['warmup'] = st.sidebar.number_input(
+            label="Warm-up (periods left out):",
+            min_value=0,
+            value=WARMUP,
+            step=10
+        )
+        st.session_state['horizon'] = st.sidebar.number_input(
+            label="Horizon (last period):",
+            min_value=1,
+            value=HORIZON,
+            step=10,
+            placeholder="Last period of each run"
+        )
+        if st.session_state['horizon'] is not None and st.session_state['horizon'] <= st.session_state['warmup']:
+            st.sidebar.warning("The horizon must come after the warm-up; using one period.")
+            st.session_state['horizon'] = st.session_state['warmup'] + 1
+
+        # Rolling statistics drawn over the entity charts, see rolling.py
+        st.session_state['rolling_statistics'] = st.sidebar.multiselect(
+            label="Rolling statistics overlay (Order, Inventory, Backlog, Lead-time):",
+            options=ROLLING_STATISTICS,
+            format_func={'mean': 'Mean', 'std': 'STD', 'mad': 'MAD'}.get
+        )
+        if st.session_state['rolling_statistics']:
+            st.session_state['rolling_window'] = st.sidebar.selectbox(
+                label="Rolling window (periods):",
+                options=ROLLING_WINDOWS,
+                index=ROLLING_WINDOWS.index(DEFAULT_ROLLING_WINDOW)
+            )
+
         st.session_state['selected_sheets'] = st.sidebar.multiselect(
             label="Select DS1 and DS2 (MNs and HCs - TBA):",
             options=['DS 1 state', 'DS 2 state', 'MN 1 state', 'MN 2 state', 'HC 1 state', 'HC 2 state', 'HC 1 trust',
@@ -96,20 +301,44 @@ class UserInputs:
             default=['DS 1 state']
         )
 
+        # Bootstrap confidence intervals of the reward, backlog/inventory and order fluctuation tables
+        st.session_state['bootstrap'] = st.sidebar.checkbox("Show bootstrap confidence intervals")
+        if st.session_state['bootstrap']:
+            st.session_state['bootstrap_resamples'] = st.sidebar.number_input(
+                label="Bootstrap resamples:",
+                min_value=100,
+                max_value=20000,
+                value=DEFAULT_RESAMPLES,
+                step=100
+            )
+            st.session_state['bootstrap_method'] = st.sidebar.selectbox(
+                label="Resampling:",
+                options=['Moving blocks (autocorrelated periods)', 'Independent periods']
+            )
+            st.session_state['bootstrap_seed'] = st.sidebar.number_input(label="Bootstrap seed:", min_value=0, value=0)
+
+        # Runs that are still training, see tail.py
+        live = live_runs()
+        if live:
+            st.session_state['live_run'] = st.sidebar.selectbox(
+                label="Watch a live run:",
+                options=['Off'] + list(live)
+            )
+            st.session_state['live_interval'] = st.sidebar.number_input(
+                label="Refresh the live run every (seconds):",
+                min_value=1,
+                max_value=600,
+                value=LIVE_REFRESH_SECONDS
+            )
+        else:
+            st.session_state['live_run'] = 'Off'
+
 
 class InteractiveChart:
     def __init__(self):
         self._init_session_state()
         self.user_inputs = UserInputs()
-        self.df = None
-        self.disruptions = {
-            'No disruption': [{"start": 0, "end": 0}],
-            'short (67-72)': [{"start": 67, "end": 73}], 
-            'moderate (67-81)': [{"start": 67, "end": 82}],
-            'long (67-86)': [{"start": 67, "end": 87}],
-            'longest (67-98)': [{"start": 67, "end": 99}],
-            'multiple (67-72, 110-116)': [{"start": 67, "end": 73}, {"start": 110, "end": 117}],
-        }
+        self.disruptions = DISRUPTION_WINDOWS
 
     @staticmethod
     def _init_session_state():
@@ -117,8 +346,6 @@ class InteractiveChart:
             st.session_state['welcome'] = True
         if 'selected_agents' not in st.session_state:
             st.session_state['selected_agents'] = ['DRL']
-        if 'selected_data' not in st.session_state:
-            st.session_state['selected_data'] = {}
         if 'selected_scenarios' not in st.session_state:
             st.session_state['selected_scenarios'] = []
         if 'order_type' not in st.session_state:
@@ -126,50 +353,63 @@ class InteractiveChart:
         if 'selected_disruption' not in st.session_state:
             st.session_state['selected_disruption'] = 'short (67-72)'
 
+    @profiled
     def update_data(self):
-        selected_data = st.session_state.get("selected_data")
-        if selected_data is not None:
-            self.df = selected_data.copy()
-        else:
-            st.warning("No data selected. Please select data first.")
-            self.df = None
+        # Only the runs added since the previous rerun are fetched (all of them when the sheet selection
+        # changed), concurrently; the views below then read from the cache
+        added, _ = selection_changes()
+        selected_paths = {run.path for run in st.session_state['selection_runs'].values()}
+        if st.session_state.get('prefetched_sheets') != st.session_state['selected_sheets']:
+            added = list(st.session_state['selection_runs'].values())
+            st.session_state['prefetched_sheets'] = list(st.session_state['selected_sheets'])
+        added_paths = {run.path for run in added}
+        unreadable = {path: error for path, error in st.session_state.get('unreadable_runs', {}).items()
+                      if path in selected_paths and path not in added_paths}
+
+        progress_bar = st.sidebar.progress(0.0)
+        # Only the selected sheets; the other sections load what they need when they are opened
+        failures = load_runs(added, sheets=st.session_state['selected_sheets'],
+                             progress=lambda done, total: progress_bar.progress(
+                                 done / total, text=f"Loaded {done} of {total} runs"))
+        progress_bar.empty()
+        unreadable.update(failures)
+        for path, error in unreadable.items():
+            st.error(f"Could not read {path}: {error}")
+        st.session_state['unreadable_runs'] = unreadable
 
         for agent in st.session_state['selected_agents']:
             for scenario in st.session_state['selected_scenarios']:
                 for disruption in st.session_state['selected_disruption']:
-                    file_name = f"app_data/DS1_MN1_{agent}_{st.session_state['order_type']}_{disruption}_s{scenario}.xlsx"
+                    run = find_run(agent, scenario, disruption)
+                    if run is None:
+                        if get_catalog().lookup(agent, st.session_state['order_type'], disruption, scenario) is None:
+                            st.error(f"Data file not found: DS1_MN1_{agent}_{st.session_state['order_type']}_"
+                                     f"{disruption}_s{scenario}.xlsx")
+                        continue
+                    if run.path not in added_paths:
+                        continue  # kept from an earlier rerun
+                    file_name = run.path
                     try:
-                        data = load_data(file_name)
+                        data = load_run(run, sheets=st.session_state['selected_sheets'])
                     except FileNotFoundError:
                         st.error(f"Data file not found: {file_name}")
                         continue
 
-                    st.session_state['selected_data'][agent] = {}
-
-                    # Add the required sheets to the selected_data dictionary
-                    for sheet_name in ['HC 1 trust', 'HC 2 trust']:
-                        sheet_data = data.get(sheet_name, pd.DataFrame())
-                        if sheet_data.empty:
-                            st.write(f"No data for {sheet_name} in {file_name}")
-                            continue
-                        st.session_state['selected_data'][agent][sheet_name] = sheet_data
-
+                    # The sheets stay in the shared loader cache, where the sections read them. The trust sheets
+                    # are read by the box plot section when it is opened.
                     for sheet_name in st.session_state['selected_sheets']:
-                        sheet_data = data.get(sheet_name, pd.DataFrame())
-                        if sheet_data.empty:
+                        if data.get(sheet_name, pd.DataFrame()).empty:
                             st.write(f"No data for {sheet_name} in {file_name}")
-                            continue
-                        st.session_state['selected_data'][agent][sheet_name] = sheet_data
 
-    def draw_chart(self):
+    @profiled
+    def select_inputs(self):
+        # Welcome page and sidebar; runs before update_data so that every section sees this rerun's selection
 
         # Initialize session state variables if they're not already
         if 'order_type' not in st.session_state:
             st.session_state.order_type = []
         if 'selected_scenarios' not in st.session_state:
             st.session_state.selected_scenarios = []
-        if 'selected_data' not in st.session_state:
-            st.session_state.selected_data = {}
         if 'selected_agents' not in st.session_state:
             st.session_state.selected_agents = []
         if 'selected_sheets' not in st.session_state:
@@ -183,6 +423,11 @@ class InteractiveChart:
         else:
             self.user_inputs.agent_selector()
 
+    @profiled
+    def draw_chart(self):
+        if st.session_state['welcome']:
+            return  # Don't display anything on the welcome page
+
         # Clear previous content before displaying new content
         st.empty()
 
@@ -192,510 +437,233 @@ class InteractiveChart:
             st.write("Please select only one disruption to generate the chart.")
             return
 
+        rects = self.disruption_rects()
+
         for agent in st.session_state['selected_agents']:
             for scenario in st.session_state['selected_scenarios']:
-                for disruptions in st.session_state['selected_disruption']:
-                    file_name = f"app_data/DS1_MN1_{agent}_{st.session_state['order_type']}_{disruptions}_s{scenario}.xlsx"
-                    data = load_data(file_name)
-                    st.session_state['selected_data'].setdefault(agent, {})
+                for disruption in st.session_state['selected_disruption']:
+                    run = find_run(agent, scenario, disruption)
+                    if run is None:
+                        continue
+                    replications = get_catalog().replications(agent, st.session_state['order_type'], disruption,
+                                                              scenario)
 
                     for sheet_name in st.session_state['selected_sheets']:
-                        sheet_data = data.get(sheet_name, pd.DataFrame())
-                        if sheet_data.empty:
-                            st.write(f"No data for {sheet_name} in {file_name}")
+                        if len(replications) > 1 and sheet_name in BAND_SHEETS:
+                            self.draw_band_charts(agent, scenario, sheet_name, run, replications, rects)
+                            continue
+                        matrix = get_matrix(run, sheet_name)
+                        if matrix is None or not len(matrix):
+                            st.write(f"No data for {sheet_name} in {run.path}")
                             continue
-                        st.session_state['selected_data'][agent][sheet_name] = sheet_data
-
-                    # for sheet_name in st.session_state['selected_sheets']:
-                        if sheet_name == 'DS 1 state':
-                            if agent == 'DRL' or agent == 'DRL_RNN':
-                                df = sheet_data
-                                df = df[df['Time'] > 40]
-
-                                # Remove 'Order' and include other interested items
-                                common_items = ['Backlog', 'Demand', 'Up-to-level',
-                                                'Delivery', 'Inventory', 'Order']
-                                separate_items = ['Lead-time', 'Order_to_Demand Ratio']
-
-                                # Common items plot
-                                common_df = df[df['item'].isin(common_items)]
-                                common_pivoted = common_df.pivot(index='Time', columns='item', values='Value')
-
-                                if common_pivoted.empty:
-                                    st.write("no data!")
-
-                                common_pivoted['Time_plot'] = common_pivoted.index - 40
-                                common_modified = common_pivoted.reset_index()
-                                # common_modified.drop('Inventory_after_Allocation', axis=1, inplace=True)
-                                # common_items.remove('Inventory_after_Allocation')
-                                # #################################################################
-                                # #################################################################
-                                rects = []
-
-                                # Replace this part of your code where you get the selected disruption
-                                # st.session_state['selected_disruption'] is assumed to be a list of strings
-                                for selected_disruption in st.session_state['selected_disruption']:
-                                    if selected_disruption in self.disruptions:
-                                        disruptions = self.disruptions[selected_disruption]
-                                    else:
-                                        st.write(f"No data for disruption: {selected_disruption}")
-                                        continue
-
-                                # Rest of your code for processing disruptions
-                                for disruption in disruptions:
-                                    disruption_df = pd.DataFrame([disruption])
-                                    rects.append(alt.Chart(disruption_df).mark_rect().encode(
-                                        x='start:Q',
-                                        x2='end:Q',
-                                        color=alt.value('rgba(0, 128, 0, 0.5)')
-                                    ))
-
-                                line_common = alt.Chart(common_modified).transform_fold(
-                                    common_items,
-                                    as_=['item', 'Value']
-                                ).mark_line().encode(
-                                    x=alt.X('Time_plot:Q', title='Time Period'),
-                                    y='Value:Q',
-                                    color='item:N'
-                                )
-
-                                common_chart = alt.layer(line_common, *rects).properties(
-                                    width=500,
-                                    height=300,
-                                    title=f"Sensitivity factor: {scenario} - Agent: {agent} - Entity: DS 1 state"
-                                )
-
-                                st.altair_chart(common_chart, use_container_width=True)
-
-                                # Separate items plots
-                                for item in separate_items:
-                                    df_filtered = df[df['item'] == item]
-                                    df_pivoted = df_filtered.pivot(index='Time', columns='item', values='Value')
-
-                                    if df_pivoted.empty:
-                                        continue
-
-                                    df_pivoted['Time_plot'] = df_pivoted.index - 40
-                                    df_modified = df_pivoted.reset_index()
-
-                                    line_separate = alt.Chart(df_modified).mark_line().encode(
-                                        x=alt.X('Time_plot:Q', title='Time Period'),
-                                        y=alt.Y(f'{item}:Q', title=f'{item} Value'),
-                                        color=alt.value('blue')
-                                    )
-
-                                    # Adding baseline if the item is 'Order_to_Demand Ratio'
-                                    if item == 'Order_to_Demand Ratio':
-                                        baseline = alt.Chart(pd.DataFrame({'baseline': [1]})).mark_rule(color='red').encode(
-                                            y='baseline:Q'
-                                        )
-                                        separate_chart = alt.layer(line_separate, baseline, *rects).properties(
-                                            width=500,
-                                            height=300,
-                                            title=f"Sensitivity factor: {scenario} - Agent: {agent} - Item: {item}"
-                                        )
-                                    else:
-                                        separate_chart = alt.layer(line_separate, *rects).properties(
-                                            width=500,
-                                            height=300,
-                                            title=f"Sensitivity factor: {scenario} - Agent: {agent} - Item: {item}"
-                                        )
-
-                                    st.altair_chart(separate_chart, use_container_width=True)
-                            else:
-                                df = sheet_data
-
-                                df = df[df['Time'] > 40]
-                                # df = df[df['Time'] > 0]
-
-                                # Remove 'Order' and include other interested items
-                                common_items = ['Backlog', 'Demand', 'Up-to-level', 'Inventory', 'Order', 'Delivery']
-                                separate_items = ['Lead-time', 'Order_to_Demand Ratio']
-
-                                # Common items plot
-                                common_df = df[df['item'].isin(common_items)]
-                                common_pivoted = common_df.pivot(index='Time', columns='item', values='Value')
-
-                                if common_pivoted.empty:
-                                    continue
-
-                                common_pivoted['Time_plot'] = common_pivoted.index - 40
-                                # common_pivoted['Time_plot'] = common_pivoted.index
-
-                                common_modified = common_pivoted.reset_index()
-
-                                rects = []
-
-                                # Replace this part of your code where you get the selected disruption
-                                # st.session_state['selected_disruption'] is assumed to be a list of strings
-                                for selected_disruption in st.session_state['selected_disruption']:
-                                    if selected_disruption in self.disruptions:
-                                        disruptions = self.disruptions[selected_disruption]
-                                    else:
-                                        st.write(f"No data for disruption: {selected_disruption}")
-                                        continue
-
-                                # Rest of your code for processing disruptions
-                                for disruption in disruptions:
-                                    disruption_df = pd.DataFrame([disruption])
-                                    rects.append(alt.Chart(disruption_df).mark_rect().encode(
-                                        x='start:Q',
-                                        x2='end:Q',
-                                        color=alt.value('rgba(0, 128, 0, 0.5)')
-                                    ))
-
-                                line_common = alt.Chart(common_modified).transform_fold(
-                                    common_items,
-                                    as_=['item', 'Value']
-                                ).mark_line().encode(
-                                    x=alt.X('Time_plot:Q', title='Time Period'),
-                                    y='Value:Q',
-                                    color='item:N'
-                                )
-
-                                common_chart = alt.layer(line_common, *rects).properties(
-                                    width=500,
-                                    height=300,
-                                    title=f"Sensitivity factor: {scenario} - Agent: {agent} - Entity: {sheet_name}"
-                                )
-
-                                st.altair_chart(common_chart, use_container_width=True)
-
-                                # Separate items plots
-                                for item in separate_items:
-                                    df_filtered = df[df['item'] == item]
-                                    df_pivoted = df_filtered.pivot(index='Time', columns='item', values='Value')
-
-                                    if df_pivoted.empty:
-                                        continue
-
-                                    df_pivoted['Time_plot'] = df_pivoted.index - 40
-                                    # df_pivoted['Time_plot'] = df_pivoted.index
-
-                                    df_modified = df_pivoted.reset_index()
-
-                                    line_separate = alt.Chart(df_modified).mark_line().encode(
-                                        x=alt.X('Time_plot:Q', title='Time Period'),
-                                        y=alt.Y(f'{item}:Q', title=f'{item} Value'),
-                                        color=alt.value('blue')
-                                    )
-
-                                    # Adding baseline if the item is 'Order_to_Demand Ratio'
-                                    if item == 'Order_to_Demand Ratio':
-                                        baseline = alt.Chart(pd.DataFrame({'baseline': [1]})).mark_rule(
-                                            color='red').encode(
-                                            y='baseline:Q'
-                                        )
-                                        separate_chart = alt.layer(line_separate, baseline, *rects).properties(
-                                            width=500,
-                                            height=300,
-                                            title=f"Sensitivity factor: {scenario} - Agent: {agent} - Item: {item}"
-                                        )
-                                    else:
-                                        separate_chart = alt.layer(line_separate, *rects).properties(
-                                            width=500,
-                                            height=300,
-                                            title=f"Sensitivity factor: {scenario} - Agent: {agent} - Item: {item}"
-                                        )
-
-                                    st.altair_chart(separate_chart, use_container_width=True)
-                        else:
-                            df = sheet_data
-                            df = df[df['Time'] > 40]
-                            if (agent == 'DRL' and sheet_name == 'DS 2 state') or (agent == 'DRL_RNN' and sheet_name == 'DS 2 state'):
-
-                                backlog_df = df[df['item'] == 'Backlog'].copy()
-
-                                # Create a DataFrame for Order_to_Demand Ratio
-                                demand_df = df[df['item'] == 'Demand'].copy()
-                                order_df = df[df['item'] == 'Order'].copy()
-                                demand_df['Value'] = order_df['Value'].values / demand_df['Value']
-                                demand_df['item'] = 'Order_to_Demand Ratio'
-                                df = pd.concat([df, demand_df], ignore_index=True)
-
-                                # Remove 'Order' and include other interested items
-                                common_items = ['Backlog', 'Demand', 'Up-to-level', 'Order',
-                                                'Delivery', 'Inventory']
-
-                                # Common items plot
-                                common_df = df[df['item'].isin(common_items)]
-                                common_pivoted = common_df.pivot(index='Time', columns='item', values='Value')
-
-                                common_pivoted['Inventory'] = common_pivoted[
-                                    'Inventory'].apply(lambda x: max(0, x))
-                                common_pivoted['Backlog'] = common_pivoted[
-                                    'Backlog'].apply(lambda x: max(0, x))
-                               
-                                separate_items = ['Lead-time', 'Order_to_Demand Ratio']
-
-                                if common_pivoted.empty:
-                                    continue
-                                ###################################################################
-                                ###################################################################
-                                common_pivoted['Time_plot'] = common_pivoted.index - 40
-                                common_modified = common_pivoted.reset_index()
-                                ###################################################################
-                                ###################################################################
-
-                                rects = []
-
-                                for selected_disruption in st.session_state['selected_disruption']:
-                                    if selected_disruption in self.disruptions:
-                                        disruptions = self.disruptions[selected_disruption]
-                                    else:
-                                        st.write(f"No data for disruption: {selected_disruption}")
-                                        continue
-
-                                # Rest of your code for processing disruptions
-                                for disruption in disruptions:
-                                    disruption_df = pd.DataFrame([disruption])
-                                    rects.append(alt.Chart(disruption_df).mark_rect().encode(
-                                        x='start:Q',
-                                        x2='end:Q',
-                                        color=alt.value('rgba(0, 128, 0, 0.5)')
-                                    ))
-
-                                line_common = alt.Chart(common_modified).transform_fold(
-                                    common_items,
-                                    as_=['item', 'Value']
-                                ).mark_line().encode(
-                                    x=alt.X('Time_plot:Q', title='Time Period'),
-                                    y='Value:Q',
-                                    color='item:N'
-                                )
-
-                                common_chart = alt.layer(line_common, *rects).properties(
-                                    width=500,
-                                    height=300,
-                                    title=f"Sensitivity factor: {scenario} - Agent: {agent} - Entity: {sheet_name}"
-                                )
-
-                                st.altair_chart(common_chart, use_container_width=True)
-
-                                # Separate items plots
-                                for item in separate_items:
-                                    df_filtered = df[df['item'] == item]
-                                    df_pivoted = df_filtered.pivot(index='Time', columns='item', values='Value')
-
-                                    if df_pivoted.empty:
-                                        continue
-
-                                    df_pivoted['Time_plot'] = df_pivoted.index - 40
-                                    df_modified = df_pivoted.reset_index()
-
-                                    line_separate = alt.Chart(df_modified).mark_line().encode(
-                                        x=alt.X('Time_plot:Q', title='Time Period'),
-                                        y=alt.Y(f'{item}:Q', title=f'{item} Value'),
-                                        color=alt.value('blue')
-                                    )
-
-                                    # Adding baseline if the item is 'Order_to_Demand Ratio'
-                                    if item == 'Order_to_Demand Ratio':
-                                        baseline = alt.Chart(pd.DataFrame({'baseline': [1]})).mark_rule(
-                                            color='red').encode(
-                                            y='baseline:Q'
-                                        )
-                                        separate_chart = alt.layer(line_separate, baseline, *rects).properties(
-                                            width=500,
-                                            height=300,
-                                            title=f"Sensitivity factor: {scenario} - Agent: {agent} - Item: {item}"
-                                        )
-                                    else:
-                                        separate_chart = alt.layer(line_separate, *rects).properties(
-                                            width=500,
-                                            height=300,
-                                            title=f"Sensitivity factor: {scenario} - Agent: {agent} - Item: {item}"
-                                        )
-
-                                    st.altair_chart(separate_chart, use_container_width=True)
-                            else:
-                                # df = st.session_state['selected_data'][agent][sheet_name]
-                                df = sheet_data
-
-                                df = df[df['Time'] > 40]
-
-                                    # Create a DataFrame for Order_to_Demand Ratio
-                                    demand_df = df[df['item'] == 'Demand'].copy()
-                                    order_df = df[df['item'] == 'Order'].copy()
-                                    demand_df['Value'] = order_df['Value'].values / demand_df['Value']
-                                    demand_df['item'] = 'Order_to_Demand Ratio'
-                                    df = pd.concat([df, demand_df], ignore_index=True)
-
-                                    common_items = ['Backlog', 'Demand', 'Up-to-level',
-                                                    'Delivery', 'Inventory', 'Order']
-                                    common_df = df[df['item'].isin(common_items)]
-                                    common_pivoted = common_df.pivot(index='Time', columns='item', values='Value')
-
-                                  
-                                    common_df = df[df['item'].isin(common_items)]
-                                    common_pivoted = common_df.pivot(index='Time', columns='item', values='Value')
-
-                                    
-                                    common_items = ['Demand', 'Up-to-level', 'Backlog', 'Inventory',
-                                                    'Production amount', 'In production']
-
-                                separate_items = ['Lead-time', 'Order_to_Demand Ratio']
-
-                                if common_pivoted.empty:
-                                    continue
-
-                                common_pivoted['Time_plot'] = common_pivoted.index - 40
-                                # common_pivoted['Time_plot'] = common_pivoted.index
-
-                                common_modified = common_pivoted.reset_index()
-
-                                rects = []
-
-                                # Replace this part of your code where you get the selected disruption
-                                # st.session_state['selected_disruption'] is assumed to be a list of strings
-                                for selected_disruption in st.session_state['selected_disruption']:
-                                    if selected_disruption in self.disruptions:
-                                        disruptions = self.disruptions[selected_disruption]
-                                    else:
-                                        st.write(f"No data for disruption: {selected_disruption}")
-                                        continue
-
-                                # Rest of your code for processing disruptions
-                                for disruption in disruptions:
-                                    disruption_df = pd.DataFrame([disruption])
-                                    rects.append(alt.Chart(disruption_df).mark_rect().encode(
-                                        x='start:Q',
-                                        x2='end:Q',
-                                        color=alt.value('rgba(0, 128, 0, 0.5)')
-                                    ))
-
-                                line_common = alt.Chart(common_modified).transform_fold(
-                                    common_items,
-                                    as_=['item', 'Value']
-                                ).mark_line().encode(
-                                    x=alt.X('Time_plot:Q', title='Time Period'),
-                                    y='Value:Q',
-                                    color='item:N'
-                                )
-
-                                common_chart = alt.layer(line_common, *rects).properties(
-                                    width=500,
-                                    height=300,
-                                    title=f"Sensitivity factor: {scenario} - Agent: {agent} - Entity: {sheet_name}"
-                                )
-
-                                st.altair_chart(common_chart, use_container_width=True)
-
-                                # Separate items plots
-                                for item in separate_items:
-                                    df_filtered = df[df['item'] == item]
-                                    df_pivoted = df_filtered.pivot(index='Time', columns='item', values='Value')
-
-                                    if df_pivoted.empty:
-                                        continue
-
-                                    # df_pivoted['Time_plot'] = df_pivoted.index - 40
-                                    df_pivoted['Time_plot'] = df_pivoted.index - 40
-                                    df_modified = df_pivoted.reset_index()
-
-                                    line_separate = alt.Chart(df_modified).mark_line().encode(
-                                        x=alt.X('Time_plot:Q', title='Time Period'),
-                                        y=alt.Y(f'{item}:Q', title=f'{item} Value'),
-                                        color=alt.value('blue')
-                                    )
-
-                                    # Adding baseline if the item is 'Order_to_Demand Ratio'
-                                    if item == 'Order_to_Demand Ratio':
-                                        baseline = alt.Chart(pd.DataFrame({'baseline': [1]})).mark_rule(
-                                            color='red').encode(
-                                            y='baseline:Q'
-                                        )
-                                        separate_chart = alt.layer(line_separate, baseline, *rects).properties(
-                                            width=500,
-                                            height=300,
-                                            title=f"Sensitivity factor: {scenario} - Agent: {agent} - Item: {item}"
-                                        )
-                                    else:
-                                        separate_chart = alt.layer(line_separate, *rects).properties(
-                                            width=500,
-                                            height=300,
-                                            title=f"Sensitivity factor: {scenario} - Agent: {agent} - Item: {item}"
-                                        )
-
-                                    st.altair_chart(separate_chart, use_container_width=True)
+                        self.draw_entity_charts(agent, scenario, sheet_name, run, matrix, rects,
+                                                self.disruption_windows(offset=DISRUPTION_OFFSET))
+
+    @profiled
+    def disruption_rects(self, offset=None, disruptions=None):
+        # Green overlays for the windows of the given disruptions (default: the selected ones). By default they
+        # are placed on the Time_plot axis of the entity charts, which counts periods from the warm-up.
+        if offset is None:
+            offset = DISRUPTION_OFFSET - analysis_window()[0]
+        rects = []
+        for selected_disruption in disruptions or st.session_state['selected_disruption']:
+            if selected_disruption not in self.disruptions:
+                st.write(f"No data for disruption: {selected_disruption}")
+                continue
+            disruption_df = pd.DataFrame([{'start': disruption['start'] + offset, 'end': disruption['end'] + offset}
+                                          for disruption in self.disruptions[selected_disruption]])
+            rects.append(alt.Chart(disruption_df).mark_rect().encode(
+                x='start:Q',
+                x2='end:Q',
+                color=alt.value('rgba(0, 128, 0, 0.5)')
+            ))
+        return rects
+
+    @profiled
+    def disruption_windows(self, offset=0, disruptions=None):
+        # (start, end) periods of the given (default: selected) disruptions; chart_series keeps them at full
+        # resolution
+        return tuple((disruption['start'] + offset, disruption['end'] + offset)
+                     for selected_disruption in disruptions or st.session_state['selected_disruption']
+                     for disruption in self.disruptions.get(selected_disruption, []))
 
     @staticmethod
+    @profiled
+    def draw_entity_charts(agent, scenario, sheet_name, run, matrix, rects, windows):
+        # Charts of a run that stayed selected are reused from the previous rerun instead of being rebuilt
+        charts = rendered_view(run, ('entity_charts', sheet_name), lambda: InteractiveChart.entity_charts(
+            agent, scenario, sheet_name, run, matrix, rects, windows))
+        for chart in charts:
+            st.altair_chart(chart, use_container_width=True)
+
+    @staticmethod
+    @profiled
+    def draw_band_charts(agent, scenario, sheet_name, run, replications, rects):
+        # Mean and 5-95% / 25-75% bands of every item across the seeds of one combination
+        failures = load_runs(replications, sheets=[sheet_name])
+        for path, error in failures.items():
+            st.error(f"Could not read {path}: {error}")
+        runs = [replication for replication in replications if replication.path not in failures]
+        key = ('band_charts', sheet_name) + tuple(run_signature(replication) for replication in runs)
+        for chart in rendered_view(run, key, lambda: InteractiveChart.band_charts(agent, scenario, sheet_name, runs,
+                                                                                   rects)):
+            st.altair_chart(chart, use_container_width=True)
+
+    @staticmethod
+    @profiled
+    def band_charts(agent, scenario, sheet_name, runs, rects):
+        charts = []
+        budget = st.session_state.get('chart_points', DEFAULT_CHART_POINTS)
+        for items in [entity_items(sheet_name), ['Lead-time']]:
+            # Same derived series as entity_charts (e.g. clipping), computed for every seed before the statistics
+            derived = {item: name for item, name in entity_derived(agent, sheet_name).items() if item in items}
+            bands = get_bands(runs, sheet_name, items, derived=derived)
+            warmup, horizon = analysis_window()
+            rows = np.arange(*window_rows(bands.time, warmup, horizon))
+            # Every step-th period, so that the chart stays within the point budget
+            rows = rows[::max(1, math.ceil(len(rows) * len(items) / budget))]
+            if not len(rows) or np.isnan(bands.mean[rows]).all():
+                continue
+
+            band_df = pd.DataFrame({
+                'Time_plot': np.repeat(bands.time[rows] - warmup, len(items)),
+                'item': np.tile(np.array(items, dtype=object), len(rows)),
+                'Mean': bands.mean[rows].ravel(),
+                'Q05': bands.quantile(0.05)[rows].ravel(),
+                'Q25': bands.quantile(0.25)[rows].ravel(),
+                'Q75': bands.quantile(0.75)[rows].ravel(),
+                'Q95': bands.quantile(0.95)[rows].ravel(),
+            }).dropna(subset=['Mean'])
+
+            base = alt.Chart(band_df).encode(
+                x=alt.X('Time_plot:Q', title='Time Period'),
+                color='item:N'
+            )
+            outer = base.mark_area(opacity=0.15).encode(y=alt.Y('Q05:Q', title='Value'), y2='Q95:Q')
+            inner = base.mark_area(opacity=0.3).encode(y='Q25:Q', y2='Q75:Q')
+            line = base.mark_line().encode(y='Mean:Q', tooltip=['Time_plot', 'item', 'Mean', 'Q05', 'Q95'])
+
+            charts.append(alt.layer(outer, inner, line, *rects).properties(
+                width=500,
+                height=300,
+                title=f"Sensitivity factor: {scenario} - Agent: {agent} - "
+                      f"{'Item: Lead-time' if items == ['Lead-time'] else f'Entity: {sheet_name}'} - "
+                      f"mean and 5-95% / 25-75% bands over {len(runs)} seeds"
+            ))
+        return charts
+
+    @staticmethod
+    @profiled
+    def entity_charts(agent, scenario, sheet_name, run, matrix, rects, windows):
+        charts = []
+        warmup, horizon = analysis_window()
+        derived = entity_derived(agent, sheet_name)
+        full = with_derived(run, sheet_name, matrix, derived)
+        matrix = full.window(after=warmup, until=horizon)
+        separate_items = ['Lead-time', 'Order_to_Demand Ratio']
+
+        common_items = entity_items(sheet_name)
+
+        # Common items plot
+        common = matrix.select(common_items)
+        if not common.items:
+            return charts
+
+        common_modified = chart_series(run, sheet_name, common, windows)
+        common_modified['Time_plot'] = common_modified['Time'] - warmup
+
+        line_common = alt.Chart(common_modified).mark_line().encode(
+            x=alt.X('Time_plot:Q', title='Time Period'),
+            y='Value:Q',
+            color='item:N'
+        )
+
+        overlays = rolling_overlays(run, sheet_name, full, {item: derived.get(item, item) for item in common.items})
+        common_chart = alt.layer(line_common, *overlays, *rects).properties(
+            width=500,
+            height=300,
+            title=f"Sensitivity factor: {scenario} - Agent: {agent} - Entity: {sheet_name}"
+        )
+
+        charts.append(common_chart)
+
+        # Separate items plots
+        for item in separate_items:
+            if item not in matrix:
+                continue
+
+            df_modified = chart_series(run, sheet_name, matrix.select([item]), windows)
+            df_modified = df_modified.drop(columns='item').rename(columns={'Value': item})
+            df_modified['Time_plot'] = df_modified['Time'] - warmup
+
+            line_separate = alt.Chart(df_modified).mark_line().encode(
+                x=alt.X('Time_plot:Q', title='Time Period'),
+                y=alt.Y(f'{item}:Q', title=f'{item} Value'),
+                color=alt.value('blue')
+            )
+
+            # Adding baseline if the item is 'Order_to_Demand Ratio'
+            if item == 'Order_to_Demand Ratio':
+                baseline = alt.Chart(pd.DataFrame({'baseline': [1]})).mark_rule(color='red').encode(
+                    y='baseline:Q'
+                )
+                separate_chart = alt.layer(line_separate, baseline, *rects).properties(
+                    width=500,
+                    height=300,
+                    title=f"Sensitivity factor: {scenario} - Agent: {agent} - Item: {item}"
+                )
+            else:
+                overlays = rolling_overlays(run, sheet_name, full, {item: derived.get(item, item)}, color='blue')
+                separate_chart = alt.layer(line_separate, *overlays, *rects).properties(
+                    width=500,
+                    height=300,
+                    title=f"Sensitivity factor: {scenario} - Agent: {agent} - Item: {item}"
+                )
+
+            charts.append(separate_chart)
+        return charts
+
+    @staticmethod
+    @profiled
     def display_time_taken():
+        # Only the time_taken_ files of the selected combinations are read
+        combinations = [(agent, st.session_state['order_type'], disruption, scenario)
+                        for agent in st.session_state["selected_agents"]
+                        for scenario in st.session_state["selected_scenarios"]
+                        for disruption in st.session_state["selected_disruption"]]
+        selected, failures = runtime_table(get_catalog(), combinations)
+        for path, error in failures.items():
+            st.warning(f"Could not read {path}: {error}")
         for agent in st.session_state["selected_agents"]:
             for scenario in st.session_state["selected_scenarios"]:
                 for disruption in st.session_state["selected_disruption"]:
-                    file_name_time = f"app_data/time_taken_DS1_MN1_{agent}_{st.session_state['order_type']}_{disruption}_s{scenario}.xlsx"
-                    time_df = load_time_taken_data(file_name_time)
-
+                    # Episodes of every seed of the combination
+                    time_df = selected[(selected['agent'] == agent) & (selected['factor'] == scenario) &
+                                       (selected['disruption'] == disruption)]
                     if time_df.empty:
                         st.write(f"No 'Time Taken' data for agent {agent} in Sensitivity factor {scenario}")
                         continue
 
+                    avg_time = time_df['seconds'].mean()
                     st.markdown(
                         f"<span style='color: blue; font-weight: bold;'>Average run time in seconds for {agent}"
                         f" with Sensitivity factor {scenario} = {avg_time:.2f} </span>",
                         unsafe_allow_html=True)
 
-                # st.write(avg_time)
+        if len(selected):
+            st.write("Decision latency (ms) and throughput of the selected runs; see the Runtime page to compare "
+                     "agents")
+            st.dataframe(latency_table(selected, by=['agent', 'disruption', 'factor']).rename(columns=LATENCY_LABELS),
+                         hide_index=True)
 
     @staticmethod
+    @profiled
     def display_rewards():
-        if "selected_data" not in st.session_state or st.session_state["selected_data"] is None:
+        if not selected_runs():
             st.warning("No data selected. Please select data first.")
             return
 
-        # Initialize an empty DataFrame to collect all the reward data
-        all_avg_rewards = pd.DataFrame(
-            columns=['DS1 Agent', 'Disruption Duration', 'Entity'])
-
-        # Initialize a dictionary to store the sum of average rewards
-        sum_avg_rewards = {
-            'DS1 Agent': [],
-            'Disruption Duration': [],
-            'Entity': [],
-            'Value': []  # This will store the sum of average rewards
-        }
-
-        for agent in st.session_state["selected_agents"]:
-            for scenario in st.session_state["selected_scenarios"]:
-                for disruption in st.session_state["selected_disruption"]:
-                    file_name = f"app_data/DS1_MN1_{agent}_{st.session_state['order_type']}_{disruption}_s{scenario}.xlsx"
-                    data = load_data(file_name)
-
-                    # Display average rewards
-                    if 'Reward' in data:
-                        reward_df = data['Reward']
-                        reward_df = reward_df[reward_df['Time'] > 40]
-                        avg_rewards = reward_df.groupby("Agent")["Value"].mean().reset_index()
-
-                        # Rename 'Agent' to 'Entity'
-                        avg_rewards.rename(columns={"Agent": "Entity"}, inplace=True)
-
-                        # Calculate the sum of average rewards for this combination
-                        sum_avg_reward = avg_rewards['Value'].sum()
-
-                        # Add the sum to the dictionary
-                        sum_avg_rewards['DS1 Agent'].append(agent)
-                        sum_avg_rewards['Disruption Duration'].append(disruption)
-                        sum_avg_rewards['Entity'].append('Sum All Entities')
-                        sum_avg_rewards['Value'].append(sum_avg_reward)
-
-                        # Add additional columns for 'Scenario' and 'Disruption'
-                        avg_rewards['Sensitivity Factor'] = scenario
-                        avg_rewards['Disruption Duration'] = disruption
-                        avg_rewards['DS1 Agent'] = agent  # Since you're calculating the rewards for specific agents
-
-                        # Append this data to the main DataFrame
-                        all_avg_rewards = pd.concat([all_avg_rewards, avg_rewards], ignore_index=True)
-
-                    else:
-                        st.write(f"No 'Reward' sheet in {file_name}")
-
-        # Add the sum of rewards to the DataFrame
-        sum_avg_rewards_df = pd.DataFrame(sum_avg_rewards)
-
-        # Append the sum data to the main DataFrame
-        all_avg_rewards = pd.concat([all_avg_rewards, sum_avg_rewards_df], ignore_index=True)
+        all_avg_rewards = reward_table(selected_metrics(), current_selection(), selected_intervals())
 
         # Show the combined DataFrame as a table
         if not all_avg_rewards.empty:
@@ -705,74 +673,17 @@ class InteractiveChart:
             st.write("")
 
     @staticmethod
+    @profiled
     def display_backlog_inventory():
         if st.session_state['welcome']:
             return  # Don't display anything on the welcome page
 
-        if "selected_data" not in st.session_state or st.session_state["selected_data"] is None:
+        if not selected_runs():
             st.warning("No data selected. Please select data first.")
             return
 
-        # Initialize an empty list to hold all order fluctuation data for different scenarios, agents, and disruptions
-        all_backlog_data = []
-        all_inventory_data = []
-
-        for selected_agent in st.session_state["selected_agents"]:
-            for sheet_name in st.session_state["selected_sheets"]:
-                for selected_scenario in st.session_state["selected_scenarios"]:
-                    # Check if the selected state is one of the specified options
-                    valid_state_options = ['DS 1 state', 'DS 2 state']
-                    if sheet_name not in valid_state_options:
-                        continue
-
-                    # Reformatting the sheet name
-                    simplified_sheet_name = " ".join(sheet_name.split(" ")[:2])
-
-                    for disruption in st.session_state["selected_disruption"]:
-                        # Load data for the selected sensitivity factor
-                        file_name = f"app_data/DS1_MN1_{selected_agent}_{st.session_state['order_type']}_{disruption}_s{selected_scenario}.xlsx"
-                        data = load_data(file_name)
-
-                        if sheet_name in data:
-                            df = data[sheet_name]
-                        else:
-                            st.write(
-                                f"No data for {simplified_sheet_name} for agent {selected_agent} in Sensitivity factor {selected_scenario}")
-                            continue
-                        df = df[df['Time'] > 40]
-
-                        backlog_df = df[df['item'] == 'Backlog'].copy()
-                        inventory_df = df[df['item'] == 'Inventory'].copy()
-                        # st.write(df[df['item'] == 'Backlog'])
-
-                        mean_backlog = backlog_df['Value'].mean()
-                        std_backlog = backlog_df['Value'].std()
-
-                        mean_inventory = inventory_df['Value'].mean()
-                        std_inventory = inventory_df['Value'].std()
-
-
-                        all_backlog_data.append({
-                            'DS1 Agent': selected_agent,  # Set 'DS1 Agent' to the current agent
-                            'Entity': simplified_sheet_name,
-                            'Sensitivity Factor': selected_scenario,
-                            'Disruption': disruption,
-                            'Mean Backlog': mean_backlog,
-                            'STD': std_backlog
-                        })
-
-                        all_inventory_data.append({
-                            'DS1 Agent': selected_agent,  # Set 'DS1 Agent' to the current agent
-                            'Entity': simplified_sheet_name,
-                            'Sensitivity Factor': selected_scenario,
-                            'Disruption': disruption,
-                            'Mean Inventory': mean_inventory,
-                            'STD': std_inventory
-                        })
-
-        # Convert all collected data to a DataFrame
-        all_backlog_data_df = pd.DataFrame(all_backlog_data)
-        all_inventory_data_df = pd.DataFrame(all_inventory_data)
+        all_backlog_data_df, all_inventory_data_df = backlog_inventory_tables(selected_metrics(), current_selection(),
+                                                                                  selected_intervals())
 
         if not all_backlog_data_df.empty:
             st.markdown("###### Mean and STD of Backlog")
@@ -787,8 +698,9 @@ class InteractiveChart:
             st.write("")
 
     @staticmethod
+    @profiled
     def draw_box_plots():
-        if "selected_data" not in st.session_state or st.session_state["selected_data"] is None:
+        if not selected_runs():
             st.warning("No data selected. Please select data first.")
             return
 
@@ -796,38 +708,27 @@ class InteractiveChart:
             for scenario in st.session_state["selected_scenarios"]:
                 for disruption in st.session_state["selected_disruption"]:
                     # Your code for loading data
-                    file_name = f"app_data/DS1_MN1_{agent}_{st.session_state['order_type']}_{disruption}_s{scenario}.xlsx"
-                    data = load_data(file_name)
-
-                    if "HC 1 trust" in data:
-                        hc1_trust_df = data["HC 1 trust"]
-                        hc1_trust_df = hc1_trust_df[hc1_trust_df['Time'] > 40]
-                    else:
-                        st.write(f"No data for 'HC 1 trust' for agent {agent} in Sensitivity factor {scenario}")
+                    run = find_run(agent, scenario, disruption)
+                    if run is None:
                         continue
-
-                    if "HC 2 trust" in data:
-                        hc2_trust_df = data["HC 2 trust"]
-                        hc2_trust_df = hc2_trust_df[hc2_trust_df['Time'] > 40]
-                    else:
-                        st.write(f"No data for 'HC 2 trust' for agent {agent} in Sensitivity factor {scenario}")
+                    # The catalog knows which sheets a run has; a trust sheet is only read once its box is ticked
+                    missing = [sheet_name for sheet_name in ['HC 1 trust', 'HC 2 trust']
+                               if sheet_name not in run.sheets]
+                    if missing:
+                        st.write(f"No data for '{missing[0]}' for agent {agent} in Sensitivity factor {scenario}")
                         continue
 
-                    
-
                     hc1_checkbox_key = f"hc1_checkbox_{agent}_{scenario}_{disruption}"
 
                     if st.checkbox(f"HC 1 trust - {agent} - Sensitivity factor {scenario} - Disruption {disruption}",
                                    key=hc1_checkbox_key):
                         st.write(
                             f"HC 1 trust data for {agent} in Sensitivity factor {scenario} - Disruption {disruption}:")
+                        # Periods of the analysis window, cut out of the sorted matrix by binary search
+                        hc1_trust = get_matrix(run, 'HC 1 trust').window(*plot_window())
 
-                        hc1_trust_ds1 = hc1_trust_df[
-                            (hc1_trust_df['item'] == 'Trust DS 1') & (hc1_trust_df['Time'].between(40, 300))
-                            ]
-                        hc1_trust_ds2 = hc1_trust_df[
-                            (hc1_trust_df['item'] == 'Trust DS 2') & (hc1_trust_df['Time'].between(40, 300))
-                            ]
+                        hc1_trust_ds1 = hc1_trust.select(['Trust DS 1']).to_long()
+                        hc1_trust_ds2 = hc1_trust.select(['Trust DS 2']).to_long()
 
                         combined_hc1_data = pd.concat([hc1_trust_ds1, hc1_trust_ds2])
 
@@ -840,14 +741,7 @@ class InteractiveChart:
                         st.write(f"Mean and STD value for HC 1 Trust DS 1: {mean_ds1: .2f} ± {std_ds1: .2f}")
                         st.write(f"Mean and STD value for HC 1 Trust DS 2: {mean_ds2: .2f} ± {std_ds2: .2f}")
 
-                        boxplot_hc1_combined = alt.Chart(combined_hc1_data).mark_boxplot().encode(
-                            x=alt.X('item:N', title='Trust Type'),
-                            y=alt.Y('Value:Q', title='Trust Value'),
-                            color=alt.Color('item:N', title='Trust Type', scale=alt.Scale(range=['blue', 'red']))
-                        ).properties(
-                            width=500,
-                            height=300
-                        )
+                        boxplot_hc1_combined = InteractiveChart.trust_box_plot(combined_hc1_data, ['blue', 'red'])
 
                         st.altair_chart(boxplot_hc1_combined, use_container_width=True)
 
@@ -859,13 +753,11 @@ class InteractiveChart:
                             key=hc2_checkbox_key):
                         st.write(
                             f"HC 2 trust data for {agent} in Sensitivity factor {scenario} - Disruption {disruption}:")
+                        # Periods of the analysis window, cut out of the sorted matrix by binary search
+                        hc2_trust = get_matrix(run, 'HC 2 trust').window(*plot_window())
 
-                        hc2_trust_ds1 = hc2_trust_df[
-                            (hc2_trust_df['item'] == 'Trust DS 1') & (hc2_trust_df['Time'].between(40, 300))
-                            ]
-                        hc2_trust_ds2 = hc2_trust_df[
-                            (hc2_trust_df['item'] == 'Trust DS 2') & (hc2_trust_df['Time'].between(40, 300))
-                            ]
+                        hc2_trust_ds1 = hc2_trust.select(['Trust DS 1']).to_long()
+                        hc2_trust_ds2 = hc2_trust.select(['Trust DS 2']).to_long()
 
                         combined_hc2_data = pd.concat([hc2_trust_ds1, hc2_trust_ds2])
 
@@ -882,73 +774,35 @@ class InteractiveChart:
                         st.write(f"Mean value for HC 2 Trust DS 1: {mean_ds21: .2f}")
                         st.write(f"Mean value for HC 2 Trust DS 2: {mean_ds22: .2f}")
 
-                        boxplot_hc2_combined = alt.Chart(combined_hc2_data).mark_boxplot().encode(
-                            x=alt.X('item:N', title='Trust Type'),
-                            y=alt.Y('Value:Q', title='Trust Value'),
-                            color=alt.Color('item:N', title='Trust Type',
-                                            scale=alt.Scale(range=['green', 'orange']))
-                        ).properties(
-                            width=500,
-                            height=300
-                        )
+                        boxplot_hc2_combined = InteractiveChart.trust_box_plot(combined_hc2_data,
+                                                                               ['green', 'orange'])
 
                         st.altair_chart(boxplot_hc2_combined, use_container_width=True)
 
     @staticmethod
+    def trust_box_plot(trust_data, colors):
+        # Box plot of the Trust DS 1 / Trust DS 2 values of one health center trust sheet (long format)
+        return alt.Chart(trust_data).mark_boxplot().encode(
+            x=alt.X('item:N', title='Trust Type'),
+            y=alt.Y('Value:Q', title='Trust Value'),
+            color=alt.Color('item:N', title='Trust Type', scale=alt.Scale(range=colors))
+        ).properties(
+            width=500,
+            height=300
+        )
+
+    @staticmethod
+    @profiled
     def display_order_fluctuation():
         if st.session_state['welcome']:
             return  # Don't display anything on the welcome page
 
-        if "selected_data" not in st.session_state or st.session_state["selected_data"] is None:
+        if not selected_runs():
             st.warning("No data selected. Please select data first.")
             return
 
-        # Initialize an empty list to hold all order fluctuation data for different scenarios, agents, and disruptions
-        all_order_fluctuation_data = []
-
-        for agent in st.session_state["selected_agents"]:
-            for sheet_name in st.session_state["selected_sheets"]:
-                for disruption in st.session_state["selected_disruption"]:
-                    # Check if the selected state is one of the specified options
-                    valid_state_options = ['DS 1 state', 'DS 2 state', 'HC 1 state', 'HC 2 state']
-                    if sheet_name not in valid_state_options:
-                        continue
-
-                    # Reformatting the sheet name
-                    simplified_sheet_name = " ".join(sheet_name.split(" ")[:2])
-
-                    for selected_scenario in st.session_state["selected_scenarios"]:
-                        # Load data for the selected sensitivity factor
-                        file_name = f"app_data/DS1_MN1_{agent}_{st.session_state['order_type']}_{disruption}_s{selected_scenario}.xlsx"
-                        data = load_data(file_name)
-
-                        if sheet_name in data:
-                            df = data[sheet_name]
-                        else:
-                            st.write(
-                                f"No data for {simplified_sheet_name} for agent {agent} in Sensitivity factor {selected_scenario}")
-                            continue
-                        df = df[df['Time'] > 40]
-                        # Filter the dataframe to get only 'Order'
-                        order_df = df[df['item'] == 'Order']
-
-                        # Calculate the Mean Absolute Deviation (MAD)
-                        mean_order = order_df['Value'].mean()
-
-                        absolute_deviations = abs(order_df['Value'] - mean_order)
-                        mad = absolute_deviations.mean()
-                        
-                        all_order_fluctuation_data.append({
-                            'DS1 Agent': agent,
-                            'Entity': simplified_sheet_name,
-                            'Disruption': disruption,
-                            'Sensitivity Factor': selected_scenario,
-                            'Mean Order': mean_order,
-                            'MAD': mad
-                        })
-
-        # Convert all collected data to a DataFrame
-        all_order_fluctuation_df = pd.DataFrame(all_order_fluctuation_data)
+        all_order_fluctuation_df = order_fluctuation_table(selected_metrics(), current_selection(),
+                                                           selected_intervals())
 
         if not all_order_fluctuation_df.empty:
             st.markdown("###### Comparing Mean Absolute Deviation of Order (MAD)")
@@ -956,7 +810,82 @@ class InteractiveChart:
         else:
             st.write("")
 
+    @profiled
+    def display_bullwhip(self):
+        # Order variance over demand variance per echelon (HC -> DS -> MN) for every agent, disruption and factor
+        # of the selected order type, then per entity and over rolling windows for the selected runs
+        catalog = get_catalog()
+        order_type = st.session_state['order_type']
+        combinations = sorted({tuple(entry[:4]) for entry in catalog if entry.order_type == order_type})
+        failures = load_runs([catalog.lookup(*key) for key in combinations], sheets=BULLWHIP_SHEETS)
+        for path, error in failures.items():
+            st.error(f"Could not read {path}: {error}")
+        runs = [catalog.lookup(*key) for key in combinations]
+        runs = [run for run in runs if run.path not in failures]
+
+        window = st.number_input("Rolling window (periods):", min_value=2, max_value=200, value=BULLWHIP_WINDOW,
+                                 key='bullwhip_window')
+        warmup, horizon = analysis_window()
+        ratios = bullwhip_ratios(runs, window, warmup, horizon)
+        if ratios.empty:
+            st.write("")
+            return
+
+        column_names = {'agent': 'Agent', 'disruption': 'Disruption', 'factor': 'Sensitivity factor',
+                        'echelon': 'Echelon', 'entity': 'Entity', 'order_variance': 'Order Variance',
+                        'demand_variance': 'Demand Variance', 'ratio': 'Bullwhip Ratio',
+                        'ratio_to_customer': 'Ratio to HC Demand'}
+        echelon_df = ratios[ratios['entity'] == ECHELON_TOTAL].drop(columns=['order_type', 'entity'])
+        echelon_df = echelon_df.rename(columns=column_names)
+        comparison = alt.Chart(echelon_df).mark_line(point=True).encode(
+            x=alt.X('Echelon:N', sort=list(ECHELONS)),
+            y=alt.Y('Bullwhip Ratio:Q', title='Order Variance / Demand Variance'),
+            color='Agent:N',
+            strokeDash='Sensitivity factor:N',
+            tooltip=list(echelon_df.columns)
+        ).properties(width=250, height=250).facet(
+            facet=alt.Facet('Disruption:N', sort=catalog.options('disruption')), columns=3)
+        st.markdown("###### Comparing Bullwhip Ratios per Echelon")
+        st.altair_chart(comparison)
+
+        selected = selected_runs()
+        selected_keys = {tuple(getattr(run, key) for key in ['agent', 'disruption', 'factor']) for run in selected}
+        entity_df = ratios[ratios['entity'] != ECHELON_TOTAL]
+        entity_df = entity_df[[key in selected_keys for key in zip(entity_df['agent'], entity_df['disruption'],
+                                                                  entity_df['factor'])]]
+        if not entity_df.empty:
+            st.markdown("###### Bullwhip Ratios of the Selected Runs")
+            st.table(entity_df.drop(columns=['order_type']).rename(columns=column_names).reset_index(drop=True))
+
+        rolling = rolling_bullwhip(selected, window, warmup, horizon)
+        for run in selected:
+            run_df = rolling[(rolling['agent'] == run.agent) & (rolling['disruption'] == run.disruption) &
+                             (rolling['factor'] == run.factor)]
+            if run_df.empty:
+                continue
+            st.altair_chart(self.rolling_bullwhip_chart(run, run_df, window, warmup,
+                                                        self.disruption_rects(disruptions=[run.disruption])),
+                            use_container_width=True)
+
+    @staticmethod
+    def rolling_bullwhip_chart(run, run_df, window, warmup, rects):
+        # Rolling bullwhip ratio of every echelon of one run, against the ratio 1 of no amplification
+        run_df = run_df.assign(Time_plot=run_df['Time'] - warmup)
+        line = alt.Chart(run_df).mark_line().encode(
+            x=alt.X('Time_plot:Q', title='Time Period'),
+            y=alt.Y('ratio:Q', title=f'Bullwhip Ratio ({window}-period window)'),
+            color=alt.Color('echelon:N', sort=list(ECHELONS), title='Echelon'),
+            tooltip=['Time_plot', 'echelon', 'ratio']
+        )
+        baseline = alt.Chart(pd.DataFrame({'baseline': [1]})).mark_rule(color='red').encode(y='baseline:Q')
+        return alt.layer(line, baseline, *rects).properties(
+            width=500,
+            height=300,
+            title=f"Sensitivity factor: {run.factor} - Agent: {run.agent} - Disruption: {run.disruption}"
+        )
+
     @staticmethod
+    @profiled
     def display_average_lead_time():
         if st.session_state['welcome']:
             return  # Don't display anything on the welcome page
@@ -966,10 +895,11 @@ class InteractiveChart:
             st.warning("Please select more than one sensitivity factor to view the graph.")
             return
 
-        if "selected_data" not in st.session_state or st.session_state["selected_data"] is None:
+        if not selected_runs():
             st.warning("No data selected. Please select data first.")
             return
 
+        summary = selected_metrics()
         for agent in st.session_state["selected_agents"]:
             for sheet_name in st.session_state["selected_sheets"]:
                 for disruption in st.session_state["selected_disruption"]:
@@ -978,204 +908,269 @@ class InteractiveChart:
                     if sheet_name not in valid_state_options:
                         continue
 
-                    lead_time_data = []
-                    for selected_scenario in st.session_state["selected_scenarios"]:
-                        # Load data for the selected sensitivity factor
-                        file_name = f"app_data/DS1_MN1_{agent}_{st.session_state['order_type']}_{disruption}_s{selected_scenario}.xlsx"
-                        data = load_data(file_name)
-
-                        if sheet_name in data:
-                            df = data[sheet_name]
-                        else:
-                            st.write(
-                                f"No data for {sheet_name} for agent {agent} in Sensitivity factor {selected_scenario}")
-                            continue
-                        df = df[df['Time'] > 40]
-                       
-                        # Filter the dataframe to get only 'Lead-time'
-                        lead_time_df = df[df['item'] == 'Lead-time']
-
-                        # Calculate the mean 'Lead-time'
-                        mean_lead_time = lead_time_df['Value'].mean()
-                        std_dev = lead_time_df['Value'].std()
-
-                        if (agent == 'DRL_RNN' and selected_scenario == 'multiple (67-72, 110-116)' and
-                            'Test-HC1Trust-MN1Disrupted' in st.session_state['order_type']):
-                            std_dev = std_dev / 2
-
-                        lower_bound = mean_lead_time - std_dev
-                        upper_bound = mean_lead_time + std_dev
-
-                        lead_time_data.append({
-                            'Scenario': selected_scenario,
-                            'Average Lead Time': mean_lead_time,
-                            'Lower Bound': lower_bound,
-                            'Upper Bound': upper_bound
-                        })
-
-                    lead_time_df = pd.DataFrame(lead_time_data)
-
-                    # Create the Altair chart with disruption name in the title
-                    chart_title = (f'DS1 Agent ({agent}): Comparing Lead Time Variation for {sheet_name} with {disruption} disruption'
-                                   f'for different sensitivity factors')
-                    point_chart = alt.Chart(lead_time_df).mark_point().encode(
-                        x=alt.X('Scenario:O', axis=alt.Axis(title='Sensitivity Factor')),
-                        y=alt.Y('Average Lead Time:Q', axis=alt.Axis(title='Lead Time Variation')),
-                        color='Scenario:N',
-                        tooltip=['Scenario', 'Average Lead Time', 'Lower Bound', 'Upper Bound']
-                    ).properties(
-                        title=chart_title,
-                        width=400,
-                        height=300
-                    )
-
-                    error_bars = alt.Chart(lead_time_df).mark_rule().encode(
-                        x=alt.X('Scenario:O', axis=alt.Axis(title='Sensitivity Factor')),
-                        y=alt.Y('Lower Bound:Q', axis=alt.Axis(title='Lead Time Variation')),
-                        y2='Upper Bound:Q',
-                        color='Scenario:N'
-                    ).properties(
-                        width=400,
-                        height=300
-                    )
-
-                    final_chart = point_chart + error_bars
-
-                    st.altair_chart(final_chart, use_container_width=True)
+                    lead_time_df = lead_time_table(summary, agent, sheet_name, disruption,
+                                                   st.session_state["selected_scenarios"])
+                    st.altair_chart(InteractiveChart.lead_time_chart(lead_time_df, agent, sheet_name, disruption),
+                                    use_container_width=True)
+
+    @staticmethod
+    def lead_time_chart(lead_time_df, agent, sheet_name, disruption):
+        # Create the Altair chart with disruption name in the title
+        chart_title = (f'DS1 Agent ({agent}): Comparing Lead Time Variation for {sheet_name} with {disruption} '
+                       f'disruption'
+                       f'for different sensitivity factors')
+        point_chart = alt.Chart(lead_time_df).mark_point().encode(
+            x=alt.X('Scenario:O', axis=alt.Axis(title='Sensitivity Factor')),
+            y=alt.Y('Average Lead Time:Q', axis=alt.Axis(title='Lead Time Variation')),
+            color='Scenario:N',
+            tooltip=['Scenario', 'Average Lead Time', 'Lower Bound', 'Upper Bound']
+        ).properties(
+            title=chart_title,
+            width=400,
+            height=300
+        )
+
+        error_bars = alt.Chart(lead_time_df).mark_rule().encode(
+            x=alt.X('Scenario:O', axis=alt.Axis(title='Sensitivity Factor')),
+            y=alt.Y('Lower Bound:Q', axis=alt.Axis(title='Lead Time Variation')),
+            y2='Upper Bound:Q',
+            color='Scenario:N'
+        ).properties(
+            width=400,
+            height=300
+        )
+
+        return point_chart + error_bars
+
+    @staticmethod
+    @profiled
+    def display_metric_heatmap():
+        # Any two axes of the metric cube against each other, optionally one small heatmap per label of a third
+        cube = get_metric_cube(get_catalog(), *analysis_window())
+        if cube.missing:
+            st.warning(f"Left out {len(cube.missing)} unreadable run(s): {', '.join(cube.missing)}")
+        if not cube.values.size:
+            st.write("")
+            return
+
+        axis_names = {'agent': 'Agent', 'order_type': 'Order type', 'disruption': 'Disruption',
+                      'factor': 'Sensitivity factor', 'entity': 'Entity', 'item': 'Item', 'statistic': 'Statistic'}
+        columns = st.columns(3)
+        rows_axis = columns[0].selectbox("Rows:", CUBE_AXES, index=CUBE_AXES.index('disruption'),
+                                         format_func=axis_names.get, key='heatmap_rows')
+        column_axes = [axis for axis in CUBE_AXES if axis != rows_axis]
+        columns_axis = columns[1].selectbox("Columns:", column_axes, index=column_axes.index('factor')
+                                            if 'factor' in column_axes else 0,
+                                            format_func=axis_names.get, key='heatmap_columns')
+        facet_axes = ['None'] + [axis for axis in column_axes if axis != columns_axis]
+        facet_axis = columns[2].selectbox("One heatmap per:", facet_axes, index=facet_axes.index('agent')
+                                          if 'agent' in facet_axes else 0,
+                                          format_func=lambda axis: axis_names.get(axis, axis), key='heatmap_facet')
+
+        # Every other axis is fixed to one label, defaulting to the sidebar selection
+        defaults = {'agent': st.session_state['selected_agents'][:1], 'order_type': [st.session_state['order_type']],
+                    'disruption': st.session_state['selected_disruption'][:1],
+                    'factor': st.session_state['selected_scenarios'][:1],
+                    'entity': st.session_state['selected_sheets'][:1], 'item': ['Backlog'], 'statistic': ['mean']}
+        free = [rows_axis, columns_axis] + ([facet_axis] if facet_axis != 'None' else [])
+        fixed_axes = [axis for axis in CUBE_AXES if axis not in free]
+        fixed = {}
+        for column, axis in zip(st.columns(max(1, len(fixed_axes))), fixed_axes):
+            options = cube.labels[axis]
+            default = next((label for label in defaults[axis] if label in options), options[0])
+            fixed[axis] = column.selectbox(f"{axis_names[axis]}:", options, index=options.index(default),
+                                           key=f'heatmap_{axis}')
+
+        heatmap_df = cube.frame(free, **fixed).rename(columns=axis_names)
+        row_title, column_title = axis_names[rows_axis], axis_names[columns_axis]
+        heatmap = alt.Chart(heatmap_df).mark_rect().encode(
+            x=alt.X(f'{column_title}:O', sort=cube.labels[columns_axis]),
+            y=alt.Y(f'{row_title}:O', sort=cube.labels[rows_axis]),
+            color=alt.Color('Value:Q', title=fixed.get('statistic', 'Value')),
+            tooltip=list(heatmap_df.columns)
+        ).properties(width=250 if facet_axis != 'None' else 500, height=250)
+        if facet_axis != 'None':
+            heatmap = heatmap.facet(facet=alt.Facet(f'{axis_names[facet_axis]}:O', sort=cube.labels[facet_axis]),
+                                    columns=3)
+        st.altair_chart(heatmap)
+
+    @staticmethod
+    @profiled
+    def display_disruption_phases():
+        # Backlog, inventory, unmet demand and lead time before, during, between and after the disruption windows
+        if not selected_runs():
+            st.warning("No data selected. Please select data first.")
+            return
+
+        sheets = [sheet for sheet in st.session_state['selected_sheets'] if sheet in PHASE_SHEETS]
+        if not sheets:
+            st.write("Select DS 1 state or DS 2 state to compare disruption phases.")
+            return
+        phases_df = phase_metrics(selected_runs(), sheets, *analysis_window())
+        if phases_df.empty:
+            st.write("")
+            return
+        st.markdown("###### Comparing Disruption Phases")
+        st.dataframe(phases_df.drop(columns=['order_type']).rename(columns={
+            'agent': 'Agent', 'disruption': 'Disruption', 'factor': 'Sensitivity factor', 'entity': 'Entity',
+            'phase': 'Phase', 'start': 'Start', 'end': 'End', 'periods': 'Periods', 'mean_backlog': 'Mean Backlog',
+            'peak_backlog': 'Peak Backlog', 'mean_inventory': 'Mean Inventory', 'unmet_demand': 'Unmet Demand',
+            'mean_lead_time': 'Mean Lead-time', 'lead_time_spike': 'Lead-time Spike',
+            'recovery_periods': 'Recovery Periods'}), hide_index=True)
 
     @staticmethod
+    @profiled
     def display_order_lead_time_stability():
         if st.session_state['welcome']:
             return  # Don't display anything on the welcome page
 
-        if "selected_data" not in st.session_state or st.session_state["selected_data"] is None:
+        if not selected_runs():
             st.warning("No data selected. Please select data first.")
             return
 
-        order_lead_time_stability_data = []
-        for agent in st.session_state["selected_agents"]:
-            for entity in st.session_state["selected_sheets"]:
-                if entity in ['MN 1 state', 'MN 2 state', 'DS 1 state', 'DS 2 state', 'HC 1 state', 'HC 2 state']:
-                    entity_name = entity.replace(" state", "")
-
-                    for scenario in st.session_state["selected_scenarios"]:
-                        for selected_disruption in st.session_state["selected_disruption"]:
-
-                            file_name = f"app_data/DS1_MN1_{agent}_{st.session_state['order_type']}_{selected_disruption}_s{scenario}.xlsx"
-                            data = load_data(file_name)
-
-                            if entity in data:
-                                df = data[entity]
-                            else:
-                                continue
-                            df = df[df['Time'] > 40]
-
-                            order_lead_time_df = df[df['item'] == 'Lead-time']
-                            order_lead_time_std = order_lead_time_df['Value'].std()
-                            order_lead_time_mean = order_lead_time_df['Value'].mean()
-
-                            order_lead_time_stability_data.append({
-                                'Agent': agent,
-                                'Disruption Duration': selected_disruption,
-                                'Entity': entity_name,
-                                'Sensitivity Factor': scenario,
-                                'Order Lead Time Stability (STD)': order_lead_time_std,
-                                'Order Lead Time Mean (Mean)': order_lead_time_mean
-                            })
-
-        order_lead_time_stability_df = pd.DataFrame(order_lead_time_stability_data)
+        order_lead_time_stability_df = lead_time_stability_table(selected_metrics(), current_selection())
         if not order_lead_time_stability_df.empty:
             st.markdown("###### Comparing Order Lead Time Stability")
             st.table(order_lead_time_stability_df)
         else:
             st.write("")
 
+    @profiled
+    def draw_live_run(self):
+        # Charts and summary of the live run picked in the sidebar. Each call reads only the rows appended to
+        # its logs since the previous one.
+        run = live_runs().get(st.session_state.get('live_run'))
+        if run is None:
+            return
+        run.refresh()
+        last_time = run.last_time()
+        st.markdown(f"###### Live run {run.name}")
+        if last_time is None:
+            st.write("No rows logged yet.")
+            return
+        st.caption(f"Logged up to period {last_time}; refreshed every {st.session_state['live_interval']} s")
+
+        rects = self.disruption_rects(disruptions=[run.disruption])
+        windows = self.disruption_windows(offset=DISRUPTION_OFFSET, disruptions=[run.disruption])
+        for sheet_name in st.session_state['selected_sheets']:
+            matrix = run.matrix(sheet_name)
+            if matrix is None or not len(matrix.window(*analysis_window())):
+                st.write(f"No data for {sheet_name} after the warm-up yet")
+                continue
+            for chart in self.entity_charts(run.agent, run.factor, sheet_name, run, matrix, rects, windows):
+                st.altair_chart(chart, use_container_width=True)
+
+        summary = run.summary(st.session_state['selected_sheets'], *analysis_window())
+        if not summary.empty:
+            st.table(summary.rename(columns={'entity': 'Entity', 'item': 'Item', 'mean': 'Mean', 'std': 'STD',
+                                             'mad': 'MAD', 'count': 'Periods'}))
+
+    @profiled
     def Healthcenters_order(self):
-        if "selected_data" not in st.session_state or st.session_state["selected_data"] is None:
+        if not selected_runs():
             st.warning("No data selected. Please select data first.")
             return
 
+        rects = self.disruption_rects(offset=DISRUPTION_OFFSET)
+
         for agent in st.session_state["selected_agents"]:
             for scenario in st.session_state["selected_scenarios"]:
                 for disruption in st.session_state["selected_disruption"]:
                     # Your code for loading data
-                    file_name = f"app_data/DS1_MN1_{agent}_{st.session_state['order_type']}_{disruption}_s{scenario}.xlsx"
-                    data = load_data(file_name)
-
-                    if "HC 1 shipments" in data:
-                        hc1_ship_df = data["HC 1 shipments"]
-                    else:
+                    run = find_run(agent, scenario, disruption)
+                    if run is None:
+                        continue
+                    matrix = get_matrix(run, 'HC 1 shipments')
+                    if matrix is None:
                         st.write(f"No data for 'HC 1 shipments' for agent {agent} in Sensitivity factor {scenario}")
                         continue
 
-                    # Filter data to start from time 40
-                    hc1_ship_df = hc1_ship_df[hc1_ship_df['Time'] > 40]
-
-                    hc1_ship_df1 = hc1_ship_df[
-                        (hc1_ship_df['item'] == 'Order DS 1') & (hc1_ship_df['Time'].between(40, 300))
-                        ]
-                    hc1_ship_df2 = hc1_ship_df[
-                        (hc1_ship_df['item'] == 'Order DS 2') & (hc1_ship_df['Time'].between(40, 300))
-                        ]
-                    
-
-                    combined_hc1_ship_data = pd.concat([hc1_ship_df1, hc1_ship_df2])
-
-                    rects = []
-
-                    # st.session_state['selected_disruption'] is assumed to be a list of strings
-                    for selected_disruption in st.session_state['selected_disruption']:
-                        if selected_disruption in self.disruptions:
-                            disruptions = self.disruptions[selected_disruption]
-                        else:
-                            st.write(f"No data for disruption: {selected_disruption}")
-                            continue
-
-                        # Rest of your code for processing disruptions
-                        disruption_data = []  # To store multiple disruptions
-
-                        for disruption in disruptions:
-                            # Adjust the start and end times by adding 40 units
-                            adjusted_start = disruption['start'] + 40
-                            adjusted_end = disruption['end'] + 40
-
-                            # Append the adjusted disruption period to the list
-                            disruption_data.append({'start': adjusted_start, 'end': adjusted_end})
-
-                        disruption_df = pd.DataFrame(disruption_data)
+                    hc_order_chart = rendered_view(run, ('hc_orders',), lambda: self.hc_order_chart(
+                        agent, scenario, run, matrix, rects, self.disruption_windows(offset=DISRUPTION_OFFSET)))
+                    st.altair_chart(hc_order_chart, use_container_width=True)
 
-                        rects.append(alt.Chart(disruption_df).mark_rect().encode(
-                            x='start:Q',
-                            x2='end:Q',
-                            color=alt.value('rgba(0, 128, 0, 0.5)')
-                        ))
+    @staticmethod
+    @profiled
+    def hc_order_chart(agent, scenario, run, matrix, rects, windows):
+        # Filter data to the analysis window, up to PLOT_HORIZON at most
+        warmup, horizon = plot_window()
+        combined_hc1_ship_data = chart_series(
+            run, 'HC 1 shipments', matrix.window(after=warmup, until=horizon).select(['Order DS 1', 'Order DS 2']),
+            windows)
+
+        # Create an Altair chart with the x-axis spanning the analysis window
+        chart = alt.Chart(combined_hc1_ship_data).mark_line().encode(
+            alt.X('Time:Q', scale=alt.Scale(domain=[warmup, horizon])),  # Set the x-axis domain
+            y='Value:Q',
+            color='item:N',
+            tooltip=['Time', 'Value', 'item']
+        )
 
-                    # Create an Altair chart with x-axis starting from time 0 to 260
-                    chart = alt.Chart(combined_hc1_ship_data).mark_line().encode(
-                        alt.X('Time:Q', scale=alt.Scale(domain=[40, 300])),  # Set the x-axis domain
-                        y='Value:Q',
-                        color='item:N',
-                        tooltip=['Time', 'Value', 'item']
-                    )
+        return alt.layer(chart, *rects).properties(
+            width=500,
+            height=300,
+            title=f"Sensitivity factor: {scenario} - Agent: {agent} - Entity: DS 1 state"
+        )
 
-                    hc_order_chart = alt.layer(chart, *rects).properties(
-                        width=500,
-                        height=300,
-                        title=f"Sensitivity factor: {scenario} - Agent: {agent} - Entity: DS 1 state"
-                    )
 
-                    st.altair_chart(hc_order_chart, use_container_width=True)
+# Page sections in display order: (key, toggle label, InteractiveChart method, open by default)
+SECTIONS = [
+    ('charts', "Time series charts", 'draw_chart', True),
+    ('time_taken', "Run time", 'display_time_taken', False),
+    ('rewards', "Average rewards", 'display_rewards', True),
+    ('backlog_inventory', "Backlog and inventory", 'display_backlog_inventory', False),
+    ('box_plots', "Trust box plots", 'draw_box_plots', False),
+    ('order_fluctuation', "Order fluctuation", 'display_order_fluctuation', False),
+    ('bullwhip', "Bullwhip effect", 'display_bullwhip', False),
+    ('lead_time', "Average lead time", 'display_average_lead_time', False),
+    ('lead_time_stability', "Order lead time stability", 'display_order_lead_time_stability', False),
+    ('heatmap', "Metric heatmap", 'display_metric_heatmap', False),
+    ('disruption_phases', "Disruption phase metrics", 'display_disruption_phases', False),
+    ('hc_orders', "Health center orders", 'Healthcenters_order', False),
+]
+
+
+def render_live_section(interactive_chart, interval):
+    # The live run redraws itself every interval seconds without rerunning the rest of the page
+    st.fragment(interactive_chart.draw_live_run, run_every=interval)()
+
+
+@st.fragment
+def render_section(key, label, render, expanded=False):
+    # One page section in its own fragment: it is only loaded and computed while its toggle is on, and the
+    # toggle and the widgets inside the section rerun this section alone instead of the whole page. Such a
+    # rerun is profiled on its own, and its panel is shown below the section.
+    show_profile_panel = st.session_state.get('show_profile', False)
+    with fragment_rerun(f"section {key}", enabled=show_profile_panel or bool(PROFILE_LOG)) as profile:
+        if st.toggle(label, value=expanded, key=f"section_{key}"):
+            render()
+    if profile is not None:
+        if show_profile_panel:
+            show_profile(profile, loader_cache.stats(), container=st)
+        if PROFILE_LOG:
+            write_log(profile)
 
 
 if __name__ == "__main__":
-    interactive_chart = InteractiveChart()
-    interactive_chart.update_data()
-    interactive_chart.draw_chart()
-    interactive_chart.display_time_taken()
-    interactive_chart.display_rewards()
-    interactive_chart.display_backlog_inventory()
-    interactive_chart.draw_box_plots()
-    interactive_chart.display_order_fluctuation()
-    interactive_chart.display_average_lead_time()
-    interactive_chart.display_order_lead_time_stability()
-    interactive_chart.Healthcenters_order()
+    # JSON API sharing this process's loader cache, see api.py
+    if API_PORT:
+        start_api(API_PORT)
+
+    # Reruns are profiled while the sidebar panel is open, and always when DASHBOARD_PROFILE_LOG is set
+    show_profile_panel = st.session_state.get('show_profile', False)
+    with rerun(enabled=show_profile_panel or bool(PROFILE_LOG)) as profile:
+        interactive_chart = InteractiveChart()
+        interactive_chart.select_inputs()
+        interactive_chart.update_data()
+        if not st.session_state['welcome']:
+            if st.session_state.get('live_run', 'Off') != 'Off':
+                render_live_section(interactive_chart, st.session_state['live_interval'])
+            for key, label, method, expanded in SECTIONS:
+                render_section(key, label, getattr(interactive_chart, method), expanded)
+
+    st.sidebar.checkbox("Show profiling panel", key='show_profile')
+    if profile is not None:
+        if show_profile_panel:
+            show_profile(profile, loader_cache.stats())
+        if PROFILE_LOG:
+            write_log(profile)
@@ -0,0 +1,77 @@
+import altair as alt
+import pandas as pd
+import streamlit as st
+
+from run_catalog import get_catalog
+from runtime import COMPARED_AGENTS, LATENCY_LABELS, latency_table, runtime_table
+
+ALL = 'All'
+
+st.write("## Runtime")
+st.write("Inference cost of the agents, from the `time_taken_` files in `app_data`. Every timed episode counts one "
+         "decision per period of its run; latency is the time per decision and throughput the decisions per second.")
+
+catalog = get_catalog()
+runtime, failures = runtime_table(catalog)
+for path, error in failures.items():
+    st.warning(f"Could not read {path}: {error}")
+if runtime.empty:
+    st.write("No 'Time Taken' data in `app_data`.")
+    st.stop()
+
+# Runs compared: everything, or one order type, disruption or sensitivity factor
+for column, (key, label) in zip(st.columns(3), [('order_type', "Order type:"), ('disruption', "Disruption:"),
+                                                ('factor', "Sensitivity factor:")]):
+    timed = set(runtime[key])
+    choice = column.selectbox(label, [ALL] + [value for value in catalog.options(key) if value in timed],
+                              key=f'runtime_{key}')
+    if choice != ALL:
+        runtime = runtime[runtime[key] == choice]
+
+missing = [agent for agent in COMPARED_AGENTS if agent not in set(runtime['agent'])]
+if missing:
+    st.write(f"No timings for {', '.join(missing)} in this selection.")
+if runtime.empty:
+    st.stop()
+
+latency = latency_table(runtime)
+st.write("### Decision latency and throughput per agent")
+st.dataframe(latency.rename(columns=LATENCY_LABELS), hide_index=True)
+
+agents = list(latency['agent'])
+percentiles = latency.melt(id_vars='agent', value_vars=['mean_ms', 'p50_ms', 'p95_ms', 'p99_ms'],
+                           var_name='statistic', value_name='ms')
+percentiles['statistic'] = percentiles['statistic'].map(LATENCY_LABELS)
+latency_chart = alt.Chart(percentiles).mark_bar().encode(
+    x=alt.X('statistic:N', title=None, sort=[LATENCY_LABELS[c] for c in ['mean_ms', 'p50_ms', 'p95_ms', 'p99_ms']]),
+    y=alt.Y('ms:Q', title='Latency per decision (ms)'),
+    color=alt.Color('agent:N', sort=agents, title='Agent'),
+    column=alt.Column('agent:N', sort=agents, title=None),
+    tooltip=['agent', 'statistic', alt.Tooltip('ms:Q', format='.3f')]
+).properties(width=150, height=250)
+throughput_chart = alt.Chart(latency).mark_bar().encode(
+    x=alt.X('agent:N', sort=agents, title='Agent'),
+    y=alt.Y('decisions_per_second:Q', title='Decisions per second'),
+    color=alt.Color('agent:N', sort=agents, legend=None),
+    tooltip=['agent', alt.Tooltip('decisions_per_second:Q', format='.1f')]
+).properties(width=300, height=250)
+st.altair_chart(latency_chart)
+st.altair_chart(throughput_chart)
+
+# Distribution of the per-decision latency over the timed episodes
+episodes = runtime[runtime['decisions'] > 0]
+episodes = pd.DataFrame({'agent': episodes['agent'], 'ms': 1000 * episodes['seconds'] / episodes['decisions']})
+if len(episodes):
+    st.write("### Latency per decision over the timed episodes")
+    st.altair_chart(alt.Chart(episodes).mark_boxplot(extent='min-max').encode(
+        x=alt.X('agent:N', sort=agents, title='Agent'),
+        y=alt.Y('ms:Q', title='Latency per decision (ms)'),
+        color=alt.Color('agent:N', sort=agents, legend=None)
+    ).properties(width=300, height=300))
+if len(episodes) < len(runtime):
+    st.write(f"{len(runtime) - len(episodes)} timed episode(s) without a matching run workbook have no decision "
+             f"count and are left out of the latency figures.")
+
+with st.expander("Per run combination"):
+    st.dataframe(latency_table(runtime, by=['agent', 'order_type', 'disruption', 'factor']).rename(
+        columns=LATENCY_LABELS), hide_index=True)
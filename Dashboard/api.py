@@ -0,0 +1,225 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+from data_store import loader_cache, run_signature
+from downsample import reduced_series
+from matrices import get_matrix
+from metrics import (RUN_KEYS, STATE_SHEETS, backlog_inventory_tables, lead_time_stability_table,
+                     order_fluctuation_table, reward_table, run_metrics)
+from run_catalog import get_catalog
+
+# Read-only JSON API over the run catalog and the metrics engine, for tools that need the dashboard's numbers.
+# Started next to the app when DASHBOARD_API_PORT is set, sharing the loader cache of the Streamlit process,
+# or on its own from the Dashboard folder:
+#     python api.py --port 8502
+# Runs are selected with repeatable query parameters (missing ones match everything), e.g.
+#     /metrics?agent=DRL&agent=basestock&disruption=No%20disruption&entity=DS%201%20state&item=Backlog
+#     /tables/order_fluctuation?factor=0.1&factor=0.5
+#     /series?agent=DRL&factor=0.1&disruption=short%20(67-72)&sheet=DS%201%20state&item=Inventory&max_points=500
+# Every response carries an ETag derived from the modification times and sizes of the workbooks it was computed
+# from; a request with a matching If-None-Match header gets 304 Not Modified.
+
+API_PORT = int(os.environ.get('DASHBOARD_API_PORT', 0))
+SELECTOR_KEYS = RUN_KEYS + ['seed']
+
+
+def select_runs(params, data_dir='app_data'):
+    # Catalog entries matching the selector parameters; one run per combination (its representative run)
+    # unless seeds are given. The catalog is rescanned when a selected workbook changed on disk.
+    for refresh in [False, True]:
+        catalog = get_catalog(data_dir, refresh=refresh)
+        table = catalog.table
+        for key in RUN_KEYS:
+            if key in params:
+                table = table[table[key].isin(params[key])]
+        if 'seed' in params:
+            seeds = [int(seed) for seed in params['seed']]
+            paths = set(table['path'])
+            runs = [entry for entry in catalog if entry.path in paths and entry.seed in seeds]
+        else:
+            combinations = sorted(set(zip(*(table[key] for key in RUN_KEYS))))
+            runs = [catalog.lookup(*combination) for combination in combinations]
+        if refresh or all(_unchanged(run) for run in runs):
+            return runs
+
+
+def _unchanged(run):
+    try:
+        stat = os.stat(run.path)
+    except FileNotFoundError:
+        return False
+    return (stat.st_mtime_ns, stat.st_size) == (run.mtime_ns, run.size)
+
+
+def _selection(runs, params):
+    # The sidebar selection the dashboard tables expect, in catalog order
+    def ordered(values):
+        return list(dict.fromkeys(values))
+
+    return {'agents': ordered(run.agent for run in runs), 'scenarios': ordered(run.factor for run in runs),
+            'disruptions': ordered(run.disruption for run in runs), 'sheets': params.get('sheet', STATE_SHEETS)}
+
+
+def _one(params, name):
+    if len(params.get(name, [])) != 1:
+        raise ValueError(f"Give exactly one '{name}' parameter")
+    return params[name][0]
+
+
+def runs_route(runs, params):
+    return pd.DataFrame([{key: getattr(run, key) for key in SELECTOR_KEYS + ['path', 'mtime_ns', 'size']}
+                         for run in runs])
+
+
+def metrics_route(runs, params):
+    summary = run_metrics(runs)
+    for column in ['entity', 'item']:
+        if column in params:
+            summary = summary[summary[column].isin(params[column])]
+    return summary
+
+
+TABLES = {
+    'rewards': lambda summary, selection: reward_table(summary, selection),
+    'backlog': lambda summary, selection: backlog_inventory_tables(summary, selection)[0],
+    'inventory': lambda summary, selection: backlog_inventory_tables(summary, selection)[1],
+    'order_fluctuation': order_fluctuation_table,
+    'lead_time_stability': lead_time_stability_table,
+}
+
+
+def table_route(name):
+    def route(runs, params):
+        return TABLES[name](run_metrics(runs), _selection(runs, params))
+    return route
+
+
+def series_route(runs, params):
+    # Time and values of one item of one sheet per run, optionally windowed and downsampled
+    sheet_name, item = _one(params, 'sheet'), _one(params, 'item')
+    after = float(params['after'][0]) if 'after' in params else None
+    until = float(params['until'][0]) if 'until' in params else None
+    max_points = int(params['max_points'][0]) if 'max_points' in params else None
+    series = []
+    for run in runs:
+        matrix = get_matrix(run, sheet_name)
+        if matrix is None or item not in matrix:
+            continue
+        matrix = matrix.window(after=after, until=until)
+        time, values = matrix.time, matrix.column(item)
+        if max_points is not None:
+            key = run_signature(run) + (sheet_name, item, time[0] if len(time) else None,
+                                        time[-1] if len(time) else None)
+            time, values = reduced_series(key, time, values, max_points)
+        series.append(dict({key: getattr(run, key) for key in SELECTOR_KEYS}, time=time.tolist(),
+                           values=[None if pd.isna(value) else float(value) for value in values]))
+    return {'sheet': sheet_name, 'item': item, 'series': series}
+
+
+ROUTES = {
+    '/runs': runs_route,
+    '/metrics': metrics_route,
+    '/series': series_route,
+}
+ROUTES.update({f'/tables/{name}': table_route(name) for name in TABLES})
+
+
+def encode(result):
+    if isinstance(result, pd.DataFrame):
+        return ('{"rows": ' + result.to_json(orient='records') + '}').encode()
+    return json.dumps(result).encode()
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    data_dir = 'app_data'
+    quiet = True
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = url.path.rstrip('/') or '/'
+        params = parse_qs(url.query)
+        if path not in ROUTES:
+            self.send_body(404, json.dumps({'error': f"Unknown path {path}", 'paths': sorted(ROUTES)}).encode())
+            return
+        try:
+            runs = select_runs(params, self.data_dir)
+            query = tuple(sorted((key, tuple(values)) for key, values in params.items()))
+            signatures = tuple(run_signature(run) for run in runs)
+            etag = '"' + hashlib.sha1(repr((path, query, signatures)).encode()).hexdigest() + '"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_body(304, b'', etag)
+                return
+            # Responses are cached with the loaded sheets; concurrent identical requests compute it once
+            body = loader_cache.get(('api', path, query) + signatures, lambda: encode(ROUTES[path](runs, params)))
+        except ValueError as e:
+            self.send_body(400, json.dumps({'error': str(e)}).encode())
+            return
+        except Exception as e:
+            self.send_body(500, json.dumps({'error': f"{type(e).__name__}: {e}"}).encode())
+            return
+        self.send_body(200, body, etag)
+
+    def send_body(self, status, body, etag=None):
+        self.send_response(status)
+        if etag is not None:
+            self.send_header('ETag', etag)
+        if status != 304:
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+
+def make_server(host, port, data_dir='app_data', quiet=True):
+    handler = type('Handler', (ApiHandler,), {'data_dir': data_dir, 'quiet': quiet})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_api(port=API_PORT, host='127.0.0.1', data_dir='app_data'):
+    # Serve the API from a daemon thread of this process, once; later calls return the running server
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = make_server(host, port, data_dir)
+            threading.Thread(target=_server.serve_forever, name='dashboard-api', daemon=True).start()
+        return _server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the dashboard's metrics and series as JSON.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=API_PORT or 8502)
+    parser.add_argument('--data-dir', default='app_data', help="folder holding the DS1_MN1_*.xlsx workbooks")
+    parser.add_argument('--verbose', action='store_true', help="log every request")
+    args = parser.parse_args(argv)
+
+    server = make_server(args.host, args.port, args.data_dir, quiet=not args.verbose)
+    print(f"Serving on http://{args.host}:{args.port} ({', '.join(sorted(ROUTES))})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
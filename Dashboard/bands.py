@@ -0,0 +1,83 @@
+import warnings
+
+import numpy as np
+
+from data_store import loader_cache, run_signature
+from derived import with_derived
+from matrices import get_matrix
+
+# Sheets whose items get replication bands in draw_chart, and the quantiles computed for every band
+BAND_SHEETS = ['DS 1 state', 'DS 2 state']
+BAND_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+def replication_cube(matrices, items):
+    # Stack the given item columns of several runs into one (seed x time x item) array on the union of their
+    # time grids; a period or item missing from a run stays NaN
+    matrices = [matrix for matrix in matrices if matrix is not None and len(matrix)]
+    if not matrices:
+        return np.empty(0, dtype='int64'), np.empty((0, 0, len(items)))
+    time = np.unique(np.concatenate([matrix.time for matrix in matrices]))
+    cube = np.full((len(matrices), len(time), len(items)), np.nan)
+    for seed, matrix in enumerate(matrices):
+        rows = np.searchsorted(time, matrix.time)
+        for column, item in enumerate(items):
+            if item in matrix:
+                cube[seed, rows, column] = matrix.column(item)
+    return time, cube
+
+
+def band_stats(cube, quantiles=BAND_QUANTILES):
+    # Mean, quantiles (quantile x time x item) and number of seeds with a value, over the seed axis in one pass
+    with np.errstate(invalid='ignore'):
+        count = (~np.isnan(cube)).sum(axis=0)
+        mean = np.where(count > 0, np.nansum(cube, axis=0) / np.maximum(count, 1), np.nan)
+        if cube.size and count.all():
+            bands = np.quantile(cube, quantiles, axis=0)
+        elif cube.size:
+            with warnings.catch_warnings():
+                # A period without a value in any seed has NaN bands
+                warnings.simplefilter('ignore', RuntimeWarning)
+                bands = np.nanquantile(cube, quantiles, axis=0)
+        else:
+            bands = np.empty((len(quantiles),) + cube.shape[1:])
+    return mean, bands, count
+
+
+class ReplicationBands:
+    """Per-period mean and quantile bands of a sheet's items across the replications of one combination."""
+
+    def __init__(self, time, items, mean, bands, count, quantiles):
+        self.time = time
+        self.items = items
+        self.mean = mean
+        self.bands = bands
+        self.count = count
+        self.quantiles = quantiles
+
+    @property
+    def nbytes(self):
+        return self.time.nbytes + self.mean.nbytes + self.bands.nbytes + self.count.nbytes
+
+    def quantile(self, q):
+        return self.bands[self.quantiles.index(q)]
+
+
+def _matrix(run, sheet_name, derived):
+    matrix = get_matrix(run, sheet_name)
+    return with_derived(run, sheet_name, matrix, derived) if matrix is not None and derived else matrix
+
+
+def _build_bands(runs, sheet_name, items, quantiles, derived):
+    time, cube = replication_cube([_matrix(run, sheet_name, derived) for run in runs], items)
+    mean, bands, count = band_stats(cube, quantiles)
+    return ReplicationBands(time, list(items), mean, bands, count, tuple(quantiles))
+
+
+def get_bands(runs, sheet_name, items, quantiles=BAND_QUANTILES, derived=None):
+    # Cached bands of the given replications. derived ({item: derived series name}, see derived.py) replaces
+    # or adds items of every run before the statistics, e.g. {'Inventory': 'Clipped Inventory'}.
+    derived = derived or {}
+    key = (('bands', sheet_name, tuple(items), tuple(quantiles), tuple(sorted(derived.items()))) +
+           tuple(run_signature(run) for run in runs))
+    return loader_cache.get(key, lambda: _build_bands(runs, sheet_name, items, quantiles, derived))
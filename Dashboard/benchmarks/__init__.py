@@ -0,0 +1 @@
+# Headless benchmark suite of the dashboard; run it with `python -m benchmarks` from the Dashboard folder
@@ -0,0 +1,251 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+import streamlit as st
+
+import data_store
+from data_store import load_data, loader_cache
+from headless import quiet_streamlit
+from metrics import STATE_SHEETS
+from run_catalog import get_catalog
+from benchmarks.synthetic import generate_runs
+
+# Headless benchmark of the dashboard on synthetic workbooks. Streamlit runs in bare mode: widgets return
+# their defaults and nothing is sent to a browser, but charts and tables are still built and serialized.
+# Run it from the Dashboard folder:
+#     python -m benchmarks --runs 12 --horizon 1000 --save-baseline baseline.json
+#     python -m benchmarks --runs 12 --horizon 1000 --compare baseline.json
+
+# InteractiveChart methods of one rerun, in the order Home.py calls them
+STEPS = ['select_inputs', 'update_data', 'draw_chart', 'display_time_taken', 'display_rewards',
+         'display_backlog_inventory', 'draw_box_plots', 'display_order_fluctuation', 'display_bullwhip',
+         'display_average_lead_time', 'display_order_lead_time_stability', 'display_metric_heatmap',
+         'display_disruption_phases', 'Healthcenters_order']
+
+# Loader cache entries that are filled by parsing a file (see LoaderCache.stores)
+PARSED_KINDS = ['workbook', 'columnar', 'time_taken']
+
+
+def files_parsed():
+    stores = loader_cache.stats()['stores']
+    return sum(stores.get(kind, 0) for kind in PARSED_KINDS)
+
+
+def measure(fn):
+    # Wall time, peak traced memory (when tracemalloc is on) and files parsed by one call
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+    parsed = files_parsed()
+    error = None
+    start = time.perf_counter()
+    try:
+        fn()
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    result = {
+        'wall_s': time.perf_counter() - start,
+        'peak_bytes': tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None,
+        'files_parsed': files_parsed() - parsed,
+    }
+    if error is not None:
+        result['error'] = error
+    return result
+
+
+def combine(measurements):
+    peaks = [m['peak_bytes'] for m in measurements if m['peak_bytes'] is not None]
+    return {
+        'wall_s': sum(m['wall_s'] for m in measurements),
+        'peak_bytes': max(peaks) if peaks else None,
+        'files_parsed': sum(m['files_parsed'] for m in measurements),
+    }
+
+
+def select_all(catalog, disruption=None):
+    # Every agent and factor of the catalog, one disruption (draw_chart shows one at a time), all state sheets
+    for key in list(st.session_state):
+        del st.session_state[key]
+    st.session_state['welcome'] = False
+    st.session_state['selected_agents'] = catalog.options('agent')
+    st.session_state['order_type'] = catalog.options('order_type')[0]
+    st.session_state['selected_disruption'] = [disruption or catalog.options('disruption')[0]]
+    st.session_state['selected_scenarios'] = catalog.options('factor')
+    st.session_state['selected_sheets'] = list(STATE_SHEETS)
+
+
+def bench_load_data(paths):
+    loader_cache.clear()
+    cold = [measure(lambda path=path: load_data(path)) for path in paths]
+    warm = [measure(lambda path=path: load_data(path)) for path in paths]
+    return {'cold': combine(cold), 'warm': combine(warm)}
+
+
+def bench_reruns(reruns, disruption=None):
+    # The first rerun starts from an empty cache, the following ones are what a widget change costs
+    from Home import InteractiveChart
+
+    loader_cache.clear()
+    catalog = get_catalog(refresh=True)
+    select_all(catalog, disruption)
+    results = []
+    for _ in range(reruns):
+        interactive_chart = InteractiveChart()
+        steps = {}
+        for step in STEPS:
+            steps[step] = measure(getattr(interactive_chart, step))
+            if step == 'select_inputs':
+                # Widgets return their defaults in bare mode: restore the benchmarked selection
+                select_all(catalog, disruption)
+        results.append({'total': combine(list(steps.values())), 'steps': steps})
+    return results
+
+
+def run_benchmark(args):
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='dashboard-bench-')
+    data_dir = os.path.join(work_dir, 'app_data')
+    if args.data_dir:
+        data_dir = args.data_dir
+        work_dir = os.path.dirname(data_dir)
+        paths = [entry.path for entry in get_catalog(data_dir, refresh=True)]
+    else:
+        print(f"Writing {args.runs} synthetic runs to {data_dir}")
+        paths = generate_runs(data_dir, args.runs, args.horizon, args.items, seed=args.seed)
+    if args.ingest:
+        from ingest import main as ingest_main
+        ingest_main(['--data-dir', data_dir])
+
+    if args.workers:
+        data_store.LOAD_WORKERS = args.workers
+    # Home.py resolves app_data relative to the working directory
+    os.chdir(work_dir)
+
+    if args.memory:
+        tracemalloc.start()
+    try:
+        load = bench_load_data(paths)
+        reruns = bench_reruns(args.reruns, args.disruption)
+    finally:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    return {
+        'config': {
+            'runs': len(paths),
+            'horizon': None if args.data_dir else args.horizon,
+            'items': args.items,
+            'reruns': args.reruns,
+            'workers': data_store.LOAD_WORKERS,
+            'columnar': bool(args.ingest),
+            'memory': bool(args.memory),
+            'data_dir': data_dir,
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'streamlit': st.__version__,
+            'platform': platform.platform(),
+        },
+        'load_data': load,
+        'reruns': reruns,
+    }
+
+
+def _mb(value):
+    return '-' if value is None else f"{value / 1e6:.1f}"
+
+
+def print_report(result):
+    print(f"{'measurement':<42}{'wall s':>10}{'peak MB':>10}{'parsed':>8}")
+    for label, m in [('load_data, all runs, cold', result['load_data']['cold']),
+                     ('load_data, all runs, warm', result['load_data']['warm'])]:
+        print(f"{label:<42}{m['wall_s']:>10.3f}{_mb(m['peak_bytes']):>10}{m['files_parsed']:>8}")
+    for i, rerun in enumerate(result['reruns']):
+        m = rerun['total']
+        print(f"{f'rerun {i + 1}':<42}{m['wall_s']:>10.3f}{_mb(m['peak_bytes']):>10}{m['files_parsed']:>8}")
+        for step, m in rerun['steps'].items():
+            note = f"  ({m['error']})" if 'error' in m else ''
+            print(f"{'  ' + step:<42}{m['wall_s']:>10.3f}{_mb(m['peak_bytes']):>10}{m['files_parsed']:>8}{note}")
+
+
+def flatten(result):
+    # {metric name: value} of the numbers compared against a baseline
+    values = {}
+    for phase in ['cold', 'warm']:
+        for field, value in result['load_data'][phase].items():
+            values[f"load_data.{phase}.{field}"] = value
+    reruns = result['reruns']
+    for label, rerun in [('first_rerun', reruns[0]), ('last_rerun', reruns[-1])] if reruns else []:
+        for field, value in rerun['total'].items():
+            values[f"{label}.{field}"] = value
+        for step, m in rerun['steps'].items():
+            values[f"{label}.{step}.wall_s"] = m['wall_s']
+    return values
+
+
+def compare(result, baseline, tolerance, min_seconds=0.005):
+    # Print current vs baseline; a metric regresses when it grows by more than the tolerance
+    # (and, for times, by more than min_seconds). Returns the number of regressions.
+    current = flatten(result)
+    previous = flatten(baseline)
+    regressions = 0
+    print(f"{'metric':<54}{'baseline':>12}{'current':>12}{'ratio':>8}")
+    for name, value in current.items():
+        before = previous.get(name)
+        if value is None or before is None:
+            continue
+        ratio = value / before if before else (1.0 if value == before else float('inf'))
+        worse = ratio > 1 + tolerance and (not name.endswith('wall_s') or value - before > min_seconds)
+        regressions += worse
+        print(f"{name:<54}{before:>12.4g}{value:>12.4g}{ratio:>8.2f}{'  REGRESSION' if worse else ''}")
+    configs = [{k: v for k, v in r.get('config', {}).items() if k != 'data_dir'} for r in [baseline, result]]
+    if configs[0] != configs[1]:
+        print("Note: the baseline was recorded with a different configuration", file=sys.stderr)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard on synthetic run workbooks.")
+    parser.add_argument('--runs', type=int, default=6, help="number of synthetic runs to generate")
+    parser.add_argument('--horizon', type=int, default=300, help="time periods per run")
+    parser.add_argument('--items', type=int, default=None, help="items per state sheet (padded with fillers)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--reruns', type=int, default=3, help="dashboard reruns to time (the first is cold)")
+    parser.add_argument('--disruption', default=None, help="disruption label to select (default: the first)")
+    parser.add_argument('--workers', type=int, default=None, help="run loader workers (1 loads in-process)")
+    parser.add_argument('--ingest', action='store_true', help="convert the workbooks to Parquet first")
+    parser.add_argument('--data-dir', default=None, help="benchmark an existing app_data folder instead")
+    parser.add_argument('--work-dir', default=None, help="where to write the synthetic app_data folder")
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help="skip tracemalloc, which slows everything down several times")
+    parser.add_argument('--output', default=None, help="write the results to this JSON file")
+    parser.add_argument('--save-baseline', default=None, help="write the results as a baseline JSON file")
+    parser.add_argument('--compare', default=None, help="compare the results with this baseline JSON file")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed relative slowdown, e.g. 0.25")
+    args = parser.parse_args(argv)
+    # The benchmark changes into the data folder's parent, so resolve the given paths first
+    for name in ['data_dir', 'work_dir', 'output', 'save_baseline', 'compare']:
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+
+    quiet_streamlit()
+    result = run_benchmark(args)
+    print_report(result)
+
+    for path in [args.output, args.save_baseline]:
+        if path:
+            with open(path, 'w') as f:
+                json.dump(result, f, indent=2)
+            print(f"Results written to {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        return 1 if compare(result, baseline, args.tolerance) else 0
+    return 0
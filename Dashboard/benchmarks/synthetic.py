@@ -0,0 +1,90 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_store import REQUIRED_SHEETS
+
+# Items the dashboard reads from each sheet; extra filler items are appended when more are requested
+SHEET_ITEMS = {
+    'DS 1 state': ['Backlog', 'Demand', 'Up-to-level', 'Delivery', 'Inventory', 'Order', 'Lead-time'],
+    'DS 2 state': ['Backlog', 'Demand', 'Up-to-level', 'Delivery', 'Inventory', 'Order', 'Lead-time'],
+    'MN 1 state': ['Demand', 'Up-to-level', 'Backlog', 'Inventory', 'Production amount', 'In production',
+                   'Lead-time', 'Order'],
+    'MN 2 state': ['Demand', 'Up-to-level', 'Backlog', 'Inventory', 'Production amount', 'In production',
+                   'Lead-time', 'Order'],
+    'HC 1 state': ['Backlog', 'Demand', 'Up-to-level', 'Delivery', 'Inventory', 'Order', 'Lead-time'],
+    'HC 2 state': ['Backlog', 'Demand', 'Up-to-level', 'Delivery', 'Inventory', 'Order', 'Lead-time'],
+    'HC 1 trust': ['Trust DS 1', 'Trust DS 2'],
+    'HC 2 trust': ['Trust DS 1', 'Trust DS 2'],
+    'HC 1 shipments': ['Order DS 1', 'Order DS 2'],
+    'DS 1 shipments': ['Shipment HC 1', 'Shipment HC 2'],
+    'DS 2 shipments': ['Shipment HC 1', 'Shipment HC 2'],
+    'Reward': ['DS 1', 'DS 2', 'HC 1', 'HC 2', 'MN 1', 'MN 2'],
+}
+
+AGENTS = ['DRL', 'DRL_RNN', 'basestock']
+DISRUPTIONS = ['No disruption', 'short (67-72)', 'moderate (67-81)', 'long (67-86)', 'longest (67-98)',
+               'multiple (67-72, 110-116)']
+ORDER_TYPE = 'HC1Trust-MN1Disrupted'
+
+
+def sheet_items(sheet_name, items=None):
+    # The sheet's own items, padded with 'Item k' fillers up to the requested count (state sheets only)
+    names = list(SHEET_ITEMS[sheet_name])
+    if items is not None and sheet_name.endswith('state'):
+        names += [f"Item {k}" for k in range(len(names), items)]
+    return names
+
+
+def synthetic_sheet(sheet_name, horizon, items, rng):
+    # One sheet in the long layout: Time/item/Value, or Time/Agent/Value for the Reward sheet
+    names = sheet_items(sheet_name, items)
+    time = np.repeat(np.arange(horizon), len(names))
+    values = rng.normal(100.0, 20.0, len(time)).round(2)
+    if sheet_name == 'Reward':
+        return pd.DataFrame({'Time': time, 'Agent': np.tile(names, horizon), 'Value': -values})
+    if sheet_name.endswith('trust'):
+        values = rng.uniform(0.0, 1.0, len(time)).round(4)
+    return pd.DataFrame({'Time': time, 'item': np.tile(names, horizon), 'Value': values})
+
+
+def write_workbook(path, horizon=300, items=None, seed=0):
+    rng = np.random.default_rng(seed)
+    with pd.ExcelWriter(path) as writer:
+        for sheet_name in REQUIRED_SHEETS:
+            synthetic_sheet(sheet_name, horizon, items, rng).to_excel(writer, sheet_name=sheet_name, index=False)
+    return path
+
+
+def write_time_taken(path, episodes=20, seed=0):
+    rng = np.random.default_rng(seed)
+    pd.DataFrame({
+        'Episode': np.arange(1, episodes + 1),
+        'Time Taken': rng.gamma(4.0, 2.5, episodes).round(3),
+    }).to_excel(path, index=False)
+    return path
+
+
+def run_names(runs):
+    # (agent, disruption, factor) of the first n runs: agents vary fastest, then disruptions, then factors
+    names = []
+    for i in range(runs):
+        agent = AGENTS[i % len(AGENTS)]
+        disruption = DISRUPTIONS[(i // len(AGENTS)) % len(DISRUPTIONS)]
+        factor = f"{0.1 * (1 + i // (len(AGENTS) * len(DISRUPTIONS))):g}"
+        names.append((agent, disruption, factor))
+    return names
+
+
+def generate_runs(data_dir, runs=6, horizon=300, items=None, time_taken=True, seed=0):
+    # Writes DS1_MN1_{agent}_{order_type}_{disruption}_s{factor}.xlsx workbooks (and their time_taken_ files)
+    # into data_dir and returns the workbook paths
+    os.makedirs(data_dir, exist_ok=True)
+    paths = []
+    for i, (agent, disruption, factor) in enumerate(run_names(runs)):
+        name = f"DS1_MN1_{agent}_{ORDER_TYPE}_{disruption}_s{factor}.xlsx"
+        paths.append(write_workbook(os.path.join(data_dir, name), horizon, items, seed + i))
+        if time_taken:
+            write_time_taken(os.path.join(data_dir, 'time_taken_' + name), seed=seed + i)
+    return paths
@@ -0,0 +1,168 @@
+import math
+import warnings
+import zlib
+from concurrent.futures import as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+import data_store
+from data_store import discard_worker_pool, loader_cache, run_signature, worker_pool
+from matrices import get_matrix
+from metrics import HORIZON, REWARD_TOTAL, RUN_KEYS, STATE_SHEETS, WARMUP
+from profiling import span
+
+# Statistics of the summary tables that get confidence intervals, and the defaults of the sidebar options
+BOOTSTRAP_METRICS = ['mean', 'std', 'mad']
+DEFAULT_RESAMPLES = 1000
+DEFAULT_CONFIDENCE = 0.95
+# Upper bound on the size of one (resample x period) batch, in floats
+BATCH_VALUES = 4_000_000
+
+
+def block_length(n):
+    # Moving-block length for an autocorrelated series of n periods (the usual n^(1/3) rule)
+    return max(1, int(round(n ** (1 / 3))))
+
+
+def resample_indices(n, resamples, block, rng):
+    # (resamples x n) matrix of period positions. With block 1 every position is drawn independently;
+    # otherwise the rows are concatenated runs of `block` consecutive periods starting at random positions
+    # (moving-block bootstrap), which keeps the autocorrelation within each block.
+    if block <= 1:
+        return rng.integers(0, n, size=(resamples, n))
+    block = min(block, n)
+    starts = rng.integers(0, n - block + 1, size=(resamples, math.ceil(n / block)))
+    return (starts[:, :, None] + np.arange(block)).reshape(resamples, -1)[:, :n]
+
+
+def resampled_stats(values, indices):
+    # Mean, STD and mean absolute deviation of every item (column of values) in every resample (row of
+    # indices), as three (resamples x items) arrays; NaN periods are left out as in the summary tables.
+    # Each resample is reduced to how often it drew every period, so the sums are matrix products instead
+    # of a (resamples x periods x items) gather.
+    resamples, n = indices.shape
+    weights = np.bincount((indices + n * np.arange(resamples)[:, None]).ravel(), minlength=resamples * n)
+    weights = weights.reshape(resamples, n).astype('float64')
+    valid = ~np.isnan(values)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Centring on the column means keeps the sum of squares from cancelling
+        centre = np.where(valid.any(axis=0), np.where(valid, values, 0.0).sum(axis=0) / valid.sum(axis=0), 0.0)
+        centred = np.where(valid, values - centre, 0.0)
+        count = weights @ valid
+        mean = weights @ centred / count
+        variance = (weights @ centred ** 2 - count * mean ** 2) / (count - 1)
+        mad = np.empty_like(mean)
+        for i in range(values.shape[1]):
+            mad[:, i] = (weights * valid[:, i] * np.abs(centred[:, i] - mean[:, i:i + 1])).sum(axis=1)
+        mad /= count
+    return {'mean': mean + centre, 'std': np.sqrt(np.maximum(variance, 0)), 'mad': mad}
+
+
+def bootstrap_matrix(values, resamples, rng, block=1, confidence=DEFAULT_CONFIDENCE):
+    # {metric: (low, high)} percentile intervals of every item of a (periods x items) array. The same
+    # resample indices are shared by all items, and resamples are processed in batches to bound memory.
+    n, n_items = values.shape
+    if n == 0:
+        empty = np.full(n_items, np.nan)
+        return {metric: (empty, empty) for metric in BOOTSTRAP_METRICS}
+    batch = max(1, BATCH_VALUES // n)
+    stats = {metric: [] for metric in BOOTSTRAP_METRICS}
+    for start in range(0, resamples, batch):
+        indices = resample_indices(n, min(batch, resamples - start), block, rng)
+        for metric, result in resampled_stats(values, indices).items():
+            stats[metric].append(result)
+    tail = (1 - confidence) / 2 * 100
+    intervals = {}
+    for metric, results in stats.items():
+        with warnings.catch_warnings():
+            # An item without any value in the window has an all-NaN interval
+            warnings.simplefilter('ignore', RuntimeWarning)
+            low, high = np.nanpercentile(np.concatenate(results), [tail, 100 - tail], axis=0)
+        intervals[metric] = (low, high)
+    return intervals
+
+
+def _bootstrap_run(arrays, resamples, seed, block, confidence):
+    # Intervals of every (entity, item) series of one run, from the output of run_arrays. The random stream
+    # depends only on the seed and the run, so results do not depend on which runs share a pool.
+    # Returns {metric: frame with entity, item, low and high}.
+    rows = {metric: [] for metric in BOOTSTRAP_METRICS}
+    for entity, items, values, run_seed in arrays:
+        rng = np.random.default_rng([seed, run_seed])
+        length = block_length(len(values)) if block == 'auto' else int(block)
+        for metric, (low, high) in bootstrap_matrix(values, resamples, rng, length, confidence).items():
+            rows[metric].append(pd.DataFrame({'entity': entity, 'item': items, 'low': low, 'high': high}))
+    return {metric: pd.concat(frames, ignore_index=True) if frames else
+            pd.DataFrame(columns=['entity', 'item', 'low', 'high'])
+            for metric, frames in rows.items()}
+
+
+def _reward_matrix(run):
+    matrix = get_matrix(run, 'Reward')
+    if matrix is None:
+        return None
+    with np.errstate(invalid='ignore'):
+        total = np.where(np.isnan(matrix.values).all(axis=1), np.nan, np.nansum(matrix.values, axis=1))
+    return matrix.with_columns({REWARD_TOTAL: total})
+
+
+def run_arrays(run, warmup=WARMUP, horizon=HORIZON):
+    # [(entity, items, values, run seed)] of the state sheets and the rewards of a run in the analysis window
+    arrays = []
+    run_seed = zlib.crc32(run_signature(run)[0].encode())
+    for sheet_name in STATE_SHEETS + ['Reward']:
+        matrix = _reward_matrix(run) if sheet_name == 'Reward' else get_matrix(run, sheet_name)
+        if matrix is None:
+            continue
+        matrix = matrix.window(after=warmup, until=horizon)
+        arrays.append((sheet_name, matrix.items, np.ascontiguousarray(matrix.values), run_seed))
+    return arrays
+
+
+def bootstrap_intervals(runs, resamples=DEFAULT_RESAMPLES, seed=0, block='auto', confidence=DEFAULT_CONFIDENCE,
+                        warmup=WARMUP, horizon=HORIZON, max_workers=None):
+    # Confidence intervals of the mean, STD and MAD of every (run, entity, item), labelled like run_metrics
+    # with {metric}_low and {metric}_high columns. block is 1 for the ordinary bootstrap, an integer or
+    # 'auto' for the moving-block bootstrap. Each (run, metric) result is cached; runs missing for any metric
+    # are resampled together in the loader process pool.
+    def cache_key(metric, run):
+        return ('bootstrap', metric, resamples, seed, block, confidence, warmup, horizon) + run_signature(run)
+
+    results = [{metric: loader_cache.lookup(cache_key(metric, run)) for metric in BOOTSTRAP_METRICS} for run in runs]
+    missing = [i for i, result in enumerate(results) if any(value is None for value in result.values())]
+    max_workers = max_workers or data_store.LOAD_WORKERS
+    with span('bootstrap', runs=len(missing), resamples=resamples):
+        arrays = {i: run_arrays(runs[i], warmup, horizon) for i in missing}
+        if max_workers == 1 or len(missing) <= 1:
+            computed = {i: _bootstrap_run(arrays[i], resamples, seed, block, confidence) for i in missing}
+        else:
+            computed = {}
+            futures = {worker_pool('process', max_workers).submit(_bootstrap_run, arrays[i], resamples, seed, block,
+                                                                  confidence): i for i in missing}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    computed[i] = future.result()
+                except BrokenProcessPool:
+                    discard_worker_pool('process', max_workers)
+                    computed[i] = _bootstrap_run(arrays[i], resamples, seed, block, confidence)
+    for i, result in computed.items():
+        for metric, frame in result.items():
+            loader_cache.put(cache_key(metric, runs[i]), frame)
+        results[i] = result
+
+    frames = []
+    for run, result in zip(runs, results):
+        merged = None
+        for metric in BOOTSTRAP_METRICS:
+            frame = result[metric].rename(columns={'low': f'{metric}_low', 'high': f'{metric}_high'})
+            merged = frame if merged is None else merged.merge(frame, on=['entity', 'item'], how='outer')
+        if len(merged):
+            frames.append(merged.assign(**{key: getattr(run, key) for key in RUN_KEYS}))
+    columns = RUN_KEYS + ['entity', 'item'] + [f'{metric}_{bound}' for metric in BOOTSTRAP_METRICS
+                                               for bound in ['low', 'high']]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)[columns]
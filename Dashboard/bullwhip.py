@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+
+from data_store import loader_cache, run_signature
+from matrices import get_matrix
+from metrics import HORIZON, RUN_KEYS, WARMUP
+
+# Echelons from the customer side up, with the entity sheets that place and receive their orders
+ECHELONS = {
+    'HC': ['HC 1 state', 'HC 2 state'],
+    'DS': ['DS 1 state', 'DS 2 state'],
+    'MN': ['MN 1 state', 'MN 2 state'],
+}
+BULLWHIP_SHEETS = [sheet_name for sheets in ECHELONS.values() for sheet_name in sheets]
+# Periods of the rolling bullwhip ratios
+BULLWHIP_WINDOW = 20
+BULLWHIP_COLUMNS = ['echelon', 'entity', 'order_variance', 'demand_variance', 'ratio', 'ratio_to_customer']
+ROLLING_COLUMNS = ['Time', 'echelon', 'ratio']
+# Entity label of the rows that sum all entities of an echelon
+ECHELON_TOTAL = 'All'
+
+
+def series_cube(runs, warmup=WARMUP, horizon=HORIZON):
+    # Order and Demand of every BULLWHIP_SHEETS entity of every run in the analysis window, as one
+    # (run x time x entity x [Order, Demand]) array on the union of the runs' time grids; missing values are NaN
+    matrices = []
+    for run in runs:
+        row = []
+        for sheet_name in BULLWHIP_SHEETS:
+            matrix = get_matrix(run, sheet_name)
+            row.append(None if matrix is None else matrix.window(after=warmup, until=horizon))
+        matrices.append(row)
+    times = [matrix.time for row in matrices for matrix in row if matrix is not None]
+    time = np.unique(np.concatenate(times)) if times else np.empty(0, dtype='int64')
+    cube = np.full((len(runs), len(time), len(BULLWHIP_SHEETS), 2), np.nan)
+    for r, row in enumerate(matrices):
+        for e, matrix in enumerate(row):
+            if matrix is None or not len(matrix):
+                continue
+            rows = np.searchsorted(time, matrix.time)
+            for k, item in enumerate(['Order', 'Demand']):
+                if item in matrix:
+                    cube[r, rows, e, k] = matrix.column(item)
+    return time, cube
+
+
+def echelon_cube(cube):
+    # Sum the entities of each echelon: (run x time x echelon x [Order, Demand]); a period where every entity of
+    # an echelon is missing stays NaN
+    totals = []
+    start = 0
+    for sheets in ECHELONS.values():
+        part = cube[:, :, start:start + len(sheets)]
+        totals.append(np.where(np.isnan(part).all(axis=2), np.nan, np.nansum(part, axis=2)))
+        start += len(sheets)
+    return np.stack(totals, axis=2)
+
+
+def _variance(values, axis=1):
+    # Sample variance along the time axis, NaN periods left out; fewer than two values give NaN
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=axis)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(valid, values, 0.0).sum(axis=axis) / count
+        deviation = np.where(valid, values - np.expand_dims(mean, axis), 0.0)
+        return np.where(count > 1, (deviation ** 2).sum(axis=axis) / (count - 1), np.nan)
+
+
+def rolling_variance(values, window):
+    # Variance of every `window` consecutive periods along axis 1 (window ending at each period from the
+    # window-th one on) from running sums, for all runs and series at once
+    valid = ~np.isnan(values)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Centring on the overall means keeps the running sums of squares from cancelling
+        centre = np.where(valid, values, 0.0).sum(axis=1, keepdims=True) / valid.sum(axis=1, keepdims=True)
+        centred = np.where(valid, values - np.nan_to_num(centre), 0.0)
+        sums = [np.concatenate([np.zeros_like(a[:, :1]), np.cumsum(a, axis=1)], axis=1)
+                for a in (valid.astype('float64'), centred, centred ** 2)]
+        count, total, squares = (s[:, window:] - s[:, :-window] for s in sums)
+        return np.where(count > 1, (squares - total ** 2 / count) / (count - 1), np.nan)
+
+
+def compute_bullwhip(runs, window=BULLWHIP_WINDOW, warmup=WARMUP, horizon=HORIZON):
+    # Bullwhip ratios (order variance over demand variance) of every entity and echelon of the given runs, and
+    # the rolling echelon ratios, from one stacked array. Returns one (ratios, rolling) pair of frames per run.
+    time, cube = series_cube(runs, warmup, horizon)
+    echelons = echelon_cube(cube)
+    entity_variance = _variance(cube)
+    echelon_variance = _variance(echelons)
+    # Amplification relative to the demand of the end customers, i.e. of the first echelon
+    customer = echelon_variance[:, 0, 1]
+
+    labels = list(ECHELONS)
+    entity_echelon = [echelon for echelon, sheets in ECHELONS.items() for _ in sheets]
+    names = [(echelon, sheet_name) for echelon, sheet_name in zip(entity_echelon, BULLWHIP_SHEETS)]
+    names += [(echelon, ECHELON_TOTAL) for echelon in labels]
+    variance = np.concatenate([entity_variance, echelon_variance], axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratio = variance[:, :, 0] / variance[:, :, 1]
+        to_customer = variance[:, :, 0] / customer[:, None]
+
+    if len(time) >= window:
+        rolling_time = time[window - 1:]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rolling = rolling_variance(echelons[..., 0], window) / rolling_variance(echelons[..., 1], window)
+    else:
+        rolling_time, rolling = time[:0], np.empty((len(runs), 0, len(labels)))
+
+    results = []
+    for r in range(len(runs)):
+        ratios = pd.DataFrame({
+            'echelon': [name[0] for name in names],
+            'entity': [name[1] for name in names],
+            'order_variance': variance[r, :, 0],
+            'demand_variance': variance[r, :, 1],
+            'ratio': ratio[r],
+            'ratio_to_customer': to_customer[r],
+        })
+        ratios = ratios[~np.isnan(ratios['order_variance']) | ~np.isnan(ratios['demand_variance'])]
+        rolling_df = pd.DataFrame({
+            'Time': np.repeat(rolling_time, len(labels)),
+            'echelon': np.tile(np.array(labels, dtype=object), len(rolling_time)),
+            'ratio': rolling[r].ravel(),
+        }).dropna(subset=['ratio'])
+        results.append((ratios.reset_index(drop=True), rolling_df.reset_index(drop=True)))
+    return results
+
+
+def _bullwhip_results(runs, window, warmup, horizon):
+    # Per-run results, cached; runs missing from the cache are stacked and computed together
+    keys = [('bullwhip', window, warmup, horizon) + run_signature(run) for run in runs]
+    results = [loader_cache.lookup(key) for key in keys]
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        for i, result in zip(missing, compute_bullwhip([runs[i] for i in missing], window, warmup, horizon)):
+            loader_cache.put(keys[i], result)
+            results[i] = result
+    return results
+
+
+def _labelled(runs, frames, columns):
+    frames = [frame.assign(**{key: getattr(run, key) for key in RUN_KEYS})
+              for run, frame in zip(runs, frames) if len(frame)]
+    if not frames:
+        return pd.DataFrame(columns=RUN_KEYS + columns)
+    return pd.concat(frames, ignore_index=True)[RUN_KEYS + columns]
+
+
+def bullwhip_ratios(runs, window=BULLWHIP_WINDOW, warmup=WARMUP, horizon=HORIZON):
+    # Overall bullwhip ratios of every entity and echelon of the given runs, labelled with the run keys
+    results = _bullwhip_results(runs, window, warmup, horizon)
+    return _labelled(runs, [ratios for ratios, _ in results], BULLWHIP_COLUMNS)
+
+
+def rolling_bullwhip(runs, window=BULLWHIP_WINDOW, warmup=WARMUP, horizon=HORIZON):
+    # Echelon bullwhip ratios over `window` periods ending at every Time, labelled with the run keys
+    results = _bullwhip_results(runs, window, warmup, horizon)
+    return _labelled(runs, [rolling for _, rolling in results], ROLLING_COLUMNS)
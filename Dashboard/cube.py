@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+from data_store import load_runs, loader_cache, run_signature
+from metrics import HORIZON, RUN_KEYS, SUMMARY_SHEETS, WARMUP, run_metrics, stored_summary
+
+# Axes of the metric cube, in storage order
+CUBE_AXES = RUN_KEYS + ['entity', 'item', 'statistic']
+CUBE_STATISTICS = ['mean', 'std', 'mad']
+
+
+class MetricCube:
+    """Summary metrics of every run as one dense array over agent x order type x disruption x factor x entity
+    x item x statistic; combinations without a run or item are NaN."""
+
+    def __init__(self, labels, values, missing=()):
+        self.labels = labels
+        self.values = values
+        # Runs that could not be read when the cube was built
+        self.missing = list(missing)
+        self._positions = {axis: {label: i for i, label in enumerate(labels[axis])} for axis in CUBE_AXES}
+
+    @classmethod
+    def from_summary(cls, summary, orders=None, missing=()):
+        # Scatter the rows of a run_metrics frame into the cube. orders gives the label order of some axes
+        # (e.g. the catalog's disruption order); other axes are sorted.
+        orders = orders or {}
+        labels = {}
+        for axis in CUBE_AXES[:-1]:
+            present = set(summary[axis].astype(str))
+            ordered = [label for label in orders.get(axis, []) if label in present]
+            labels[axis] = ordered + sorted(present - set(ordered))
+        labels['statistic'] = list(CUBE_STATISTICS)
+
+        values = np.full([len(labels[axis]) for axis in CUBE_AXES], np.nan)
+        if len(summary):
+            codes = tuple(pd.Categorical(summary[axis].astype(str), categories=labels[axis]).codes
+                          for axis in CUBE_AXES[:-1])
+            values[codes] = summary[CUBE_STATISTICS].to_numpy(dtype='float64')
+        return cls(labels, values, missing)
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    def position(self, axis, label):
+        return self._positions[axis][str(label)]
+
+    def take(self, **fixed):
+        # Fix some axes to one label each, e.g. take(entity='DS 1 state', statistic='mean'); returns the
+        # remaining axes and a view of the array over them (basic indexing, no copy)
+        index = tuple(self.position(axis, fixed[axis]) if axis in fixed else slice(None) for axis in CUBE_AXES)
+        return [axis for axis in CUBE_AXES if axis not in fixed], self.values[index]
+
+    def frame(self, axes, **fixed):
+        # Long frame of the given free axes (every other axis must be fixed) with a Value column
+        free, values = self.take(**fixed)
+        if sorted(free) != sorted(axes):
+            raise ValueError(f"Fix every axis except {axes}; free axes are {free}")
+        values = np.moveaxis(values, [free.index(axis) for axis in axes], list(range(len(axes))))
+        grid = pd.MultiIndex.from_product([self.labels[axis] for axis in axes], names=axes)
+        return grid.to_frame(index=False).assign(Value=values.ravel())
+
+
+def _build_cube(runs, orders, warmup, horizon):
+    # Runs without a current summary are loaded together in the loader pool first, only the sheets the
+    # summaries are computed from
+    pending = [run for run in runs if ('metrics', warmup, horizon) + run_signature(run) not in loader_cache and
+               stored_summary(run, warmup, horizon) is None]
+    failures = load_runs(pending, sheets=SUMMARY_SHEETS)
+    runs = [run for run in runs if run.path not in failures]
+    return MetricCube.from_summary(run_metrics(runs, warmup, horizon), orders, missing=list(failures))
+
+
+def get_metric_cube(catalog, warmup=WARMUP, horizon=HORIZON):
+    # Cube of the representative run of every combination in the catalog, cached until a workbook changes
+    runs = [catalog.lookup(*key) for key in sorted({tuple(entry[:4]) for entry in catalog})]
+    orders = {'disruption': catalog.options('disruption'), 'factor': catalog.options('factor')}
+    key = ('metric_cube', warmup, horizon) + tuple(run_signature(run) for run in runs)
+    return loader_cache.get(key, lambda: _build_cube(runs, orders, warmup, horizon))
@@ -0,0 +1,387 @@
+import contextvars
+import json
+import multiprocessing
+import os
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+
+from profiling import count, span
+
+REQUIRED_SHEETS = ['DS 1 state', 'DS 2 state', 'MN 1 state', 'MN 2 state', 'HC 1 state', 'HC 2 state', 'HC 1 trust',
+                   'HC 2 trust', 'HC 1 shipments', 'DS 1 shipments', 'DS 2 shipments', 'Reward']
+
+# Converted per-sheet tables live in app_data/columnar/<workbook name>/ (see ingest.py)
+COLUMNAR_DIR = 'columnar'
+MANIFEST_NAME = 'manifest.json'
+
+# Memory budget of the shared loader cache, in megabytes (override with DASHBOARD_CACHE_MB)
+DEFAULT_CACHE_MB = 512
+
+# Value column dtype of loaded sheets; DASHBOARD_FLOAT32=1 halves their size at the cost of precision
+VALUE_DTYPE = 'float32' if os.environ.get('DASHBOARD_FLOAT32', '') not in ('', '0') else 'float64'
+
+# Workers used to load several runs at once (override with DASHBOARD_LOAD_WORKERS; 1 loads serially)
+LOAD_WORKERS = int(os.environ.get('DASHBOARD_LOAD_WORKERS', 0)) or min(8, os.cpu_count() or 1)
+
+
+def _sizeof(value):
+    # Approximate resident size of a cached value (a frame, an array or a dict of frames)
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, dict):
+        return sum(_sizeof(v) for v in value.values())
+    if isinstance(value, (tuple, list)):
+        return sum(_sizeof(v) for v in value)
+    if isinstance(value, bytes):
+        return len(value)
+    # A chart counts the frames it embeds, including those of its layers
+    data = getattr(value, 'data', None)
+    if isinstance(data, pd.DataFrame) or getattr(value, 'layer', None):
+        return _sizeof(data) + sum(_sizeof(layer) for layer in getattr(value, 'layer', None) or [])
+    return int(getattr(value, 'nbytes', 0))
+
+
+def file_signature(file_path):
+    # (path, mtime, size) identifies one version of a file; raises FileNotFoundError like pd.read_excel
+    stat = os.stat(file_path)
+    return os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size
+
+
+class LoaderCache:
+    """Process-wide LRU cache shared by every Streamlit session, bounded by a memory budget."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._key_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+        # Values stored per key kind ('workbook', 'columnar', 'matrix', ...), i.e. how often each was computed
+        self.stores = Counter()
+
+    def get(self, key, loader):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                count(cache_hits=1)
+                return self._entries[key][0]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Only one thread parses a given file; the others wait and then hit the cache. The key's lock is dropped
+        # however the loader ends, so keys that failed to load do not pile up.
+        try:
+            with key_lock:
+                with self._lock:
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+                        self.hits += 1
+                        count(cache_hits=1)
+                        return self._entries[key][0]
+                    self.misses += 1
+                    count(cache_misses=1)
+
+                value = loader()
+                self.put(key, value)
+        finally:
+            with self._lock:
+                self._key_locks.pop(key, None)
+        return value
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def lookup(self, key):
+        # Cached value or None, for callers that batch the loading of several missing keys themselves
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                count(cache_hits=1)
+                return self._entries[key][0]
+            self.misses += 1
+            count(cache_misses=1)
+            return None
+
+    def put(self, key, value):
+        size = _sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            else:
+                self.stores[key[0]] += 1
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            # Evict least recently used entries, but always keep the newest one
+            while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def set_budget(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'stores': dict(self.stores),
+            }
+
+
+loader_cache = LoaderCache(int(float(os.environ.get('DASHBOARD_CACHE_MB', DEFAULT_CACHE_MB)) * 1024 * 1024))
+
+
+def normalize_sheet(df, value_dtype='float64'):
+    # Compact typed columns for the long Time/item/Value layout (and the Agent column of the Reward sheet):
+    # the smallest integer type holding every Time, integer-coded categories and value_dtype values
+    df = df.dropna(subset=['Time']) if 'Time' in df else df.copy()
+    if 'Time' in df:
+        df['Time'] = pd.to_numeric(df['Time'].astype('int64'), downcast='integer')
+    if 'item' in df:
+        df['item'] = df['item'].astype('category')
+    if 'Agent' in df:
+        df['Agent'] = df['Agent'].astype('category')
+    if 'Value' in df:
+        df['Value'] = pd.to_numeric(df['Value'], errors='coerce').astype(value_dtype)
+    return df.reset_index(drop=True)
+
+
+def compact_sheet(df):
+    # Narrow the columns of a sheet read from a converted table that was written with wider types
+    if 'Time' in df and df['Time'].dtype.kind == 'i':
+        df['Time'] = pd.to_numeric(df['Time'], downcast='integer')
+    if 'Value' in df and df['Value'].dtype != VALUE_DTYPE:
+        df['Value'] = df['Value'].astype(VALUE_DTYPE)
+    return df
+
+
+def columnar_dir(file_path):
+    directory, name = os.path.split(file_path)
+    return os.path.join(directory, COLUMNAR_DIR, os.path.splitext(name)[0])
+
+
+def columnar_path(file_path, sheet_name):
+    return os.path.join(columnar_dir(file_path), f"{sheet_name}.parquet")
+
+
+def read_manifest(manifest_path):
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def columnar_manifest(file_path, signature=None):
+    # The ingest manifest, or None when the workbook was never converted or changed after conversion
+    signature = signature or file_signature(file_path)
+    manifest_path = os.path.join(columnar_dir(file_path), MANIFEST_NAME)
+    try:
+        stat = os.stat(manifest_path)
+    except FileNotFoundError:
+        return None
+    if stat.st_mtime_ns < signature[1]:
+        return None
+    key = ('manifest', os.path.abspath(manifest_path), stat.st_mtime_ns, stat.st_size)
+    return loader_cache.get(key, lambda: read_manifest(manifest_path))
+
+
+def _read_workbook(file_path):
+    excel_file = pd.ExcelFile(file_path)
+    sheet_names = [sheet_name for sheet_name in REQUIRED_SHEETS if sheet_name in excel_file.sheet_names]
+    data = pd.read_excel(excel_file, sheet_name=sheet_names) if sheet_names else {}
+
+    # Initialize the selected_data dictionary
+    selected_data = {}
+
+    for sheet_name in REQUIRED_SHEETS:
+        if sheet_name in data:
+            selected_data[sheet_name] = normalize_sheet(data[sheet_name], VALUE_DTYPE)
+
+    count(reads=1, bytes_read=os.path.getsize(file_path), rows_read=sum(len(df) for df in selected_data.values()))
+    return selected_data
+
+
+def _read_columnar_sheet(file_path, sheet_name, columns):
+    path = columnar_path(file_path, sheet_name)
+    df = compact_sheet(pd.read_parquet(path, columns=columns))
+    count(reads=1, bytes_read=os.path.getsize(path), rows_read=len(df))
+    return df
+
+
+def _load_sheets(file_path, signature, manifest, sheets, columns):
+    sheets = REQUIRED_SHEETS if sheets is None else sheets
+    columns = list(columns) if columns is not None else None
+
+    if manifest is not None:
+        selected_data = {}
+        for sheet_name in sheets:
+            if sheet_name not in manifest['sheets']:
+                continue
+            full_key = ('columnar',) + signature + (sheet_name, None)
+            if columns is None or full_key in loader_cache:
+                # Whole sheet, e.g. prefetched by load_runs; column selection happens in memory
+                df = loader_cache.get(full_key, lambda s=sheet_name: _read_columnar_sheet(file_path, s, None))
+                if columns is not None:
+                    df = df[[c for c in columns if c in df.columns]]
+            else:
+                sheet_columns = [c for c in columns if c in manifest['sheets'][sheet_name]['columns']]
+                key = ('columnar',) + signature + (sheet_name, tuple(sheet_columns))
+                df = loader_cache.get(
+                    key, lambda s=sheet_name, c=sheet_columns: _read_columnar_sheet(file_path, s, c))
+            selected_data[sheet_name] = df
+        return selected_data
+
+    # No up-to-date columnar copy: parse the workbook once and serve every sheet from that entry
+    key = ('workbook',) + signature
+    data = loader_cache.get(key, lambda: _read_workbook(file_path))
+    selected_data = {}
+    for sheet_name in sheets:
+        if sheet_name not in data:
+            continue
+        df = data[sheet_name]
+        if columns is not None:
+            df = df[[c for c in columns if c in df.columns]]
+        selected_data[sheet_name] = df
+    return selected_data
+
+
+def load_data(file_path, sheets=None, columns=None):
+    # Cached frames are shared between sessions, so callers must copy before mutating them in place.
+    # Only the requested sheets (default: all required sheets) and columns are returned.
+    with span('load_data', path=file_path) as record:
+        signature = file_signature(file_path)
+        data = _load_sheets(file_path, signature, columnar_manifest(file_path, signature), sheets, columns)
+        if record is not None:
+            record['rows_returned'] = sum(len(df) for df in data.values())
+        return data
+
+
+def run_signature(entry):
+    return os.path.abspath(entry.path), entry.mtime_ns, entry.size
+
+
+def load_run(entry, sheets=None, columns=None):
+    # Same as load_data for a run catalog entry, using the size, mtime and manifest recorded when the
+    # catalog was scanned instead of touching the filesystem again
+    with span('load_run', path=entry.path) as record:
+        data = _load_sheets(entry.path, run_signature(entry), entry.manifest, sheets, columns)
+        if record is not None:
+            record['rows_returned'] = sum(len(df) for df in data.values())
+        return data
+
+
+def _is_cached(entry, sheets):
+    signature = run_signature(entry)
+    if entry.manifest is None:
+        return ('workbook',) + signature in loader_cache
+    sheets = REQUIRED_SHEETS if sheets is None else sheets
+    return all(('columnar',) + signature + (sheet_name, None) in loader_cache
+               for sheet_name in sheets if sheet_name in entry.manifest['sheets'])
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def worker_pool(kind, max_workers):
+    # Shared 'process' or 'thread' pool of max_workers workers, kept for the life of the process so that reruns
+    # do not pay the worker start-up again. Workbooks are parsed in processes (openpyxl holds the GIL), Parquet
+    # tables are read in threads; other CPU-bound work (see bootstrap.py) reuses the process pools.
+    with _executors_lock:
+        key = (kind, max_workers)
+        if key not in _executors:
+            if kind == 'process':
+                _executors[key] = ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context('spawn'))
+            else:
+                _executors[key] = ThreadPoolExecutor(max_workers, thread_name_prefix='run-loader')
+        return _executors[key]
+
+
+def discard_worker_pool(kind, max_workers):
+    # Forget a pool that broke (e.g. a worker process died); the next worker_pool call starts a new one
+    with _executors_lock:
+        _executors.pop((kind, max_workers), None)
+
+
+def load_runs(entries, sheets=None, max_workers=None, progress=None):
+    # Load the runs missing from the shared cache concurrently in a bounded pool, calling
+    # progress(done, total) as they finish. A run that cannot be read does not stop the others:
+    # returns {path: exception} for the failed ones (entries with a manifest are not hashable).
+    max_workers = max_workers or LOAD_WORKERS
+    pending = [entry for entry in entries if not _is_cached(entry, sheets)]
+    failures = {}
+
+    if max_workers == 1:
+        for done, entry in enumerate(pending, 1):
+            try:
+                load_run(entry, sheets)
+            except Exception as e:
+                failures[entry.path] = e
+            if progress is not None:
+                progress(done, len(pending))
+        return failures
+
+    futures = {}
+    for entry in pending:
+        if entry.manifest is None:
+            future = worker_pool('process', max_workers).submit(_read_workbook, entry.path)
+        else:
+            # The copied context lets reads in the worker thread count towards the caller's profile
+            future = worker_pool('thread', max_workers).submit(contextvars.copy_context().run, load_run, entry, sheets)
+        futures[future] = entry
+
+    for done, future in enumerate(as_completed(futures), 1):
+        entry = futures[future]
+        try:
+            result = future.result()
+            if entry.manifest is None:
+                loader_cache.put(('workbook',) + run_signature(entry), result)
+                count(reads=1, bytes_read=entry.size, rows_read=sum(len(df) for df in result.values()))
+        except BrokenProcessPool as e:
+            discard_worker_pool('process', max_workers)
+            failures[entry.path] = e
+        except Exception as e:
+            failures[entry.path] = e
+        if progress is not None:
+            progress(done, len(futures))
+    return failures
+
+
+# New function for loading time-taken data
+def _read_time_taken(file_path):
+    df = pd.read_excel(file_path)
+    count(reads=1, bytes_read=os.path.getsize(file_path), rows_read=len(df))
+    return df
+
+
+def load_time_taken_data(file_path):
+    with span('load_time_taken_data', path=file_path) as record:
+        key = ('time_taken',) + file_signature(file_path)
+        df = loader_cache.get(key, lambda: _read_time_taken(file_path))
+        if record is not None:
+            record['rows_returned'] = len(df)
+        return df
@@ -0,0 +1,72 @@
+import numpy as np
+
+from data_store import loader_cache, run_signature
+from matrices import get_matrix
+
+# Series computed from the items of a sheet: name -> (operation, operand, ...). An operand is an item of the
+# sheet, another derived series or a nested (operation, operand, ...) tuple. Operands are aligned on the sheet's
+# Time index, and diff/cumsum run from the first period of the run.
+DERIVED_SERIES = {
+    'Order_to_Demand Ratio': ('ratio', 'Order', 'Demand'),
+    'Clipped Inventory': ('clip', 'Inventory'),
+    'Clipped Backlog': ('clip', 'Backlog'),
+    'Net Inventory': ('difference', 'Inventory', 'Backlog'),
+    'Unmet Demand': ('clip', ('difference', 'Demand', 'Delivery')),
+    'Cumulative Unmet Demand': ('cumsum', 'Unmet Demand'),
+    'Order Change': ('diff', 'Order'),
+}
+
+
+def _diff(values):
+    # Change from the previous period; the first period has none
+    return np.concatenate([[np.nan], np.diff(values)])
+
+
+def _cumsum(values):
+    # Running total that skips NaN periods (they stay NaN)
+    return np.where(np.isnan(values), np.nan, np.nancumsum(values))
+
+
+OPERATIONS = {
+    'ratio': np.divide,
+    'difference': np.subtract,
+    'sum': np.add,
+    'clip': lambda values: np.maximum(values, 0),
+    'diff': _diff,
+    'cumsum': _cumsum,
+}
+
+
+def evaluate(matrix, spec, column=None):
+    # Values of an item, derived series name or (operation, operand, ...) tuple over the rows of matrix, or None
+    # when an item it needs is missing. column(name) supplies named derived series (default: evaluated here).
+    if isinstance(spec, str):
+        if spec in DERIVED_SERIES:
+            return column(spec) if column is not None else evaluate(matrix, DERIVED_SERIES[spec])
+        return matrix.column(spec) if spec in matrix else None
+    operation, *operands = spec
+    values = [evaluate(matrix, operand, column) for operand in operands]
+    if any(value is None for value in values):
+        return None
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return OPERATIONS[operation](*values)
+
+
+def get_derived(run, sheet_name, name, matrix=None):
+    # A derived series of one run sheet, aligned with its matrix (default: the cached get_matrix one) and cached
+    # next to it; None when the sheet lacks an item it needs
+    if matrix is None:
+        matrix = get_matrix(run, sheet_name)
+        if matrix is None:
+            return None
+    key = ('derived',) + run_signature(run) + (sheet_name, name, len(matrix))
+    return loader_cache.get(key, lambda: evaluate(matrix, DERIVED_SERIES[name],
+                                                  lambda other: get_derived(run, sheet_name, other, matrix)))
+
+
+def with_derived(run, sheet_name, matrix, series):
+    # matrix extended with the {item: derived series name} columns that can be computed; an item that already
+    # exists is replaced, e.g. {'Inventory': 'Clipped Inventory'}
+    columns = {item: get_derived(run, sheet_name, name, matrix) for item, name in series.items()}
+    columns = {item: values for item, values in columns.items() if values is not None}
+    return matrix.with_columns(columns) if columns else matrix
@@ -0,0 +1,71 @@
+import os
+
+import numpy as np
+
+from data_store import loader_cache
+
+# Points per chart sent to the browser (override with DASHBOARD_CHART_POINTS); roughly two per pixel of a
+# 500 px wide chart
+DEFAULT_CHART_POINTS = int(os.environ.get('DASHBOARD_CHART_POINTS', 1000))
+
+
+def lttb_indices(x, y, n_out):
+    # Largest-Triangle-Three-Buckets: keeps the first and last point and, in each of n_out - 2 buckets, the point
+    # forming the largest triangle with the previously kept point and the average of the next bucket
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    selected = np.empty(n_out, dtype=np.intp)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        next_start, next_stop = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x = x[next_start:next_stop].mean()
+        avg_y = y[next_start:next_stop].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(x, y, n_out):
+    # The minimum and maximum of each of n_out / 2 equal-width index buckets, plus both end points
+    n = len(x)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+    buckets = n_out // 2
+    bucket = np.arange(n) * buckets // n
+    order = np.lexsort((y, bucket))
+    _, first = np.unique(bucket[order], return_index=True)
+    last = np.append(first[1:], n) - 1
+    return np.unique(np.concatenate([[0, n - 1], order[first], order[last]]))
+
+
+METHODS = {'lttb': lttb_indices, 'minmax': minmax_indices}
+
+
+def downsample(x, y, max_points, windows=(), method='lttb'):
+    # Reduce a series to about max_points points. Points inside the (start, end) windows, e.g. the disruption
+    # periods, are all kept; the remaining budget goes to the rest of the series.
+    valid = ~np.isnan(y)
+    x, y = x[valid], y[valid]
+    if len(x) <= max_points:
+        return x, y
+
+    keep = np.zeros(len(x), dtype=bool)
+    for start, end in windows:
+        lo, hi = np.searchsorted(x, [start, end], side='left')
+        keep[lo:hi] = True
+    budget = max(max_points - int(keep.sum()), 3)
+    keep[METHODS[method](x, y, budget)] = True
+    return x[keep], y[keep]
+
+
+def reduced_series(key, x, y, max_points, windows=(), method='lttb'):
+    # Cached downsample of one series; key identifies it, e.g. run signature + (entity, item)
+    windows = tuple(tuple(window) for window in windows)
+    cache_key = ('downsampled',) + tuple(key) + (max_points, windows, method)
+    return loader_cache.get(cache_key, lambda: downsample(x, y, max_points, windows, method))
@@ -0,0 +1,11 @@
+from streamlit import config as streamlit_config
+from streamlit import logger as streamlit_logger
+
+# Helpers for running the dashboard code without a Streamlit server, as the report and the benchmarks do
+
+
+def quiet_streamlit():
+    # Bare mode logs a warning for every widget call. The config is parsed first, otherwise parsing it
+    # later resets the log level.
+    streamlit_config.get_option('logger.level')
+    streamlit_logger.set_log_level('error')
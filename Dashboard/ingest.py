@@ -0,0 +1,93 @@
+import argparse
+import json
+import os
+import sys
+
+import pandas as pd
+
+from data_store import MANIFEST_NAME, REQUIRED_SHEETS, columnar_dir, columnar_path, normalize_sheet
+from metrics import materialize_summaries
+from run_catalog import get_catalog
+from runtime import materialize_runtime
+
+
+# One-time conversion of the app_data workbooks to per-sheet Parquet tables, followed by the
+# per-run summary table the dashboard's metric tables are rendered from and the runtime table of the time_taken_
+# files. Run it from the Dashboard folder after copying new results into app_data:
+#     python ingest.py            (convert new or changed workbooks)
+#     python ingest.py --force    (convert everything again)
+
+
+def is_up_to_date(file_path):
+    manifest_path = os.path.join(columnar_dir(file_path), MANIFEST_NAME)
+    return os.path.exists(manifest_path) and os.path.getmtime(manifest_path) >= os.path.getmtime(file_path)
+
+
+def ingest_workbook(file_path):
+    excel_file = pd.ExcelFile(file_path)
+    sheet_names = [sheet_name for sheet_name in REQUIRED_SHEETS if sheet_name in excel_file.sheet_names]
+    data = pd.read_excel(excel_file, sheet_name=sheet_names) if sheet_names else {}
+
+    os.makedirs(columnar_dir(file_path), exist_ok=True)
+    manifest = {'source': os.path.basename(file_path), 'format': 'parquet', 'sheets': {}}
+    for sheet_name in sheet_names:
+        df = normalize_sheet(data[sheet_name])
+        df.to_parquet(columnar_path(file_path, sheet_name), index=False)
+        manifest['sheets'][sheet_name] = {'rows': len(df), 'columns': list(df.columns)}
+
+    # The manifest is written last: the dashboard only trusts a conversion once it exists
+    manifest_path = os.path.join(columnar_dir(file_path), MANIFEST_NAME)
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return manifest
+
+
+def workbook_paths(data_dir):
+    return sorted(
+        os.path.join(data_dir, name) for name in os.listdir(data_dir)
+        if name.endswith('.xlsx') and name.startswith('DS1_MN1_')
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert app_data Excel workbooks to per-sheet Parquet tables.")
+    parser.add_argument('--data-dir', default='app_data', help="folder holding the DS1_MN1_*.xlsx workbooks")
+    parser.add_argument('--force', action='store_true', help="convert workbooks even if they are up to date")
+    args = parser.parse_args(argv)
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        print("Parquet conversion needs pyarrow: pip install pyarrow", file=sys.stderr)
+        return 1
+
+    converted = skipped = failed = 0
+    for file_path in workbook_paths(args.data_dir):
+        if not args.force and is_up_to_date(file_path):
+            skipped += 1
+            continue
+        try:
+            manifest = ingest_workbook(file_path)
+        except Exception as e:
+            print(f"Failed to convert {file_path}: {e}", file=sys.stderr)
+            failed += 1
+            continue
+        print(f"Converted {file_path} ({len(manifest['sheets'])} sheets)")
+        converted += 1
+
+    print(f"{converted} converted, {skipped} up to date, {failed} failed")
+
+    catalog = get_catalog(args.data_dir, refresh=True)
+    summarized = materialize_summaries(list(catalog), args.data_dir)
+    print(f"{summarized} run summaries recomputed")
+
+    timed, failures = materialize_runtime(catalog, args.data_dir)
+    for path, error in failures.items():
+        print(f"Failed to read {path}: {error}", file=sys.stderr)
+    print(f"{timed} time-taken files stored in the runtime table")
+    return 1 if failed or failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+
+from data_store import load_run, loader_cache, run_signature
+
+LONG_COLUMNS = ['Time', 'item', 'Value']
+
+
+def window_rows(time, after=None, until=None):
+    # (start, stop) rows of a sorted Time index with after < Time <= until; None leaves that end open
+    start = 0 if after is None else np.searchsorted(time, after, side='right')
+    stop = len(time) if until is None else np.searchsorted(time, until, side='right')
+    return start, stop
+
+
+class SeriesMatrix:
+    """Time x item matrix of one (run, entity sheet): a contiguous float array with a sorted Time index."""
+
+    def __init__(self, time, items, values):
+        self.time = time
+        self.items = list(items)
+        self.values = values
+        self._positions = {item: i for i, item in enumerate(self.items)}
+
+    @classmethod
+    def from_long(cls, df):
+        # Pivot a long Time/item/Value sheet; a (Time, item) pair missing from the sheet stays NaN
+        df = df.dropna(subset=['Time', 'item'])
+        time, time_index = np.unique(df['Time'].to_numpy(), return_inverse=True)
+        item_codes = pd.Categorical(df['item']).remove_unused_categories()
+        values = np.full((len(time), len(item_codes.categories)), np.nan)
+        values[time_index, item_codes.codes] = df['Value'].to_numpy(dtype='float64')
+        return cls(time, [str(item) for item in item_codes.categories], values)
+
+    @property
+    def nbytes(self):
+        return self.time.nbytes + self.values.nbytes
+
+    def __len__(self):
+        return len(self.time)
+
+    def __contains__(self, item):
+        return item in self._positions
+
+    def column(self, item):
+        return self.values[:, self._positions[item]]
+
+    def window(self, after=None, until=None):
+        # Rows with after < Time <= until, found by binary search; the result shares memory with self
+        start, stop = window_rows(self.time, after, until)
+        return SeriesMatrix(self.time[start:stop], self.items, self.values[start:stop])
+
+    def select(self, items):
+        # Only the requested items that exist, in the requested order
+        items = [item for item in items if item in self._positions]
+        positions = [self._positions[item] for item in items]
+        return SeriesMatrix(self.time, items, self.values[:, positions])
+
+    def with_columns(self, columns):
+        # A copy extended (or overwritten) with the given {item: 1-D array} columns
+        items = list(self.items)
+        values = self.values.copy()
+        extra = []
+        for item, column in columns.items():
+            if item in self._positions:
+                values[:, self._positions[item]] = column
+            else:
+                items.append(item)
+                extra.append(column)
+        if extra:
+            values = np.column_stack([values] + extra)
+        return SeriesMatrix(self.time, items, np.ascontiguousarray(values))
+
+    def to_frame(self):
+        return pd.DataFrame(self.values, index=pd.Index(self.time, name='Time'), columns=self.items)
+
+    def to_long(self):
+        return pd.DataFrame({
+            'Time': np.repeat(self.time, len(self.items)),
+            'item': np.tile(np.array(self.items, dtype=object), len(self.time)),
+            'Value': self.values.ravel(),
+        }).dropna(subset=['Value'])
+
+
+def _build_matrix(run, sheet_name):
+    df = load_run(run, sheets=[sheet_name], columns=LONG_COLUMNS + ['Agent']).get(sheet_name)
+    if df is None:
+        return None
+    if 'item' not in df and 'Agent' in df:
+        # The Reward sheet names its series in an Agent column
+        df = df.rename(columns={'Agent': 'item'})
+    if not set(LONG_COLUMNS) <= set(df.columns):
+        return None
+    return SeriesMatrix.from_long(df[LONG_COLUMNS])
+
+
+def get_matrix(run, sheet_name):
+    # The cached time x item matrix of one run sheet (the Reward sheet's agents are its items), or None when
+    # the run has no such long-format sheet
+    key = ('matrix',) + run_signature(run) + (sheet_name,)
+    return loader_cache.get(key, lambda: _build_matrix(run, sheet_name))
@@ -0,0 +1,283 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_store import COLUMNAR_DIR, file_signature, loader_cache, run_signature
+from matrices import get_matrix
+
+# Default analysis window: metrics and charts cover the periods WARMUP < Time <= HORIZON, where HORIZON None runs
+# up to the last period of each run. Periods up to WARMUP are the simulation warm-up. The sidebar can move both ends.
+WARMUP = 40
+HORIZON = None
+# Last period of the trust box plots and the health center orders, whatever the horizon
+PLOT_HORIZON = 300
+
+STATE_SHEETS = ['DS 1 state', 'DS 2 state', 'MN 1 state', 'MN 2 state', 'HC 1 state', 'HC 2 state']
+# Sheets the summary metrics are computed from
+SUMMARY_SHEETS = sorted(STATE_SHEETS + ['Reward'])
+RUN_KEYS = ['agent', 'order_type', 'disruption', 'factor']
+SUMMARY_COLUMNS = ['entity', 'item', 'mean', 'std', 'mad', 'count']
+# Label of the reward table row summing the rewards of all entities
+REWARD_TOTAL = 'Sum All Entities'
+
+# Per-run summaries materialized by ingest.py, stored next to the converted sheets
+SUMMARY_FILE = 'summary.parquet'
+SOURCE_COLUMNS = ['source', 'mtime_ns', 'size', 'sha256', 'warmup', 'horizon']
+
+
+def matrix_summary(sheet_name, matrix):
+    # Mean, STD and mean absolute deviation of every column of a matrix, NaN periods left out
+    values = matrix.values
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(valid, values, 0.0).sum(axis=0) / count
+        deviation = np.where(valid, values - mean, 0.0)
+        std = np.where(count > 1, np.sqrt((deviation ** 2).sum(axis=0) / (count - 1)), np.nan)
+        mad = np.abs(deviation).sum(axis=0) / count
+    return pd.DataFrame({'entity': sheet_name, 'item': matrix.items, 'mean': mean, 'std': std, 'mad': mad,
+                         'count': count})
+
+
+def compute_metrics(runs, warmup=WARMUP, horizon=HORIZON):
+    # Mean, STD and mean absolute deviation of every (run, entity, item) series in the analysis window. The
+    # window is cut out of the cached matrices by binary search on their sorted Time index, so moving it only
+    # repeats the column reductions. Returns one summary frame per run.
+    results = []
+    for run in runs:
+        frames = []
+        for sheet_name in SUMMARY_SHEETS:
+            matrix = get_matrix(run, sheet_name)
+            if matrix is not None and matrix.items:
+                frames.append(matrix_summary(sheet_name, matrix.window(after=warmup, until=horizon)))
+        results.append(pd.concat(frames, ignore_index=True)[SUMMARY_COLUMNS] if frames else
+                       pd.DataFrame(columns=SUMMARY_COLUMNS))
+    return results
+
+
+def summary_path(data_dir):
+    return os.path.join(data_dir, COLUMNAR_DIR, SUMMARY_FILE)
+
+
+def file_hash(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_summaries(path):
+    table = pd.read_parquet(path)
+    return {source: (_source_info(rows.iloc[0]), rows[SUMMARY_COLUMNS].reset_index(drop=True))
+            for source, rows in table.groupby('source', sort=False)}
+
+
+def _source_info(row):
+    # Tables written before the horizon was recorded have no horizon column: like a stored null, their summaries
+    # run up to the last period
+    source = row.reindex(SOURCE_COLUMNS).to_dict()
+    if pd.isna(source['horizon']):
+        source['horizon'] = None
+    return source
+
+
+def stored_summaries(data_dir):
+    # {workbook name: (source info, summary frame)} from the materialized summary table, or {} without one
+    path = summary_path(data_dir)
+    try:
+        signature = file_signature(path)
+    except FileNotFoundError:
+        return {}
+    try:
+        return loader_cache.get(('summaries',) + signature, lambda: _read_summaries(path))
+    except ImportError:
+        return {}
+
+
+def stored_summary(run, warmup=WARMUP, horizon=HORIZON):
+    # The materialized summary of a run if it was computed from this exact version of the workbook and window
+    stored = stored_summaries(os.path.dirname(run.path)).get(os.path.basename(run.path))
+    if stored is None:
+        return None
+    source, summary = stored
+    if (source['mtime_ns'], source['size'], source['warmup'], source['horizon']) != (run.mtime_ns, run.size,
+                                                                                    warmup, horizon):
+        return None
+    return summary
+
+
+def materialize_summaries(runs, data_dir, warmup=WARMUP, horizon=HORIZON):
+    # Refresh the on-disk summary table: runs whose mtime and size are unchanged are kept, runs whose
+    # mtime changed but whose content hash did not only get their source info updated, the rest are recomputed
+    stored = stored_summaries(data_dir)
+    rows = {}
+    stale = []
+    for run in runs:
+        name = os.path.basename(run.path)
+        source, summary = stored.get(name, (None, None))
+        if source is not None and (source['warmup'], source['horizon']) == (warmup, horizon):
+            if (source['mtime_ns'], source['size']) == (run.mtime_ns, run.size):
+                rows[name] = (source, summary)
+                continue
+            sha256 = file_hash(run.path)
+            if sha256 == source['sha256']:
+                rows[name] = (dict(source, mtime_ns=run.mtime_ns, size=run.size), summary)
+                continue
+        else:
+            sha256 = file_hash(run.path)
+        stale.append((run, {'source': name, 'mtime_ns': run.mtime_ns, 'size': run.size, 'sha256': sha256,
+                            'warmup': warmup, 'horizon': horizon}))
+
+    for (run, source), summary in zip(stale, compute_metrics([run for run, _ in stale], warmup, horizon)):
+        rows[source['source']] = (source, summary)
+
+    frames = [summary.assign(**source) for source, summary in rows.values() if len(summary)]
+    table = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=SUMMARY_COLUMNS)
+    table = table.reindex(columns=SOURCE_COLUMNS + SUMMARY_COLUMNS)
+    path = summary_path(data_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table.to_parquet(path + '.tmp', index=False)
+    os.replace(path + '.tmp', path)
+    return len(stale)
+
+
+def run_metrics(runs, warmup=WARMUP, horizon=HORIZON):
+    # Summary rows of the given runs, labelled with agent/order type/disruption/factor. Per-run results are
+    # cached process-wide and read from the materialized summary table when it is current; runs found in
+    # neither are computed together in one pass.
+    keys = [('metrics', warmup, horizon) + run_signature(run) for run in runs]
+    results = [loader_cache.lookup(key) for key in keys]
+    for i, result in enumerate(results):
+        if result is None:
+            results[i] = stored_summary(runs[i], warmup, horizon)
+            if results[i] is not None:
+                loader_cache.put(keys[i], results[i])
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        computed = compute_metrics([runs[i] for i in missing], warmup, horizon)
+        for i, result in zip(missing, computed):
+            loader_cache.put(keys[i], result)
+            results[i] = result
+
+    frames = [result.assign(**{key: getattr(run, key) for key in RUN_KEYS})
+              for run, result in zip(runs, results) if len(result)]
+    if not frames:
+        return pd.DataFrame(columns=RUN_KEYS + SUMMARY_COLUMNS)
+    return pd.concat(frames, ignore_index=True)[RUN_KEYS + SUMMARY_COLUMNS]
+
+
+def _ordered(df, orders):
+    # Sort rows by the position of their values in the given selection lists, e.g. {'agent': [...]}
+    columns = list(orders)
+    ranks = {column: {value: i for i, value in enumerate(values)} for column, values in orders.items()}
+    return df.sort_values(columns, key=lambda s: s.map(ranks[s.name]), kind='stable').reset_index(drop=True)
+
+
+def _with_intervals(summary, intervals):
+    # Summary rows with the {metric}_low/{metric}_high columns of bootstrap.bootstrap_intervals, if given
+    if intervals is None:
+        return summary
+    return summary.merge(intervals, on=RUN_KEYS + ['entity', 'item'], how='left')
+
+
+def _interval_columns(rows, metric, label, intervals):
+    # Bounds of the bootstrap interval of one statistic, placed next to its column in a table
+    if intervals is None:
+        return {}
+    return {f'{label} CI Low': rows[f'{metric}_low'], f'{label} CI High': rows[f'{metric}_high']}
+
+
+def reward_table(summary, selection, intervals=None):
+    rewards = _with_intervals(summary[summary['entity'] == 'Reward'], intervals)
+    rewards = _ordered(rewards, {'agent': selection['agents'], 'factor': selection['scenarios'],
+                                 'disruption': selection['disruptions']})
+    per_entity = pd.DataFrame({
+        'DS1 Agent': rewards['agent'],
+        'Disruption Duration': rewards['disruption'],
+        'Entity': rewards['item'],
+        'Value': rewards['mean'],
+        **_interval_columns(rewards, 'mean', 'Value', intervals),
+        'Sensitivity Factor': rewards['factor'],
+    })
+    totals = rewards.groupby(['agent', 'factor', 'disruption'], sort=False)['mean'].sum().reset_index()
+    if intervals is not None:
+        totals = totals.merge(intervals[(intervals['entity'] == 'Reward') & (intervals['item'] == REWARD_TOTAL)],
+                              on=['agent', 'factor', 'disruption'], how='left')
+    sums = pd.DataFrame({
+        'DS1 Agent': totals['agent'],
+        'Disruption Duration': totals['disruption'],
+        'Entity': REWARD_TOTAL,
+        'Value': totals['mean'],
+        **_interval_columns(totals, 'mean', 'Value', intervals),
+        'Sensitivity Factor': totals['factor'],
+    })
+    return pd.concat([per_entity, sums], ignore_index=True)
+
+
+def backlog_inventory_tables(summary, selection, intervals=None):
+    sheets = [s for s in selection['sheets'] if s in ['DS 1 state', 'DS 2 state']]
+    states = _with_intervals(summary[summary['entity'].isin(sheets)], intervals)
+    tables = []
+    for item, label in [('Backlog', 'Mean Backlog'), ('Inventory', 'Mean Inventory')]:
+        rows = _ordered(states[states['item'] == item], {
+            'agent': selection['agents'], 'entity': sheets, 'factor': selection['scenarios'],
+            'disruption': selection['disruptions']})
+        tables.append(pd.DataFrame({
+            'DS1 Agent': rows['agent'],
+            'Entity': rows['entity'].str.split(' ').str[:2].str.join(' '),
+            'Sensitivity Factor': rows['factor'],
+            'Disruption': rows['disruption'],
+            label: rows['mean'],
+            **_interval_columns(rows, 'mean', label, intervals),
+            'STD': rows['std'],
+            **_interval_columns(rows, 'std', 'STD', intervals),
+        }))
+    return tables
+
+
+def order_fluctuation_table(summary, selection, intervals=None):
+    sheets = [s for s in selection['sheets'] if s in ['DS 1 state', 'DS 2 state', 'HC 1 state', 'HC 2 state']]
+    rows = _with_intervals(summary[summary['entity'].isin(sheets) & (summary['item'] == 'Order')], intervals)
+    rows = _ordered(rows, {'agent': selection['agents'], 'entity': sheets, 'disruption': selection['disruptions'],
+                           'factor': selection['scenarios']})
+    return pd.DataFrame({
+        'DS1 Agent': rows['agent'],
+        'Entity': rows['entity'].str.split(' ').str[:2].str.join(' '),
+        'Disruption': rows['disruption'],
+        'Sensitivity Factor': rows['factor'],
+        'Mean Order': rows['mean'],
+        **_interval_columns(rows, 'mean', 'Mean Order', intervals),
+        'MAD': rows['mad'],
+        **_interval_columns(rows, 'mad', 'MAD', intervals),
+    })
+
+
+def lead_time_table(summary, agent, sheet_name, disruption, scenarios):
+    # Mean +/- STD lead time of one agent/entity/disruption for each sensitivity factor
+    rows = summary[(summary['agent'] == agent) & (summary['entity'] == sheet_name) &
+                   (summary['disruption'] == disruption) & (summary['item'] == 'Lead-time')]
+    rows = _ordered(rows[rows['factor'].isin(scenarios)], {'factor': scenarios})
+    return pd.DataFrame({
+        'Scenario': rows['factor'],
+        'Average Lead Time': rows['mean'],
+        'Lower Bound': rows['mean'] - rows['std'],
+        'Upper Bound': rows['mean'] + rows['std'],
+    })
+
+
+def lead_time_stability_table(summary, selection):
+    sheets = [s for s in selection['sheets'] if s in STATE_SHEETS]
+    rows = summary[summary['entity'].isin(sheets) & (summary['item'] == 'Lead-time')]
+    rows = _ordered(rows, {'agent': selection['agents'], 'entity': sheets, 'factor': selection['scenarios'],
+                           'disruption': selection['disruptions']})
+    return pd.DataFrame({
+        'Agent': rows['agent'],
+        'Disruption Duration': rows['disruption'],
+        'Entity': rows['entity'].str.replace(" state", ""),
+        'Sensitivity Factor': rows['factor'],
+        'Order Lead Time Stability (STD)': rows['std'],
+        'Order Lead Time Mean (Mean)': rows['mean'],
+    })
@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+
+from bands import replication_cube
+from data_store import loader_cache, run_signature
+from derived import with_derived
+from matrices import get_matrix
+from metrics import HORIZON, RUN_KEYS, WARMUP
+
+# Disruption windows of every scenario label, in periods after the simulation's 40-period warm-up (Time =
+# start + DISRUPTION_OFFSET, whatever the analysis window); end is exclusive
+DISRUPTION_OFFSET = 40
+DISRUPTION_WINDOWS = {
+    'No disruption': [{"start": 0, "end": 0}],
+    'short (67-72)': [{"start": 67, "end": 73}],
+    'moderate (67-81)': [{"start": 67, "end": 82}],
+    'long (67-86)': [{"start": 67, "end": 87}],
+    'longest (67-98)': [{"start": 67, "end": 99}],
+    'multiple (67-72, 110-116)': [{"start": 67, "end": 73}, {"start": 110, "end": 117}],
+}
+
+PHASE_SHEETS = ['DS 1 state', 'DS 2 state']
+# Unmet Demand is the derived series of demand above delivery
+PHASE_ITEMS = ['Backlog', 'Inventory', 'Unmet Demand', 'Lead-time']
+PHASE_COLUMNS = ['entity', 'phase', 'start', 'end', 'periods', 'mean_backlog', 'peak_backlog', 'mean_inventory',
+                 'unmet_demand', 'mean_lead_time', 'lead_time_spike', 'recovery_periods']
+
+
+def disruption_periods(disruption):
+    # (start, end) Time periods of the windows of a disruption label; empty for no (or an unknown) disruption
+    return [(window['start'] + DISRUPTION_OFFSET, window['end'] + DISRUPTION_OFFSET)
+            for window in DISRUPTION_WINDOWS.get(disruption, []) if window['end'] > window['start']]
+
+
+def phase_bounds(time, windows, warmup=WARMUP, horizon=HORIZON):
+    # [(phase, start, end, lo, hi)] with rows lo:hi of the sorted time index in each phase of the analysis
+    # window: before the first disruption window, during each one, between them and after the last one.
+    # Located by binary search; windows are clipped to the analysis window, which ends at the last period of
+    # the index when horizon is None.
+    if horizon is None:
+        horizon = max(time[-1], warmup) if len(time) else warmup
+    periods = [min(max(period, warmup + 1), horizon + 1) for window in windows for period in window]
+    edges = [warmup + 1] + periods + [horizon + 1]
+    positions = np.searchsorted(time, edges, side='left')
+    if not windows:
+        names = ['undisrupted']
+    else:
+        names = ['pre']
+        for k in range(1, len(windows) + 1):
+            names += [f'during {k}', f'between {k}' if k < len(windows) else 'post']
+    return [(name, edges[i], edges[i + 1], positions[i], positions[i + 1]) for i, name in enumerate(names)]
+
+
+def _nan_reduce(fn, values, axis):
+    # nanmax/nanmean without the all-NaN warnings: an empty or all-NaN slice gives NaN
+    with np.errstate(invalid='ignore', divide='ignore'):
+        valid = ~np.isnan(values)
+        if fn == 'max':
+            result = np.where(valid, values, -np.inf).max(axis=axis, initial=-np.inf)
+            return np.where(valid.any(axis=axis), result, np.nan)
+        total = np.where(valid, values, 0.0).sum(axis=axis)
+        if fn == 'sum':
+            return np.where(valid.any(axis=axis), total, np.nan)
+        return total / valid.sum(axis=axis)
+
+
+def phase_metrics_cube(time, cube, windows, warmup=WARMUP, horizon=HORIZON):
+    # Phase metrics of a (run x time x item) cube over PHASE_ITEMS whose runs share the same windows; every
+    # statistic is computed for all runs at once. Returns {column: (runs x phases) array} and the phases.
+    backlog, inventory, unmet, lead_time = (cube[:, :, i] for i in range(len(PHASE_ITEMS)))
+    phases = phase_bounds(time, windows, warmup, horizon)
+    pre_lo, pre_hi = phases[0][3], phases[0][4]
+    pre_inventory = _nan_reduce('mean', inventory[:, pre_lo:pre_hi], axis=1)
+    pre_lead_time = _nan_reduce('mean', lead_time[:, pre_lo:pre_hi], axis=1)
+
+    columns = {column: [] for column in PHASE_COLUMNS[4:]}
+    for name, _, end, lo, hi in phases:
+        columns['periods'].append((~np.isnan(backlog[:, lo:hi])).sum(axis=1))
+        columns['mean_backlog'].append(_nan_reduce('mean', backlog[:, lo:hi], axis=1))
+        columns['peak_backlog'].append(_nan_reduce('max', backlog[:, lo:hi], axis=1))
+        columns['mean_inventory'].append(_nan_reduce('mean', inventory[:, lo:hi], axis=1))
+        columns['unmet_demand'].append(_nan_reduce('sum', unmet[:, lo:hi], axis=1))
+        columns['mean_lead_time'].append(_nan_reduce('mean', lead_time[:, lo:hi], axis=1))
+        columns['lead_time_spike'].append(_nan_reduce('max', lead_time[:, lo:hi], axis=1) - pre_lead_time)
+        recovery = np.full(len(cube), np.nan)
+        stop = phases[-1][4]
+        if name.startswith('during') and hi < stop:
+            # Periods from the end of the window until inventory is back at its pre-disruption mean
+            after = inventory[:, hi:stop] >= pre_inventory[:, None]
+            recovery = np.where(after.any(axis=1), time[hi + after.argmax(axis=1)] - end, np.nan)
+        columns['recovery_periods'].append(recovery)
+    return {column: np.stack(values, axis=1) for column, values in columns.items()}, phases
+
+
+def compute_phase_metrics(runs, sheet_name, warmup=WARMUP, horizon=HORIZON):
+    # One frame of PHASE_COLUMNS per run. Runs are grouped by disruption label, since the runs of a group share
+    # their windows; each group is stacked into one cube and evaluated in one pass.
+    results = [pd.DataFrame(columns=PHASE_COLUMNS) for _ in runs]
+    groups = {}
+    for i, run in enumerate(runs):
+        groups.setdefault(run.disruption, []).append(i)
+    for disruption, positions in groups.items():
+        matrices = [get_matrix(runs[i], sheet_name) for i in positions]
+        matrices = [with_derived(runs[i], sheet_name, matrix, {'Unmet Demand': 'Unmet Demand'})
+                    if matrix is not None else None for i, matrix in zip(positions, matrices)]
+        present = [i for i, matrix in zip(positions, matrices) if matrix is not None and len(matrix)]
+        if not present:
+            continue
+        time, cube = replication_cube([matrix for matrix in matrices if matrix is not None and len(matrix)],
+                                      PHASE_ITEMS)
+        columns, phases = phase_metrics_cube(time, cube, disruption_periods(disruption), warmup, horizon)
+        for row, i in enumerate(present):
+            results[i] = pd.DataFrame({
+                'entity': sheet_name,
+                'phase': [phase[0] for phase in phases],
+                'start': [phase[1] for phase in phases],
+                'end': [phase[2] for phase in phases],
+                **{column: values[row] for column, values in columns.items()},
+            })[PHASE_COLUMNS]
+    return results
+
+
+def phase_metrics(runs, sheets=PHASE_SHEETS, warmup=WARMUP, horizon=HORIZON):
+    # Phase metrics of the given runs and entity sheets, labelled with the run keys. Per-run results are
+    # cached; the runs missing from the cache are computed together.
+    frames = []
+    for sheet_name in sheets:
+        keys = [('phase_metrics', sheet_name, warmup, horizon) + run_signature(run) for run in runs]
+        results = [loader_cache.lookup(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            computed = compute_phase_metrics([runs[i] for i in missing], sheet_name, warmup, horizon)
+            for i, result in zip(missing, computed):
+                loader_cache.put(keys[i], result)
+                results[i] = result
+        frames += [result.assign(**{key: getattr(run, key) for key in RUN_KEYS})
+                   for run, result in zip(runs, results) if len(result)]
+    if not frames:
+        return pd.DataFrame(columns=RUN_KEYS + PHASE_COLUMNS)
+    return pd.concat(frames, ignore_index=True)[RUN_KEYS + PHASE_COLUMNS]
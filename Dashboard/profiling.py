@@ -0,0 +1,174 @@
+import contextvars
+import functools
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import pandas as pd
+
+# Every profiled rerun appends one JSON line per span to this file (unset: nothing is written, and reruns
+# are only profiled while the sidebar panel is open)
+PROFILE_LOG = os.environ.get('DASHBOARD_PROFILE_LOG')
+# Free-form label stored with every logged span, e.g. a release tag, to compare deployments
+DEPLOYMENT = os.environ.get('DASHBOARD_DEPLOYMENT', '')
+
+COUNTERS = ['reads', 'bytes_read', 'rows_read', 'cache_hits', 'cache_misses']
+
+_profile = contextvars.ContextVar('profile', default=None)
+_stack = contextvars.ContextVar('profile_stack', default=())
+_lock = threading.Lock()
+_log_lock = threading.Lock()
+
+
+class Profile:
+    """Spans recorded during one rerun of the page; counters of a span include those of its children."""
+
+    def __init__(self, fragment=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.started = time.time()
+        # Name of the fragment when only that fragment reran, else None
+        self.fragment = fragment
+        self.spans = []
+        self._origin = time.perf_counter()
+
+    def open(self, name, parent, fields):
+        record = {'span': None, 'parent': None if parent is None else parent['span'],
+                  'depth': 0 if parent is None else parent['depth'] + 1, 'name': name,
+                  'thread': threading.current_thread().name,
+                  'offset_s': time.perf_counter() - self._origin, 'duration_s': None}
+        record.update({counter: 0 for counter in COUNTERS})
+        record.update(fields)
+        with _lock:
+            record['span'] = len(self.spans)
+            self.spans.append(record)
+        return record
+
+    def close(self, record):
+        record['duration_s'] = time.perf_counter() - self._origin - record['offset_s']
+
+    def records(self):
+        # Finished spans with their self time (duration minus that of their direct children)
+        children = {}
+        for record in self.spans:
+            if record['parent'] is not None and record['duration_s'] is not None:
+                children[record['parent']] = children.get(record['parent'], 0.0) + record['duration_s']
+        return [dict(record, self_s=record['duration_s'] - children.get(record['span'], 0.0),
+                     rerun=self.id, fragment=self.fragment, started=self.started, deployment=DEPLOYMENT,
+                     host=socket.gethostname())
+                for record in self.spans if record['duration_s'] is not None]
+
+    def summary(self):
+        # One row per span name: calls, total and self time and counters, the costliest first
+        records = pd.DataFrame(self.records())
+        if records.empty:
+            return records
+        records = records[records['depth'] > 0]
+        columns = ['duration_s', 'self_s'] + COUNTERS
+        summary = records.groupby('name', sort=False)[columns].sum()
+        summary.insert(0, 'calls', records.groupby('name', sort=False).size())
+        return summary.sort_values('self_s', ascending=False)
+
+
+@contextmanager
+def rerun(enabled=True, fragment=None):
+    # Profile the enclosed block as one rerun; yields the Profile, or None when profiling is off
+    if not enabled:
+        yield None
+        return
+    profile = Profile(fragment)
+    profile_token = _profile.set(profile)
+    root = profile.open('rerun', None, {})
+    stack_token = _stack.set((root,))
+    try:
+        yield profile
+    finally:
+        profile.close(root)
+        _stack.reset(stack_token)
+        _profile.reset(profile_token)
+
+
+@contextmanager
+def span(name, **fields):
+    # Time the enclosed block as a child of the innermost open span; yields the span record or None
+    profile = _profile.get()
+    if profile is None:
+        yield None
+        return
+    stack = _stack.get()
+    record = profile.open(name, stack[-1] if stack else None, fields)
+    token = _stack.set(stack + (record,))
+    try:
+        yield record
+    finally:
+        _stack.reset(token)
+        profile.close(record)
+
+
+@contextmanager
+def fragment_rerun(name, enabled=True):
+    # Profile the body of a Streamlit fragment as a span named `name`. Within a page rerun it is part of that
+    # rerun's profile; when the fragment reruns alone, it is profiled as a rerun of its own, whose Profile is
+    # yielded (None otherwise, or when profiling is off).
+    if _profile.get() is not None:
+        with span(name):
+            yield None
+        return
+    with rerun(enabled, fragment=name) as profile:
+        with span(name):
+            yield profile
+
+
+def profiled(fn):
+    # Decorator recording every call of fn as a span named after it
+    name = fn.__qualname__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if _profile.get() is None:
+            return fn(*args, **kwargs)
+        with span(name):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def count(**amounts):
+    # Add to the counters (reads=1, bytes_read=..., ...) of every open span
+    stack = _stack.get()
+    if not stack:
+        return
+    with _lock:
+        for record in stack:
+            for counter, amount in amounts.items():
+                record[counter] += amount
+
+
+def write_log(profile, path=None):
+    path = path or PROFILE_LOG
+    lines = ''.join(json.dumps(record, default=str) + '\n' for record in profile.records())
+    with _log_lock:
+        with open(path, 'a') as f:
+            f.write(lines)
+
+
+def show_profile(profile, cache_stats=None, container=None):
+    # Profile panel in the sidebar, or in `container` (fragments cannot write to the sidebar)
+    import streamlit as st
+
+    records = profile.records()
+    total = records[0]['duration_s'] if records else 0.0
+    title = "Profile of this rerun" if profile.fragment is None else f"Profile of this rerun of {profile.fragment}"
+    with (st.sidebar if container is None else container).expander(title, expanded=True):
+        st.write(f"Rerun took {total:.2f} s ({profile.id})")
+        summary = profile.summary()
+        if not summary.empty:
+            summary['bytes_read'] = summary['bytes_read'] / 1e6
+            st.dataframe(summary.rename(columns={'duration_s': 'total s', 'self_s': 'self s',
+                                                 'bytes_read': 'MB read'}).round(3))
+        if cache_stats is not None:
+            st.caption(f"Loader cache: {cache_stats['entries']} entries, {cache_stats['bytes'] / 1e6:.0f} of "
+                       f"{cache_stats['max_bytes'] / 1e6:.0f} MB, {cache_stats['hits']} hits, "
+                       f"{cache_stats['misses']} misses")
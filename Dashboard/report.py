@@ -0,0 +1,324 @@
+import argparse
+import html
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import data_store
+from bullwhip import BULLWHIP_WINDOW, bullwhip_ratios, rolling_bullwhip
+from data_store import run_signature
+from downsample import DEFAULT_CHART_POINTS
+from headless import quiet_streamlit
+from metrics import (HORIZON, STATE_SHEETS, WARMUP, backlog_inventory_tables, lead_time_stability_table,
+                     lead_time_table, order_fluctuation_table, reward_table, run_metrics)
+from phases import PHASE_SHEETS, phase_metrics
+from run_catalog import get_catalog
+
+# Static report of every agent/order type/disruption/factor combination in app_data, built with the dashboard's
+# own tables and chart builders but without a Streamlit server. Run it from the Dashboard folder:
+#     python report.py --out-dir reports                      (HTML pages and CSV tables)
+#     python report.py --out-dir reports --formats html,csv,png,svg
+#     python report.py --out-dir reports --warmup 40 --horizon 300
+# One folder per combination is written under the output folder, plus an index page, the lead time charts that
+# compare the sensitivity factors, and sweep-wide CSV tables. Combinations whose workbooks and settings did not
+# change since the previous run are skipped.
+
+REPORT_VERSION = 2
+REPORT_MANIFEST = 'report_manifest.json'
+FORMATS = ['html', 'csv', 'png', 'svg']
+IMAGE_FORMATS = ['png', 'svg']
+LEAD_TIME_DIR = 'lead_time'
+LEAD_TIME_SHEETS = ['DS 1 state', 'DS 2 state', 'HC 1 state', 'HC 2 state']
+TRUST_SHEETS = {'HC 1 trust': ['blue', 'red'], 'HC 2 trust': ['green', 'orange']}
+
+
+def init_worker():
+    # Streamlit runs in bare mode in the report workers
+    quiet_streamlit()
+
+
+def combination_name(run):
+    return os.path.splitext(os.path.basename(run.path))[0]
+
+
+def file_name(label):
+    return label.replace(' ', '_').replace('/', '-').lower()
+
+
+def combination_tables(summary, run, window):
+    # The dashboard's metric tables restricted to one run, {file name: frame}
+    selection = {'agents': [run.agent], 'scenarios': [run.factor], 'disruptions': [run.disruption],
+                 'sheets': STATE_SHEETS}
+    backlog, inventory = backlog_inventory_tables(summary, selection)
+    return {
+        'summary': summary,
+        'rewards': reward_table(summary, selection),
+        'backlog': backlog,
+        'inventory': inventory,
+        'order_fluctuation': order_fluctuation_table(summary, selection),
+        'bullwhip': bullwhip_ratios([run], BULLWHIP_WINDOW, *window).drop(columns=['order_type']),
+        'lead_time_stability': lead_time_stability_table(summary, selection),
+        'disruption_phases': phase_metrics([run], PHASE_SHEETS, *window).drop(columns=['order_type']),
+    }
+
+
+def combination_charts(runs, chart_points, window):
+    # {file name: chart} of one combination: entity charts of every state sheet (replication bands when it has
+    # several seeds), the trust box plots, the rolling bullwhip ratios and the health center orders, built by
+    # the InteractiveChart chart builders
+    import streamlit as st
+    from bands import BAND_SHEETS
+    from Home import InteractiveChart, plot_window
+    from matrices import get_matrix
+    from phases import DISRUPTION_OFFSET
+
+    run = runs[0]
+    st.session_state['selected_disruption'] = [run.disruption]
+    st.session_state['chart_points'] = chart_points
+    st.session_state['warmup'], st.session_state['horizon'] = window
+    interactive_chart = InteractiveChart()
+    rects = interactive_chart.disruption_rects(disruptions=[run.disruption])
+    windows = interactive_chart.disruption_windows(offset=DISRUPTION_OFFSET, disruptions=[run.disruption])
+
+    charts = {}
+    for sheet_name in STATE_SHEETS:
+        if len(runs) > 1 and sheet_name in BAND_SHEETS:
+            sheet_charts = InteractiveChart.band_charts(run.agent, run.factor, sheet_name, runs, rects)
+        else:
+            matrix = get_matrix(run, sheet_name)
+            if matrix is None or not len(matrix):
+                continue
+            sheet_charts = InteractiveChart.entity_charts(run.agent, run.factor, sheet_name, run, matrix, rects,
+                                                          windows)
+        for i, chart in enumerate(sheet_charts, 1):
+            charts[f"{file_name(sheet_name)}_{i}"] = chart
+
+    for sheet_name, colors in TRUST_SHEETS.items():
+        if sheet_name not in run.sheets:
+            continue
+        trust = get_matrix(run, sheet_name)
+        if trust is None or not len(trust):
+            continue
+        trust_data = trust.window(*plot_window()).select(['Trust DS 1', 'Trust DS 2']).to_long()
+        charts[file_name(sheet_name)] = InteractiveChart.trust_box_plot(trust_data, colors)
+
+    rolling = rolling_bullwhip([run], BULLWHIP_WINDOW, *window)
+    if not rolling.empty:
+        charts['bullwhip'] = InteractiveChart.rolling_bullwhip_chart(run, rolling, BULLWHIP_WINDOW, window[0], rects)
+
+    matrix = get_matrix(run, 'HC 1 shipments')
+    if matrix is not None and len(matrix):
+        hc_rects = interactive_chart.disruption_rects(offset=DISRUPTION_OFFSET, disruptions=[run.disruption])
+        charts['hc_orders'] = InteractiveChart.hc_order_chart(run.agent, run.factor, run, matrix, hc_rects, windows)
+    return charts
+
+
+def html_page(name, tables, charts):
+    # One page with the tables followed by every chart, using altair's own HTML template
+    import altair as alt
+
+    body = f"<h1>{html.escape(name)}</h1>\n" + "\n".join(
+        f"<h2>{html.escape(label.replace('_', ' ').capitalize())}</h2>\n{table.to_html(index=False)}"
+        for label, table in tables.items() if label != 'summary' and not table.empty)
+    page = alt.vconcat(*charts.values()).to_html() if charts else '<html><body></body></html>'
+    return page.replace('<body>', '<body>\n' + body, 1)
+
+
+def render_combination(name, runs, out_dir, formats, chart_points, window):
+    # Write the outputs of one combination to out_dir/name; returns (written file names, summary frame)
+    directory = os.path.join(out_dir, name)
+    os.makedirs(directory, exist_ok=True)
+    run = runs[0]
+    summary = run_metrics([run], *window)
+    tables = combination_tables(summary, run, window)
+    charts = combination_charts(runs, chart_points, window) if set(formats) - {'csv'} else {}
+
+    written = []
+    if 'csv' in formats:
+        for label, table in tables.items():
+            table.to_csv(os.path.join(directory, f"{label}.csv"), index=False)
+            written.append(f"{label}.csv")
+    if 'html' in formats:
+        with open(os.path.join(directory, 'index.html'), 'w') as f:
+            f.write(html_page(name, tables, charts))
+        written.append('index.html')
+    for image_format in [f for f in formats if f in IMAGE_FORMATS]:
+        for label, chart in charts.items():
+            chart.save(os.path.join(directory, f"{label}.{image_format}"))
+            written.append(f"{label}.{image_format}")
+    return written, summary
+
+
+def read_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, REPORT_MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, REPORT_MANIFEST)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def is_up_to_date(entry, inputs, settings, directory):
+    return (entry is not None and entry['inputs'] == inputs and entry['settings'] == settings and
+            all(os.path.exists(os.path.join(directory, name)) for name in entry['files']))
+
+
+def lead_time_charts(summary):
+    # {order type: {file name: chart}} of the lead time of every agent/entity/disruption across its sensitivity
+    # factors, the sweep-wide counterpart of the dashboard's average lead time section
+    from Home import InteractiveChart
+    from run_catalog import DISRUPTION_ORDER
+
+    charts = {}
+    for order_type, rows in summary.groupby('order_type', sort=True):
+        factors = sorted(set(rows['factor']), key=float)
+        disruptions = set(rows['disruption'])
+        disruptions = [d for d in DISRUPTION_ORDER if d in disruptions] + sorted(disruptions - set(DISRUPTION_ORDER))
+        for agent in sorted(set(rows['agent'])):
+            for sheet_name in LEAD_TIME_SHEETS:
+                for disruption in disruptions:
+                    lead_time_df = lead_time_table(rows, agent, sheet_name, disruption, factors)
+                    if len(lead_time_df) > 1:
+                        label = file_name(f"{agent}_{sheet_name}_{disruption}")
+                        charts.setdefault(order_type, {})[label] = InteractiveChart.lead_time_chart(
+                            lead_time_df, agent, sheet_name, disruption)
+    return charts
+
+
+def write_lead_time(out_dir, summary, formats):
+    # One page (and images) per order type under out_dir/lead_time; returns the written page names
+    import altair as alt
+
+    directory = os.path.join(out_dir, LEAD_TIME_DIR)
+    pages = []
+    for order_type, charts in lead_time_charts(summary).items():
+        os.makedirs(directory, exist_ok=True)
+        page = f"{file_name(order_type)}.html"
+        with open(os.path.join(directory, page), 'w') as f:
+            f.write(alt.vconcat(*charts.values()).to_html().replace(
+                '<body>', f"<body>\n<h1>Lead time across sensitivity factors: {html.escape(order_type)}</h1>", 1))
+        pages.append((order_type, page))
+        for image_format in [f for f in formats if f in IMAGE_FORMATS]:
+            for label, chart in charts.items():
+                chart.save(os.path.join(directory, f"{file_name(order_type)}_{label}.{image_format}"))
+    return pages
+
+
+def write_index(out_dir, names, summaries, formats):
+    # Sweep-wide summary table, lead time charts and the index page linking every combination
+    frames = [summary for summary in summaries if len(summary)]
+    lead_time_pages = []
+    if frames:
+        summary = pd.concat(frames, ignore_index=True)
+        summary.to_csv(os.path.join(out_dir, 'summary.csv'), index=False)
+        if set(formats) - {'csv'}:
+            lead_time_pages = write_lead_time(out_dir, summary, formats)
+    links = "\n".join(f'<li><a href="{html.escape(name)}/index.html">{html.escape(name)}</a></li>' for name in names)
+    lead_time_links = "\n".join(
+        f'<li><a href="{LEAD_TIME_DIR}/{html.escape(page)}">Lead time: {html.escape(order_type)}</a></li>'
+        for order_type, page in lead_time_pages)
+    with open(os.path.join(out_dir, 'index.html'), 'w') as f:
+        f.write(f"<html><body>\n<h1>Experiment report</h1>\n<ul>\n{links}\n</ul>\n"
+                + (f"<ul>\n{lead_time_links}\n</ul>\n" if lead_time_links else "") + "</body></html>\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render the dashboard's tables and charts for every run combination.")
+    parser.add_argument('--data-dir', default='app_data', help="folder holding the DS1_MN1_*.xlsx workbooks")
+    parser.add_argument('--out-dir', default='reports', help="where to write the report")
+    parser.add_argument('--formats', default='html,csv', help=f"comma-separated subset of {','.join(FORMATS)}")
+    parser.add_argument('--chart-points', type=int, default=DEFAULT_CHART_POINTS, help="max points per chart")
+    parser.add_argument('--warmup', type=int, default=WARMUP, help="periods up to this one are left out")
+    parser.add_argument('--horizon', type=int, default=HORIZON,
+                        help="last period analysed (default: the last period of each run)")
+    parser.add_argument('--workers', type=int, default=None, help="report workers (1 renders in-process)")
+    parser.add_argument('--force', action='store_true', help="render combinations even if they are up to date")
+    args = parser.parse_args(argv)
+
+    formats = [f.strip() for f in args.formats.split(',') if f.strip()]
+    unknown = [f for f in formats if f not in FORMATS]
+    if unknown:
+        parser.error(f"unknown format(s): {', '.join(unknown)}")
+    if args.horizon is not None and args.horizon <= args.warmup:
+        parser.error("--horizon must be greater than --warmup")
+    window = (args.warmup, args.horizon)
+    if set(formats) & set(IMAGE_FORMATS):
+        try:
+            import vl_convert  # noqa: F401
+        except ImportError:
+            print("PNG and SVG export needs vl-convert: pip install vl-convert-python", file=sys.stderr)
+            return 1
+
+    catalog = get_catalog(args.data_dir, refresh=True)
+    combinations = sorted({tuple(entry[:4]) for entry in catalog})
+    os.makedirs(args.out_dir, exist_ok=True)
+    manifest = read_manifest(args.out_dir)
+    settings = {'version': REPORT_VERSION, 'formats': formats, 'chart_points': args.chart_points,
+                'warmup': args.warmup, 'horizon': args.horizon}
+
+    pending = {}
+    names = []
+    for key in combinations:
+        runs = catalog.replications(*key)
+        name = combination_name(runs[0])
+        names.append(name)
+        inputs = [list(run_signature(run)[1:]) + [os.path.basename(run.path)] for run in runs]
+        if not args.force and is_up_to_date(manifest.get(name), inputs, settings, os.path.join(args.out_dir, name)):
+            continue
+        pending[name] = (runs, inputs)
+
+    summaries = {}
+    failed = 0
+    workers = args.workers or data_store.LOAD_WORKERS
+    executor = None
+    if workers == 1 or len(pending) <= 1:
+        init_worker()
+        results = ((name, lambda name=name: render_combination(name, pending[name][0], args.out_dir, formats,
+                                                               args.chart_points, window)) for name in pending)
+    else:
+        executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=init_worker)
+        futures = {executor.submit(render_combination, name, runs, args.out_dir, formats, args.chart_points,
+                                   window): name
+                   for name, (runs, _) in pending.items()}
+        results = ((futures[future], future.result) for future in as_completed(futures))
+
+    for name, result in results:
+        try:
+            written, summary = result()
+        except Exception as e:
+            print(f"Failed to render {name}: {e}", file=sys.stderr)
+            manifest.pop(name, None)
+            failed += 1
+            continue
+        manifest[name] = {'inputs': pending[name][1], 'settings': settings, 'files': written}
+        summaries[name] = summary
+        print(f"Rendered {name} ({len(written)} files)")
+    if executor is not None:
+        executor.shutdown()
+
+    # Combinations skipped this time contribute the summary written by an earlier run
+    for name in names:
+        if name not in summaries and name in manifest:
+            path = os.path.join(args.out_dir, name, 'summary.csv')
+            if os.path.exists(path):
+                summaries[name] = pd.read_csv(path, dtype={'factor': str})
+    write_manifest(args.out_dir, {name: manifest[name] for name in names if name in manifest})
+    write_index(args.out_dir, names, [summaries[name] for name in names if name in summaries], formats)
+
+    print(f"{len(pending) - failed} rendered, {len(names) - len(pending)} up to date, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+import numpy as np
+
+from data_store import loader_cache, run_signature
+from derived import DERIVED_SERIES, get_derived
+from matrices import get_matrix
+
+# Items that get rolling overlays in the entity charts, and the choices of the sidebar
+ROLLING_ITEMS = ['Order', 'Inventory', 'Backlog', 'Lead-time']
+ROLLING_STATISTICS = ['mean', 'std', 'mad']
+ROLLING_WINDOWS = [5, 10, 20, 40, 80]
+DEFAULT_ROLLING_WINDOW = 20
+
+
+def rolling_mean_std(values, window):
+    # Mean and STD of the `window` periods ending at every period (NaN before the first full window), from
+    # running sums: the cost does not depend on the window length. NaN periods are left out of a window.
+    valid = ~np.isnan(values)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Centring on the overall mean keeps the running sum of squares from cancelling
+        centre = values[valid].mean() if valid.any() else 0.0
+        centred = np.where(valid, values - centre, 0.0)
+        sums = [np.concatenate([[0.0], np.cumsum(a)]) for a in (valid.astype('float64'), centred, centred ** 2)]
+        count, total, squares = (s[window:] - s[:-window] for s in sums)
+        mean = total / count
+        std = np.sqrt(np.maximum((squares - total * mean) / (count - 1), 0))
+    head = np.full(min(window - 1, len(values)), np.nan)
+    mean = np.concatenate([head, np.where(count > 0, mean + centre, np.nan)])
+    std = np.concatenate([head, np.where(count > 1, std, np.nan)])
+    return mean, std
+
+
+def _window_below(ranks, values, starts, stops, limits):
+    # Count and sum of the values at positions starts[i] <= t < stops[i] whose rank is at most limits[i], for every
+    # query i. As in a Fenwick tree a prefix is the union of aligned power-of-two blocks, one per set bit of its
+    # length, and a window is the difference of two prefixes; blocks of the levels where both prefixes agree
+    # cancel. Each block size is sorted once and answers all of its queries with one binary search, so the cost
+    # is O(n log^2 n) whatever the window length.
+    size = 1 << max(0, (len(ranks) - 1).bit_length())
+    # Padding never counts: its rank is above every limit. Keys of one row of blocks stay below the next row's.
+    top = max(int(ranks.max(initial=0)), int(limits.max(initial=0))) + 1
+    stride = top + 1
+    ranks = np.concatenate([ranks, np.full(size - len(ranks), top)])
+    values = np.concatenate([values, np.zeros(size - len(values))])
+    count = np.zeros(len(limits), dtype=np.intp)
+    total = np.zeros(len(limits))
+    live = np.arange(len(limits))
+    for level in range(size.bit_length()):
+        block = 1 << level
+        # Once both prefixes agree from this level up, their remaining blocks cancel
+        live = live[(stops[live] >> level) != (starts[live] >> level)]
+        if not len(live):
+            break
+        # Each block is made of two blocks sorted at the previous level, which the stable sort (timsort) merges in
+        # linear time
+        rows = np.arange(0, size, block)
+        order = (np.argsort(ranks.reshape(-1, block), axis=1, kind='stable') + rows[:, None]).ravel()
+        ranks, values = ranks[order], values[order]
+        sums = np.cumsum(values.reshape(-1, block), axis=1).ravel()
+        keys = ranks + np.repeat(rows // block * stride, block)
+        # Blocks added by the end of the window and removed by its start: the last whole block of this size before
+        # lengths >> level blocks, when that bit is set
+        add = live[(stops[live] >> level) & 1 == 1]
+        remove = live[(starts[live] >> level) & 1 == 1]
+        queries = np.concatenate([add, remove])
+        row = np.concatenate([stops[add], starts[remove]]) >> level
+        sign = np.concatenate([np.ones(len(add)), -np.ones(len(remove))])
+        first = (row - 1) * block
+        end = np.searchsorted(keys, (row - 1) * stride + limits[queries], side='right')
+        # A window can add one block and remove another of the same size
+        count += np.bincount(queries, sign * (end - first), minlength=len(limits)).astype(np.intp)
+        total += np.bincount(queries, sign * np.where(end > first, sums[np.maximum(end - 1, 0)], 0.0),
+                             minlength=len(limits))
+    return count, total
+
+
+def rolling_mad(values, mean, window):
+    # Mean absolute deviation of every window from its mean (NaN periods left out). Around the mean the deviations
+    # below and above balance, so the MAD is 2 (mean x below - sum below) / count, with the count and sum of the
+    # window's values up to its mean (_window_below): O(n log^2 n) in total, whatever the window length.
+    mad = np.full(len(values), np.nan)
+    ready = np.flatnonzero(~np.isnan(mean))
+    if not len(ready):
+        return mad
+    valid = ~np.isnan(values)
+    # Centring on the overall mean keeps the prefix sums from cancelling
+    centre = values[valid].mean()
+    centred = np.where(valid, values - centre, 0.0)
+    order = np.unique(centred[valid])
+    ranks = np.where(valid, np.searchsorted(order, centred) + 1, len(order) + 1)
+    m = mean[ready] - centre
+    limits = np.searchsorted(order, m, side='right')
+    starts, stops = np.maximum(ready + 1 - window, 0), ready + 1
+    below, below_sum = _window_below(ranks, centred, starts, stops, limits)
+    in_window = np.concatenate([[0], np.cumsum(valid)])
+    in_window = in_window[stops] - in_window[starts]
+    mad[ready] = 2 * np.maximum(m * below - below_sum, 0) / in_window
+    return mad
+
+
+def rolling_stats(values, window):
+    mean, std = rolling_mean_std(values, window)
+    return {'mean': mean, 'std': std, 'mad': rolling_mad(values, mean, window)}
+
+
+def get_rolling(run, sheet_name, name, window, matrix=None):
+    # {statistic: array aligned with the matrix's Time index} of an item or derived series (see derived.py) of
+    # one run sheet, cached per (run, entity, series, window); None when the sheet lacks it
+    if matrix is None:
+        matrix = get_matrix(run, sheet_name)
+        if matrix is None:
+            return None
+
+    def build():
+        if name in matrix:
+            values = matrix.column(name)
+        else:
+            values = get_derived(run, sheet_name, name, matrix) if name in DERIVED_SERIES else None
+        return None if values is None else rolling_stats(np.asarray(values, dtype='float64'), window)
+
+    return loader_cache.get(('rolling', sheet_name, name, window, len(matrix)) + run_signature(run), build)
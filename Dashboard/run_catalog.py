@@ -0,0 +1,144 @@
+import os
+import re
+import threading
+import zipfile
+from collections import namedtuple
+from xml.etree import ElementTree
+
+import pandas as pd
+
+from data_store import columnar_manifest, loader_cache
+
+# DS1_MN1_{agent}_{order_type}_{disruption}_s{scenario}[_seed{n}].xlsx; agents may contain underscores
+# (DRL_RNN), order types and disruption labels never do. Replications of one combination differ in their seed.
+RUN_FILE_PATTERN = re.compile(
+    r'^(?P<prefix>time_taken_)?DS1_MN1_(?P<agent>.+)_(?P<order_type>[^_]+)_(?P<disruption>[^_]+)'
+    r'_s(?P<factor>\d+(?:\.\d+)?)(?:_seed(?P<seed>\d+))?\.xlsx$'
+)
+
+# Display order of the disruption labels in the sidebar; unknown labels are appended alphabetically
+DISRUPTION_ORDER = ['No disruption', 'short (67-72)', 'moderate (67-81)', 'long (67-86)', 'longest (67-98)',
+                    'multiple (67-72, 110-116)']
+
+RunEntry = namedtuple('RunEntry', ['agent', 'order_type', 'disruption', 'factor', 'seed', 'path', 'size',
+                                   'mtime_ns', 'sheets', 'manifest'])
+
+
+def _workbook_sheet_names(path):
+    # Sheet names from the workbook index (xl/workbook.xml) alone, without loading the workbook
+    try:
+        with zipfile.ZipFile(path) as archive:
+            root = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+    except (OSError, KeyError, zipfile.BadZipFile, ElementTree.ParseError):
+        return ()
+    return tuple(element.get('name') for element in root.iter() if element.tag.rsplit('}', 1)[-1] == 'sheet')
+
+
+def _sheet_names(path, signature):
+    # Sheets present in a workbook: from its ingest manifest if it is current, else from the workbook index,
+    # cached per file version so that a rescan only reads new or changed workbooks
+    try:
+        manifest = columnar_manifest(path, signature)
+    except (OSError, ValueError):
+        manifest = None
+    if manifest is not None:
+        return tuple(manifest['sheets']), manifest
+    return loader_cache.get(('sheet_names',) + signature, lambda: _workbook_sheet_names(path)), None
+
+
+class RunCatalog:
+    """Index of the run workbooks under app_data, built from one directory scan."""
+
+    def __init__(self, data_dir, entries, time_taken, unmatched=()):
+        self.data_dir = data_dir
+        self._entries = entries
+        self._time_taken = time_taken
+        # Workbooks in the folder whose name does not follow RUN_FILE_PATTERN
+        self.unmatched = sorted(unmatched)
+        self.table = pd.DataFrame(
+            list(entries.values()), columns=RunEntry._fields
+        ).drop(columns='manifest').set_index(['agent', 'order_type', 'disruption', 'factor', 'seed'], drop=False)
+        # Seeds of every combination, the unseeded file (seed -1) first
+        self._seeds = {}
+        for key in sorted(entries, key=lambda key: key[:4] + (-1 if key[4] is None else key[4],)):
+            self._seeds.setdefault(key[:4], []).append(key[4])
+
+    @classmethod
+    def scan(cls, data_dir='app_data'):
+        entries = {}
+        time_taken = {}
+        unmatched = []
+        if os.path.isdir(data_dir):
+            with os.scandir(data_dir) as it:
+                for dir_entry in it:
+                    match = RUN_FILE_PATTERN.match(dir_entry.name)
+                    if match is None or not dir_entry.is_file():
+                        # Excel lock files (~$name.xlsx) are not workbooks
+                        if (dir_entry.name.endswith('.xlsx') and not dir_entry.name.startswith('~$') and
+                                dir_entry.is_file()):
+                            unmatched.append(dir_entry.name)
+                        continue
+                    seed = None if match['seed'] is None else int(match['seed'])
+                    key = (match['agent'], match['order_type'], match['disruption'], match['factor'], seed)
+                    path = os.path.join(data_dir, dir_entry.name)
+                    if match['prefix']:
+                        time_taken[key] = path
+                        continue
+                    stat = dir_entry.stat()
+                    signature = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+                    sheets, manifest = _sheet_names(path, signature)
+                    entries[key] = RunEntry(*key, path, stat.st_size, stat.st_mtime_ns, sheets, manifest)
+        return cls(data_dir, entries, time_taken, unmatched)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries.values())
+
+    def lookup(self, agent, order_type, disruption, factor, seed=None):
+        # With seed=None: the unseeded file of the combination, else its lowest seed, so that every view has
+        # one representative run
+        key = (agent, order_type, disruption, str(factor))
+        if seed is None:
+            seeds = self._seeds.get(key)
+            seed = seeds[0] if seeds else None
+        return self._entries.get(key + (seed,))
+
+    def replications(self, agent, order_type, disruption, factor):
+        # Every run of the combination, one per seed
+        key = (agent, order_type, disruption, str(factor))
+        return [self._entries[key + (seed,)] for seed in self._seeds.get(key, [])]
+
+    def lookup_time_taken(self, agent, order_type, disruption, factor, seed=None):
+        key = (agent, order_type, disruption, str(factor))
+        if seed is None:
+            seeds = sorted((k[4] for k in self._time_taken if k[:4] == key), key=lambda s: -1 if s is None else s)
+            seed = seeds[0] if seeds else None
+        return self._time_taken.get(key + (seed,))
+
+    def time_taken_files(self):
+        # [((agent, order_type, disruption, factor, seed), path)] of every time_taken_ file, in name order
+        return sorted(self._time_taken.items(), key=lambda item: item[1])
+
+    def options(self, column):
+        values = set(self.table[column]) if len(self.table) else set()
+        if column == 'disruption':
+            known = [d for d in DISRUPTION_ORDER if d in values]
+            return known + sorted(values - set(known))
+        if column == 'factor':
+            return sorted(values, key=float)
+        return sorted(values)
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(data_dir='app_data', refresh=False):
+    # One catalog per data folder for the whole process; refresh=True rescans the folder
+    key = os.path.abspath(data_dir)
+    with _catalogs_lock:
+        if refresh or key not in _catalogs:
+            _catalogs[key] = RunCatalog.scan(data_dir)
+        return _catalogs[key]
@@ -0,0 +1,168 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_store import COLUMNAR_DIR, file_signature, load_time_taken_data, loader_cache, run_signature
+from matrices import get_matrix
+from metrics import RUN_KEYS
+
+# Columns of the time_taken_ workbooks: one row per timed episode with its wall time in seconds. A Decisions
+# column gives the decisions made in an episode; without one, every period of the run's Reward sheet is one
+# decision of the agent.
+EPISODE_COLUMN = 'Episode'
+TIME_COLUMN = 'Time Taken'
+DECISIONS_COLUMN = 'Decisions'
+
+# Agents of the comparison page in display order; other agents found in app_data follow alphabetically
+COMPARED_AGENTS = ['DRL', 'DRL_RNN', 'basestock']
+TIMING_COLUMNS = ['episode', 'seconds', 'decisions']
+RUNTIME_COLUMNS = RUN_KEYS + ['seed'] + TIMING_COLUMNS
+LATENCY_PERCENTILES = [50, 95, 99]
+LATENCY_COLUMNS = ['episodes', 'decisions', 'seconds', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms',
+                   'decisions_per_second']
+# Column headers of the latency tables on the Home and Runtime pages
+LATENCY_LABELS = {'agent': 'Agent', 'order_type': 'Order type', 'disruption': 'Disruption',
+                  'factor': 'Sensitivity factor', 'episodes': 'Episodes', 'decisions': 'Decisions',
+                  'seconds': 'Run time (s)', 'mean_ms': 'Mean latency (ms)', 'p50_ms': 'p50 (ms)',
+                  'p95_ms': 'p95 (ms)', 'p99_ms': 'p99 (ms)', 'decisions_per_second': 'Decisions per second'}
+
+# Timings of every time_taken_ file, stored by ingest.py next to the summaries
+RUNTIME_FILE = 'runtime.parquet'
+STORE_COLUMNS = ['source', 'mtime_ns', 'size']
+
+
+def runtime_path(data_dir):
+    return os.path.join(data_dir, COLUMNAR_DIR, RUNTIME_FILE)
+
+
+def episode_timings(df, periods=None):
+    # TIMING_COLUMNS frame of one time-taken sheet; rows without a time are dropped. Episodes are numbered from 1
+    # when the sheet has no Episode column, and decisions default to the run's periods (NaN when unknown).
+    if TIME_COLUMN not in df:
+        return pd.DataFrame(columns=TIMING_COLUMNS)
+    seconds = pd.to_numeric(df[TIME_COLUMN], errors='coerce').to_numpy(dtype='float64')
+    if EPISODE_COLUMN in df:
+        episode = pd.to_numeric(df[EPISODE_COLUMN], errors='coerce').to_numpy(dtype='float64')
+    else:
+        episode = np.arange(1, len(df) + 1, dtype='float64')
+    if DECISIONS_COLUMN in df:
+        decisions = pd.to_numeric(df[DECISIONS_COLUMN], errors='coerce').to_numpy(dtype='float64')
+    else:
+        decisions = np.full(len(df), np.nan if periods is None else float(periods))
+    frame = pd.DataFrame({'episode': episode, 'seconds': seconds, 'decisions': decisions})
+    return frame[~np.isnan(seconds)].reset_index(drop=True)
+
+
+def timed_run(catalog, key):
+    # The run workbook a time-taken file belongs to: same combination and seed, else the combination's
+    # representative run; None without one
+    run = catalog.lookup(*key)
+    return run if run is not None or key[4] is None else catalog.lookup(*key[:4])
+
+
+def file_timings(catalog, key, path):
+    # Timings of one time-taken file, cached per version of the file and of its run workbook
+    run = timed_run(catalog, key)
+
+    def build():
+        matrix = get_matrix(run, 'Reward') if run is not None else None
+        return episode_timings(load_time_taken_data(path), len(matrix) if matrix is not None else None)
+
+    return loader_cache.get(('runtime',) + file_signature(path) + (run_signature(run) if run else ()), build)
+
+
+def _read_runtime(path):
+    table = pd.read_parquet(path)
+    return {source: (rows.iloc[0][STORE_COLUMNS].to_dict(), rows[TIMING_COLUMNS].reset_index(drop=True))
+            for source, rows in table.groupby('source', sort=False)}
+
+
+def stored_runtime(data_dir):
+    # {file name: (source info, timings)} from the runtime store, or {} without one
+    path = runtime_path(data_dir)
+    try:
+        signature = file_signature(path)
+    except FileNotFoundError:
+        return {}
+    try:
+        return loader_cache.get(('stored_runtime',) + signature, lambda: _read_runtime(path))
+    except ImportError:
+        return {}
+
+
+def materialize_runtime(catalog, data_dir):
+    # Rewrite the runtime store from every time_taken_ file of the catalog. Returns the number of files stored
+    # and {path: exception} for the unreadable ones.
+    frames, failures = [], {}
+    for key, path in catalog.time_taken_files():
+        try:
+            timings = file_timings(catalog, key, path)
+            _, mtime_ns, size = file_signature(path)
+        except Exception as e:
+            failures[path] = e
+            continue
+        frames.append(timings.assign(source=os.path.basename(path), mtime_ns=mtime_ns, size=size))
+    table = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    table = table.reindex(columns=STORE_COLUMNS + TIMING_COLUMNS)
+    path = runtime_path(data_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table.to_parquet(path + '.tmp', index=False)
+    os.replace(path + '.tmp', path)
+    return len(frames), failures
+
+
+def runtime_table(catalog, combinations=None):
+    # One RUNTIME_COLUMNS row per timed episode of every time_taken_ file in the catalog, or only of those of the
+    # given (agent, order_type, disruption, factor) combinations, and {path: exception} for the files that could
+    # not be read. Files unchanged since ingest.py stored them are not opened.
+    stored = stored_runtime(catalog.data_dir)
+    files = catalog.time_taken_files()
+    if combinations is not None:
+        combinations = {(agent, order_type, disruption, str(factor))
+                        for agent, order_type, disruption, factor in combinations}
+        files = [(key, path) for key, path in files if key[:4] in combinations]
+    frames, failures = [], {}
+    for key, path in files:
+        source, timings = stored.get(os.path.basename(path), (None, None))
+        try:
+            _, mtime_ns, size = file_signature(path)
+            if source is None or (source['mtime_ns'], source['size']) != (mtime_ns, size):
+                timings = file_timings(catalog, key, path)
+        except Exception as e:
+            failures[path] = e
+            continue
+        if len(timings):
+            frames.append(timings.assign(**dict(zip(RUN_KEYS + ['seed'], key))))
+    if not frames:
+        return pd.DataFrame(columns=RUNTIME_COLUMNS), failures
+    return pd.concat(frames, ignore_index=True)[RUNTIME_COLUMNS], failures
+
+
+def _latency(rows):
+    # Per-decision latency in ms of every timed episode; the mean weighs episodes by their decisions
+    rows = rows[rows['decisions'] > 0]
+    seconds, decisions = rows['seconds'].to_numpy(), rows['decisions'].to_numpy()
+    total_seconds, total_decisions = seconds.sum(), decisions.sum()
+    if not len(rows):
+        percentiles = [np.nan] * len(LATENCY_PERCENTILES)
+    else:
+        percentiles = list(np.percentile(1000 * seconds / decisions, LATENCY_PERCENTILES))
+    return [len(rows), total_decisions, total_seconds,
+            1000 * total_seconds / total_decisions if total_decisions else np.nan,
+            *percentiles,
+            total_decisions / total_seconds if total_seconds > 0 else np.nan]
+
+
+def latency_table(runtime, by=('agent',)):
+    # Decision latency (mean, p50, p95, p99 in ms) and throughput (decisions per second) per group of the runtime
+    # table, COMPARED_AGENTS first. Episodes without a decision count are left out.
+    by = list(by)
+    rows = [list(group if isinstance(group, tuple) else (group,)) + _latency(part)
+            for group, part in runtime.groupby(by, sort=False)]
+    table = pd.DataFrame(rows, columns=by + LATENCY_COLUMNS)
+    if 'agent' in by:
+        order = {agent: i for i, agent in enumerate(COMPARED_AGENTS)}
+        table = table.sort_values('agent', key=lambda agents: agents.map(
+            lambda agent: (order.get(agent, len(order)), agent)), kind='stable')
+    return table.reset_index(drop=True)
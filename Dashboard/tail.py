@@ -0,0 +1,274 @@
+import io
+import json
+import os
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from matrices import SeriesMatrix
+from metrics import SUMMARY_COLUMNS, WARMUP, matrix_summary
+
+# Runs that are still training write one append-only log per sheet:
+#     app_data/live/DS1_MN1_{agent}_{order_type}_{disruption}_s{factor}/{sheet name}.csv   (header Time,item,Value)
+#     app_data/live/DS1_MN1_{agent}_{order_type}_{disruption}_s{factor}/{sheet name}.jsonl (one object per row)
+# The Reward log may use Agent instead of item, as in the workbooks.
+LIVE_DIR = 'live'
+LIVE_RUN_PATTERN = re.compile(
+    r'^DS1_MN1_(?P<agent>.+)_(?P<order_type>[^_]+)_(?P<disruption>[^_]+)_s(?P<factor>\d+(?:\.\d+)?)$'
+)
+LOG_EXTENSIONS = ('.csv', '.jsonl')
+
+
+class SheetTail:
+    """Reads the rows appended to one sheet log since the previous call, starting at a byte offset."""
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.columns = None
+        self._inode = None
+
+    def read_new(self):
+        # New complete lines as a Time/item/Value frame; a trailing partial line waits for the next call.
+        # Returns (frame, reset) where reset is True when the log was truncated or replaced and the
+        # caller must drop what it built from the old content.
+        stat = os.stat(self.path)
+        reset = (self._inode is not None and stat.st_ino != self._inode) or stat.st_size < self.offset
+        if reset:
+            self.offset = 0
+            self.columns = None
+        self._inode = stat.st_ino
+        if stat.st_size == self.offset:
+            return None, reset
+
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            chunk = f.read(stat.st_size - self.offset)
+        end = chunk.rfind(b'\n') + 1
+        if end == 0:
+            return None, reset
+        self.offset += end
+        text = chunk[:end].decode('utf-8')
+
+        if self.path.endswith('.jsonl'):
+            df = pd.DataFrame([json.loads(line) for line in text.splitlines() if line.strip()])
+        else:
+            if self.columns is None:
+                header, _, text = text.partition('\n')
+                self.columns = [column.strip() for column in header.split(',')]
+            df = pd.read_csv(io.StringIO(text), names=self.columns, header=None) if text.strip() else None
+        if df is None or df.empty:
+            return None, reset
+        if 'item' not in df and 'Agent' in df:
+            df = df.rename(columns={'Agent': 'item'})
+        df = df.dropna(subset=['Time', 'item'])
+        return pd.DataFrame({
+            'Time': df['Time'].to_numpy(dtype='int64'),
+            'item': df['item'].astype(str).to_numpy(),
+            'Value': pd.to_numeric(df['Value'], errors='coerce').to_numpy(dtype='float64'),
+        }), reset
+
+
+class LiveMatrix:
+    """Growable time x item matrix that appended rows are written into; capacity doubles as it fills."""
+
+    def __init__(self, capacity=256):
+        self.items = []
+        self._positions = {}
+        self._rows = {}
+        self._time = np.empty(capacity, dtype='int64')
+        self._values = np.full((capacity, 0), np.nan)
+        self._sorted = True
+        self.rows = 0
+
+    def _grow(self, rows, columns):
+        capacity = len(self._time)
+        while capacity < rows:
+            capacity *= 2
+        if capacity != len(self._time) or columns != self._values.shape[1]:
+            values = np.full((capacity, columns), np.nan)
+            values[:self.rows, :self._values.shape[1]] = self._values[:self.rows]
+            time = np.empty(capacity, dtype='int64')
+            time[:self.rows] = self._time[:self.rows]
+            self._time, self._values = time, values
+
+    def append(self, df):
+        # Write a Time/item/Value batch; returns the (row, column) positions of its values
+        new_items = [item for item in pd.unique(df['item']) if item not in self._positions]
+        for item in new_items:
+            self._positions[item] = len(self.items)
+            self.items.append(item)
+        new_times = [time for time in pd.unique(df['Time']) if time not in self._rows]
+        self._grow(self.rows + len(new_times), len(self.items))
+        for time in new_times:
+            if self.rows and time < self._time[self.rows - 1]:
+                self._sorted = False
+            self._rows[time] = self.rows
+            self._time[self.rows] = time
+            self.rows += 1
+
+        rows = df['Time'].map(self._rows).to_numpy()
+        columns = df['item'].map(self._positions).to_numpy()
+        self._values[rows, columns] = df['Value'].to_numpy()
+        return rows, columns
+
+    def matrix(self):
+        # SeriesMatrix of the rows written so far; shares memory with this matrix unless rows arrived out of order
+        time, values = self._time[:self.rows], self._values[:self.rows]
+        if not self._sorted:
+            order = np.argsort(time, kind='stable')
+            time, values = time[order], values[order]
+        return SeriesMatrix(time, list(self.items), values)
+
+
+class RunningSummary:
+    """Count, mean and variance of every item after the warm-up, merged batch by batch (Chan et al.)."""
+
+    def __init__(self, warmup=WARMUP):
+        self.warmup = warmup
+        self.count = np.zeros(0)
+        self.mean = np.zeros(0)
+        self.m2 = np.zeros(0)
+
+    def update(self, time, columns, values, n_columns):
+        if len(self.count) < n_columns:
+            pad = n_columns - len(self.count)
+            self.count, self.mean, self.m2 = (np.append(a, np.zeros(pad)) for a in (self.count, self.mean, self.m2))
+        keep = (time > self.warmup) & ~np.isnan(values)
+        columns, values = columns[keep], values[keep]
+        if not len(values):
+            return
+        n_b = np.bincount(columns, minlength=n_columns).astype('float64')
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_b = np.bincount(columns, weights=values, minlength=n_columns) / n_b
+            m2_b = np.bincount(columns, weights=(values - mean_b[columns]) ** 2, minlength=n_columns)
+            n = self.count + n_b
+            delta = np.where(n_b > 0, mean_b - self.mean, 0.0)
+            self.mean = np.where(n > 0, self.mean + delta * n_b / np.where(n > 0, n, 1), 0.0)
+            self.m2 = self.m2 + np.where(n_b > 0, m2_b + delta ** 2 * self.count * n_b / np.where(n > 0, n, 1), 0.0)
+        self.count = n
+
+    def std(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > 1, np.sqrt(self.m2 / (self.count - 1)), np.nan)
+
+
+class LiveRun:
+    """Tails every sheet log of one live run directory into live matrices and running summaries."""
+
+    def __init__(self, path, agent, order_type, disruption, factor, warmup=WARMUP):
+        self.path = path
+        self.agent = agent
+        self.order_type = order_type
+        self.disruption = disruption
+        self.factor = factor
+        self.warmup = warmup
+        self._sheets = {}
+        self._lock = threading.Lock()
+        # Together with path these play the role of a workbook's mtime and size in run_signature, so
+        # caches keyed by run_signature see a new version whenever rows were appended
+        self.mtime_ns = 0
+        self.size = 0
+
+    @property
+    def name(self):
+        return os.path.basename(self.path)
+
+    def refresh(self):
+        # Read what was appended to every sheet log since the previous refresh; returns the number of new rows
+        new_rows = 0
+        with self._lock:
+            for file_name in sorted(os.listdir(self.path)):
+                sheet_name, extension = os.path.splitext(file_name)
+                if extension not in LOG_EXTENSIONS:
+                    continue
+                if sheet_name not in self._sheets:
+                    self._sheets[sheet_name] = [SheetTail(os.path.join(self.path, file_name)), LiveMatrix(),
+                                                RunningSummary(self.warmup)]
+                tail, matrix, summary = self._sheets[sheet_name]
+                df, reset = tail.read_new()
+                if reset:
+                    matrix, summary = LiveMatrix(), RunningSummary(self.warmup)
+                    self._sheets[sheet_name][1:] = [matrix, summary]
+                if df is None:
+                    continue
+                _, columns = matrix.append(df)
+                summary.update(df['Time'].to_numpy(), columns, df['Value'].to_numpy(), len(matrix.items))
+                new_rows += len(df)
+            if new_rows:
+                self.mtime_ns += 1
+                self.size = sum(tail.offset for tail, _, _ in self._sheets.values())
+        return new_rows
+
+    @property
+    def sheets(self):
+        return tuple(self._sheets)
+
+    def last_time(self):
+        times = [matrix.matrix().time[-1] for _, matrix, _ in self._sheets.values() if matrix.rows]
+        return max(times) if times else None
+
+    def matrix(self, sheet_name):
+        with self._lock:
+            if sheet_name not in self._sheets:
+                return None
+            return self._sheets[sheet_name][1].matrix()
+
+    def summary(self, sheet_names=None, warmup=None, horizon=None):
+        # Rows in the layout of metrics.compute_metrics. Mean, STD and count are kept up to date as rows
+        # arrive; the mean absolute deviation needs the final mean, so it is taken from the in-memory matrix.
+        # Another analysis window than the running one (warm-up self.warmup, no horizon) is summarized from
+        # the matrix directly.
+        frames = []
+        with self._lock:
+            for sheet_name, (_, live_matrix, running) in self._sheets.items():
+                if sheet_names is not None and sheet_name not in sheet_names:
+                    continue
+                matrix = live_matrix.matrix()
+                if (warmup not in (None, self.warmup) or
+                        horizon is not None and len(matrix) and matrix.time[-1] > horizon):
+                    frames.append(matrix_summary(sheet_name, matrix.window(
+                        after=self.warmup if warmup is None else warmup, until=horizon)))
+                    continue
+                matrix = matrix.window(after=self.warmup)
+                mean = running.mean[:len(matrix.items)]
+                deviation = np.abs(matrix.values - mean)
+                n = (~np.isnan(deviation)).sum(axis=0)
+                mad = np.where(n > 0, np.nansum(deviation, axis=0) / np.maximum(n, 1), np.nan)
+                frames.append(pd.DataFrame({
+                    'entity': sheet_name,
+                    'item': matrix.items,
+                    'mean': mean,
+                    'std': running.std()[:len(matrix.items)],
+                    'mad': mad,
+                    'count': running.count[:len(matrix.items)].astype('int64'),
+                }))
+        if not frames:
+            return pd.DataFrame(columns=SUMMARY_COLUMNS)
+        return pd.concat(frames, ignore_index=True)[SUMMARY_COLUMNS]
+
+
+_live_runs = {}
+_live_runs_lock = threading.Lock()
+
+
+def live_runs(data_dir='app_data'):
+    # {name: LiveRun} of the run directories under app_data/live. Tails are shared by every session of the
+    # process, so concurrent viewers of a run read each appended byte once.
+    live_dir = os.path.join(data_dir, LIVE_DIR)
+    if not os.path.isdir(live_dir):
+        return {}
+    runs = {}
+    with _live_runs_lock:
+        for name in sorted(os.listdir(live_dir)):
+            path = os.path.abspath(os.path.join(live_dir, name))
+            match = LIVE_RUN_PATTERN.match(name)
+            if match is None or not os.path.isdir(path):
+                continue
+            if path not in _live_runs:
+                _live_runs[path] = LiveRun(path, match['agent'], match['order_type'], match['disruption'],
+                                           match['factor'])
+            runs[name] = _live_runs[path]
+    return runs
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The dashboard modules import each other as top-level modules, as when Streamlit runs Home.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,33 @@
+import numpy as np
+
+from bands import BAND_QUANTILES, band_stats, replication_cube
+from matrices import SeriesMatrix
+
+
+def test_band_stats_match_percentiles():
+    cube = np.random.default_rng(0).normal(0, 1, (7, 30, 2))
+    mean, bands, count = band_stats(cube)
+    np.testing.assert_allclose(mean, cube.mean(axis=0))
+    np.testing.assert_allclose(bands, np.percentile(cube, np.array(BAND_QUANTILES) * 100, axis=0))
+    assert (count == 7).all()
+
+
+def test_band_stats_with_missing_seeds():
+    cube = np.random.default_rng(1).normal(0, 1, (5, 20, 1))
+    cube[:2, 10:] = np.nan
+    cube[:, 15] = np.nan
+    mean, bands, count = band_stats(cube, quantiles=(0.1, 0.5, 0.9))
+    np.testing.assert_allclose(mean[:15], np.nanmean(cube[:, :15], axis=0))
+    np.testing.assert_allclose(bands[:, :15], np.nanpercentile(cube[:, :15], [10, 50, 90], axis=0))
+    assert np.isnan(mean[15]).all() and np.isnan(bands[:, 15]).all()
+    np.testing.assert_array_equal(count[:, 0], [5] * 10 + [3] * 5 + [0] + [3] * 4)
+
+
+def test_replication_cube_aligns_time_grids():
+    first = SeriesMatrix(np.array([1, 2, 3]), ['a', 'b'], np.array([[1.0, 10.0], [2.0, 20.0], [3.0, 30.0]]))
+    second = SeriesMatrix(np.array([2, 4]), ['a'], np.array([[5.0], [6.0]]))
+    time, cube = replication_cube([first, None, second], ['a', 'b'])
+    np.testing.assert_array_equal(time, [1, 2, 3, 4])
+    expected = np.array([[[1, 10], [2, 20], [3, 30], [np.nan, np.nan]],
+                         [[np.nan, np.nan], [5, np.nan], [np.nan, np.nan], [6, np.nan]]])
+    np.testing.assert_array_equal(cube, expected)
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from bootstrap import bootstrap_matrix, resample_indices, resampled_stats
+
+
+def test_block_indices_are_consecutive_runs():
+    rng = np.random.default_rng(0)
+    indices = resample_indices(50, 20, 7, rng)
+    assert indices.shape == (20, 50)
+    assert indices.min() >= 0 and indices.max() < 50
+    # Within every block of 7 the positions follow each other
+    blocks = indices[:, :49].reshape(20, 7, 7)
+    assert (np.diff(blocks, axis=2) == 1).all()
+
+
+def test_block_longer_than_series():
+    indices = resample_indices(5, 3, 10, np.random.default_rng(0))
+    np.testing.assert_array_equal(indices, np.tile(np.arange(5), (3, 1)))
+
+
+def test_resampled_stats_match_pandas():
+    rng = np.random.default_rng(1)
+    values = rng.normal(50, 10, (40, 3))
+    values[rng.choice(40, 6, replace=False), 1] = np.nan
+    values[:, 2] += 1e6
+    indices = resample_indices(40, 25, 4, rng)
+    stats = resampled_stats(values, indices)
+    for r, rows in enumerate(indices):
+        frame = pd.DataFrame(values[rows])
+        np.testing.assert_allclose(stats['mean'][r], frame.mean(), rtol=1e-10)
+        np.testing.assert_allclose(stats['std'][r], frame.std(), rtol=1e-7)
+        mad = (frame - frame.mean()).abs().mean()
+        np.testing.assert_allclose(stats['mad'][r], mad, rtol=1e-7)
+
+
+def test_bootstrap_matrix_intervals():
+    values = np.random.default_rng(2).normal(0, 1, (200, 2))
+    values[:, 1] = np.nan
+    intervals = bootstrap_matrix(values, 500, np.random.default_rng(3), block=5, confidence=0.9)
+    low, high = intervals['mean']
+    # The interval of the mean brackets the sample mean; an item without values has no interval
+    assert low[0] < values[:, 0].mean() < high[0]
+    assert np.isnan(low[1]) and np.isnan(high[1])
+    # The same seed gives the same intervals
+    again = bootstrap_matrix(values, 500, np.random.default_rng(3), block=5, confidence=0.9)
+    np.testing.assert_array_equal(again['std'][0], intervals['std'][0])
@@ -0,0 +1,20 @@
+import pytest
+
+from data_store import LoaderCache
+
+
+def test_failed_loads_leave_no_key_locks():
+    cache = LoaderCache(1 << 20)
+
+    def unreadable():
+        raise OSError("unreadable workbook")
+
+    for i in range(3):
+        with pytest.raises(OSError):
+            cache.get(('workbook', i), unreadable)
+    assert not cache._key_locks
+    assert ('workbook', 0) not in cache
+    # A later load of the same key still runs and is cached
+    assert cache.get(('workbook', 0), lambda: 1) == 1
+    assert cache.get(('workbook', 0), lambda: 2) == 1
+    assert not cache._key_locks
@@ -0,0 +1,73 @@
+import numpy as np
+
+from downsample import downsample, lttb_indices, minmax_indices
+
+
+def reference_lttb(x, y, n_out):
+    # Plain per-bucket loop of Largest-Triangle-Three-Buckets on the same bucket edges
+    n = len(x)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected = [0]
+    for i in range(n_out - 2):
+        if i + 2 < len(edges):
+            following = range(edges[i + 1], edges[i + 2])
+        else:
+            following = range(n - 1, n)
+        avg_x = np.mean([x[j] for j in following])
+        avg_y = np.mean([y[j] for j in following])
+        a = selected[-1]
+        areas = [abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+                 for j in range(edges[i], edges[i + 1])]
+        selected.append(edges[i] + int(np.argmax(areas)))
+    return np.array(selected + [n - 1])
+
+
+def test_lttb_matches_reference():
+    rng = np.random.default_rng(1)
+    x = np.arange(1000, dtype='float64')
+    y = rng.normal(0, 1, 1000).cumsum()
+    for n_out in (3, 10, 97, 500):
+        np.testing.assert_array_equal(lttb_indices(x, y, n_out), reference_lttb(x, y, n_out))
+
+
+def test_lttb_keeps_short_series():
+    x = np.arange(5, dtype='float64')
+    np.testing.assert_array_equal(lttb_indices(x, x, 10), np.arange(5))
+
+
+def test_minmax_keeps_bucket_extremes():
+    rng = np.random.default_rng(2)
+    x = np.arange(1000, dtype='float64')
+    y = rng.normal(0, 1, 1000)
+    kept = minmax_indices(x, y, 100)
+    bucket = np.arange(1000) * 50 // 1000
+    for b in range(50):
+        members = np.flatnonzero(bucket == b)
+        assert members[np.argmin(y[members])] in kept
+        assert members[np.argmax(y[members])] in kept
+
+
+def test_downsample_keeps_windows():
+    rng = np.random.default_rng(3)
+    x = np.arange(1, 2001, dtype='float64')
+    y = rng.normal(0, 1, 2000).cumsum()
+    y[[10, 500]] = np.nan
+    windows = [(67, 81), (1110, 1116)]
+    out_x, out_y = downsample(x, y, 200, windows)
+    # Every valid point of a window is kept, within about the point budget, and kept points are unchanged
+    for start, end in windows:
+        inside = x[(x >= start) & (x < end)]
+        assert np.isin(inside, out_x).all()
+    assert len(out_x) <= 200 + 2
+    assert not np.isnan(out_y).any()
+    np.testing.assert_array_equal(out_y, y[np.isin(x, out_x)])
+    assert out_x[0] == 1 and out_x[-1] == 2000
+
+
+def test_downsample_short_series_unchanged():
+    x = np.arange(10, dtype='float64')
+    y = x ** 2
+    y[3] = np.nan
+    out_x, out_y = downsample(x, y, 100)
+    np.testing.assert_array_equal(out_x, np.delete(x, 3))
+    np.testing.assert_array_equal(out_y, np.delete(y, 3))
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from rolling import ROLLING_WINDOWS, rolling_stats
+
+
+def series(n, gaps=True, seed=0):
+    rng = np.random.default_rng(seed)
+    values = 100 + rng.normal(0, 5, n).cumsum()
+    if gaps:
+        values[rng.choice(n, n // 10, replace=False)] = np.nan
+        values[30:45] = np.nan
+    return values
+
+
+def reference(values, window):
+    # pandas rolling over the same windows: NaN periods skipped, nothing before the first full window
+    rolled = pd.Series(values).rolling(window, min_periods=1)
+    mean = rolled.mean().to_numpy(copy=True)
+    std = rolled.std().to_numpy(copy=True)
+    mad = rolled.apply(lambda w: np.nanmean(np.abs(w - np.nanmean(w))) if (~np.isnan(w)).any() else np.nan,
+                       raw=True).to_numpy(copy=True)
+    for a in (mean, std, mad):
+        a[:window - 1] = np.nan
+    return {'mean': mean, 'std': std, 'mad': mad}
+
+
+@pytest.mark.parametrize('window', [1, 5, 20])
+@pytest.mark.parametrize('gaps', [False, True])
+def test_rolling_stats_match_pandas(window, gaps):
+    values = series(300, gaps)
+    stats = rolling_stats(values, window)
+    for name, expected in reference(values, window).items():
+        np.testing.assert_allclose(stats[name], expected, rtol=1e-9, atol=1e-9, equal_nan=True, err_msg=name)
+
+
+@pytest.mark.parametrize('n', [256, 1000])
+def test_rolling_mad_largest_window(n):
+    # The largest window of the sidebar, on series with repeated values and a power-of-two length
+    values = np.round(series(n, seed=1), 1)
+    window = ROLLING_WINDOWS[-1]
+    np.testing.assert_allclose(rolling_stats(values, window)['mad'], reference(values, window)['mad'], rtol=1e-9,
+                               atol=1e-9, equal_nan=True)
+
+
+def test_rolling_shorter_than_window():
+    stats = rolling_stats(np.array([1.0, 2.0, 3.0]), 5)
+    for name in ('mean', 'std', 'mad'):
+        assert len(stats[name]) == 3 and np.isnan(stats[name]).all()
@@ -0,0 +1,55 @@
+import pandas as pd
+
+from run_catalog import RUN_FILE_PATTERN, RunCatalog
+
+
+def test_file_pattern():
+    match = RUN_FILE_PATTERN.match('DS1_MN1_DRL_RNN_HC1Trust-MN1Disrupted_short (67-72)_s0.5_seed3.xlsx')
+    assert match['agent'] == 'DRL_RNN'
+    assert match['order_type'] == 'HC1Trust-MN1Disrupted'
+    assert match['disruption'] == 'short (67-72)'
+    assert (match['factor'], match['seed'], match['prefix']) == ('0.5', '3', None)
+
+    match = RUN_FILE_PATTERN.match('time_taken_DS1_MN1_basestock_UpToLevel_No disruption_s1.xlsx')
+    assert (match['agent'], match['disruption'], match['factor']) == ('basestock', 'No disruption', '1')
+    assert match['seed'] is None and match['prefix'] == 'time_taken_'
+
+    assert RUN_FILE_PATTERN.match('DS1_MN1_DRL_UpToLevel_short (67-72)_s0.5_seed.xlsx') is None
+    assert RUN_FILE_PATTERN.match('DS1_MN1_DRL_UpToLevel_short (67-72).xlsx') is None
+
+
+def make_catalog(tmp_path, names):
+    for name in names:
+        (tmp_path / name).write_bytes(b'')
+    return RunCatalog.scan(str(tmp_path))
+
+
+def test_lookup_prefers_unseeded_then_lowest_seed(tmp_path):
+    catalog = make_catalog(tmp_path, [
+        'DS1_MN1_DRL_UpToLevel_short (67-72)_s0.5_seed12.xlsx',
+        'DS1_MN1_DRL_UpToLevel_short (67-72)_s0.5_seed2.xlsx',
+        'DS1_MN1_DRL_UpToLevel_short (67-72)_s0.5.xlsx',
+        'DS1_MN1_DRL_UpToLevel_long (67-86)_s0.5_seed7.xlsx',
+        'DS1_MN1_DRL_UpToLevel_long (67-86)_s0.5_seed3.xlsx',
+        'time_taken_DS1_MN1_DRL_UpToLevel_long (67-86)_s0.5_seed3.xlsx',
+    ])
+    assert len(catalog) == 5
+    assert catalog.lookup('DRL', 'UpToLevel', 'short (67-72)', 0.5).seed is None
+    assert catalog.lookup('DRL', 'UpToLevel', 'long (67-86)', '0.5').seed == 3
+    assert catalog.lookup('DRL', 'UpToLevel', 'long (67-86)', 0.5, seed=7).seed == 7
+    assert catalog.lookup('DRL', 'UpToLevel', 'long (67-86)', 0.1) is None
+    # Replications in seed order, the unseeded file first
+    assert [run.seed for run in catalog.replications('DRL', 'UpToLevel', 'short (67-72)', 0.5)] == [None, 2, 12]
+    assert catalog.lookup_time_taken('DRL', 'UpToLevel', 'long (67-86)', 0.5).endswith('_seed3.xlsx')
+
+
+def test_scan_reads_sheet_names_and_lists_other_workbooks(tmp_path):
+    path = tmp_path / 'DS1_MN1_DRL_UpToLevel_short (67-72)_s0.5.xlsx'
+    with pd.ExcelWriter(path) as writer:
+        for sheet_name in ['DS 1 state', 'HC 1 trust']:
+            pd.DataFrame({'Time': [1], 'item': ['Order'], 'Value': [1.0]}).to_excel(writer, sheet_name=sheet_name)
+    (tmp_path / 'DS1_MN1_basestock_UpToLevel_Eq_short (67-72).xlsx').write_bytes(b'')
+    (tmp_path / '~$DS1_MN1_DRL_UpToLevel_short (67-72)_s0.5.xlsx').write_bytes(b'')
+    catalog = RunCatalog.scan(str(tmp_path))
+    assert catalog.lookup('DRL', 'UpToLevel', 'short (67-72)', '0.5').sheets == ('DS 1 state', 'HC 1 trust')
+    assert catalog.unmatched == ['DS1_MN1_basestock_UpToLevel_Eq_short (67-72).xlsx']